@@ -1,17 +1,27 @@
 import sys
 from PyQt6 import QtWidgets, QtCore, QtGui, QtPrintSupport
 from ui.ana import Ui_MainWindow as AnaForm
-from database import Database
+from database import Database, day_range
 from datetime import datetime
+from tablemodel import Column, RowTableModel, RowFilterProxyModel, setup_table_view
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 
+OVERDUE_COLOR = QtGui.QColor(255, 200, 200)
+
+
+def is_overdue(task):
+    """Просрочена ли невыполненная задача из Database.get_user_tasks"""
+    deadline, completed = task[5], task[6]
+    return bool(deadline) and deadline < datetime.now() and not completed
+
+
 class AnWindow(QtWidgets.QMainWindow, AnaForm):
-    def __init__(self, user_email):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
+        self.session = session
         self.db = Database()
 
         # Добавляем необходимые виджеты для аналитики
@@ -49,10 +59,12 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
         """Настройка вкладки со сделками"""
         layout = QtWidgets.QVBoxLayout(self.tab_deals)
 
-        # Таблица статистики сделок
-        self.table_deals = QtWidgets.QTableWidget()
-        self.table_deals.setColumnCount(3)
-        self.table_deals.setHorizontalHeaderLabels(["Статус", "Количество", "Сумма"])
+        # Таблица статистики сделок: строки (статус, количество, сумма)
+        self.deals_model = RowTableModel([
+            Column("Статус", 0), Column("Количество", 1), Column("Сумма", 2, lambda total: f"{total:.2f} руб.")
+        ], parent=self)
+        self.table_deals = QtWidgets.QTableView()
+        setup_table_view(self.table_deals, RowFilterProxyModel(self.deals_model, self))
         self.table_deals.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.table_deals)
 
@@ -65,10 +77,13 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
         """Настройка вкладки с задачами"""
         layout = QtWidgets.QVBoxLayout(self.tab_tasks)
 
-        # Таблица статистики задач
-        self.table_tasks = QtWidgets.QTableWidget()
-        self.table_tasks.setColumnCount(4)
-        self.table_tasks.setHorizontalHeaderLabels(["Тип", "Описание", "Отправитель", "Срок"])
+        # Таблица статистики задач: строки из Database.get_user_tasks, просроченные выделены
+        self.tasks_model = RowTableModel([
+            Column("Тип", 1), Column("Описание", 2), Column("Отправитель", 3),
+            Column("Срок", 5, lambda deadline: deadline.strftime("%d.%m.%Y") if deadline else "Нет срока")
+        ], row_background=lambda task: OVERDUE_COLOR if is_overdue(task) else None, parent=self)
+        self.table_tasks = QtWidgets.QTableView()
+        setup_table_view(self.table_tasks, RowFilterProxyModel(self.tasks_model, self))
         self.table_tasks.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.table_tasks)
 
@@ -160,13 +175,11 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
     def load_user_data(self):
         """Загрузка данных пользователя и аналитики"""
         try:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
+            self.profil.setText(self.session.profile_text())
 
-                # Загрузка данных для аналитики
-                self.load_deals_stats()
-                self.load_tasks_stats()
+            # Загрузка данных для аналитики
+            self.load_deals_stats()
+            self.load_tasks_stats()
 
         except Exception as e:
             print(f"Ошибка загрузки данных: {e}")
@@ -174,19 +187,9 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
     def load_deals_stats(self):
         """Загрузка статистики по сделкам"""
         try:
-            # Очищаем таблицу
-            self.table_deals.setRowCount(0)
-
             # Получаем данные из БД
-            deals_stats = self.db.get_today_deals_stats()
-            print(f"Получены данные по сделкам: {deals_stats}")  # Отладочная печать
-
-            # Заполняем таблицу
-            for row, (status, count, total) in enumerate(deals_stats):
-                self.table_deals.insertRow(row)
-                self.table_deals.setItem(row, 0, QtWidgets.QTableWidgetItem(status))
-                self.table_deals.setItem(row, 1, QtWidgets.QTableWidgetItem(str(count)))
-                self.table_deals.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{total:.2f} руб."))
+            deals_stats = self.db.get_today_deals_stats(*day_range())
+            self.deals_model.set_rows(deals_stats)
 
             # Обновляем график
             self.update_deals_chart()
@@ -227,32 +230,9 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
     def load_tasks_stats(self):
         """Загрузка статистики по задачам"""
         try:
-            # Очищаем таблицу
-            self.table_tasks.setRowCount(0)
-
-            # Получаем данные пользователя
-            user_data = self.db.get_user_by_email(self.user_email)
-            if not user_data:
-                return
-
             # Получаем задачи пользователя
-            tasks = self.db.get_user_tasks(user_data[0])
-
-            # Заполняем таблицу
-            for row, (task_id, task_type, description, sender, created, deadline, completed) in enumerate(tasks):
-                self.table_tasks.insertRow(row)
-                self.table_tasks.setItem(row, 0, QtWidgets.QTableWidgetItem(task_type))
-                self.table_tasks.setItem(row, 1, QtWidgets.QTableWidgetItem(description))
-                self.table_tasks.setItem(row, 2, QtWidgets.QTableWidgetItem(sender))
-
-                # Форматируем дату дедлайна
-                deadline_date = deadline.strftime("%d.%m.%Y") if deadline else "Нет срока"
-                self.table_tasks.setItem(row, 3, QtWidgets.QTableWidgetItem(deadline_date))
-
-                # Подсветка просроченных задач
-                if deadline and deadline < datetime.now() and not completed:
-                    for col in range(4):
-                        self.table_tasks.item(row, col).setBackground(QtGui.QColor(255, 200, 200))
+            tasks = self.db.get_user_tasks(self.session.id)
+            self.tasks_model.set_rows(tasks)
 
             # Обновляем график
             self.update_tasks_chart()
@@ -266,13 +246,8 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
             # Очищаем график
             self.figure_tasks.clear()
 
-            # Получаем данные пользователя
-            user_data = self.db.get_user_by_email(self.user_email)
-            if not user_data:
-                return
-
             # Получаем данные из БД
-            data = self.db.get_tasks_distribution(user_data[0])
+            data = self.db.get_tasks_distribution(self.session.id)
 
             if not data:
                 return
@@ -320,7 +295,7 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
             table = self.table_deals if report_type == "deals" else self.table_tasks
 
             # Проверяем, есть ли данные в таблице
-            if table.rowCount() == 0:
+            if table.model().rowCount() == 0:
                 QtWidgets.QMessageBox.warning(self, "Предупреждение",
                                               f"Нет данных для печати отчета по {report_type}")
                 return
@@ -348,7 +323,7 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
             table = self.table_deals if report_type == "deals" else self.table_tasks
 
             # Проверяем, есть ли данные в таблице
-            if table.rowCount() == 0:
+            if table.model().rowCount() == 0:
                 QtWidgets.QMessageBox.warning(self, "Предупреждение",
                                               f"Нет данных для экспорта отчета по {report_type}")
                 return
@@ -378,32 +353,18 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать отчет: {str(e)}")
 
     def generate_html_report(self, table, report_type):
-        """Генерация HTML-кода для отчета"""
+        """Генерация HTML-кода для отчета по строкам модели таблицы (с учётом сортировки и фильтра)"""
+        model = table.model()
         # Проверяем, есть ли данные в таблице
-        if table.rowCount() == 0:
+        if model.rowCount() == 0:
             QtWidgets.QMessageBox.warning(self, "Предупреждение",
                                           f"Нет данных для отчета по {report_type}")
             return None
 
-        # Логирование заголовков для отладки
-        headers = []
-        for col in range(table.columnCount()):
-            header = table.horizontalHeaderItem(col).text()
-            headers.append(header)
-        print(f"Заголовки отчета: {headers}")
-
-        # Логирование данных для отладки
-        data_rows = []
-        for row in range(table.rowCount()):
-            row_data = []
-            for col in range(table.columnCount()):
-                item = table.item(row, col)
-                text = item.text() if item else ""
-                row_data.append(text)
-            data_rows.append(row_data)
-        print(f"Данные отчета ({len(data_rows)} строк): {data_rows}")
-
-        html = f"""
+        headers = [model.headerData(col, QtCore.Qt.Orientation.Horizontal)
+                   for col in range(model.columnCount())]
+
+        parts = [f"""
         <html>
         <head>
         <style>
@@ -421,101 +382,101 @@ class AnWindow(QtWidgets.QMainWindow, AnaForm):
         <table>
         <thead>
         <tr>
-        """
+        """]
 
         # Добавляем заголовки столбцов
-        for col in range(table.columnCount()):
-            header = table.horizontalHeaderItem(col).text()
-            html += f"<th>{header}</th>"
+        parts.extend(f"<th>{header}</th>" for header in headers)
 
-        html += """
+        parts.append("""
         </tr>
         </thead>
         <tbody>
-        """
+        """)
 
         # Добавляем данные таблицы
-        for row in range(table.rowCount()):
-            html += "<tr>"
-            for col in range(table.columnCount()):
-                item = table.item(row, col)
-                text = item.text() if item else ""
+        last_col = model.columnCount() - 1
+        for row in range(model.rowCount()):
+            parts.append("<tr>")
+            for col in range(model.columnCount()):
+                index = model.index(row, col)
+                text = index.data() or ""
                 # Подсветка просроченных задач
-                if report_type == "tasks" and col == 3 and item and item.background().color().name() == "#ffc8c8":
-                    html += f'<td style="background-color: #ffc8c8;">{text}</td>'
+                background = index.data(QtCore.Qt.ItemDataRole.BackgroundRole)
+                if report_type == "tasks" and col == last_col and background is not None:
+                    parts.append(f'<td style="background-color: {background.name()};">{text}</td>')
                 else:
-                    html += f"<td>{text}</td>"
-            html += "</tr>"
+                    parts.append(f"<td>{text}</td>")
+            parts.append("</tr>")
 
-        html += """
+        parts.append("""
         </tbody>
         </table>
         </body>
         </html>
-        """
+        """)
 
-        return html
+        return "".join(parts)
 
     def go_home(self):
         """Переход на главное окно"""
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
     def go_deal(self):
         """Переход на окно сделок"""
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         """Переход на окно календаря"""
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_task(self):
         """Переход на окно задач"""
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_client(self):
         """Переход на окно клиентов"""
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         """Переход на окно сотрудников"""
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_chat(self):
         """Переход на окно чата"""
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_sett(self):
         """Переход на окно настроек"""
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -1,21 +1,41 @@
+import html
+import os
+
 from PyQt6 import QtWidgets, QtCore, QtGui
 from ui.chat import Ui_MainWindow as ChatForm
-from database import Database
+from database import Database, CHAT_FETCH_LIMIT, CHAT_PAGE_SIZE, search_terms
+from worker import QueryRunner
+from chatview import MessageModel, MessageView, MessageIdRole, format_size, format_timestamp, highlight_snippet
+from relayclient import RelayClient
 
 
 class ChatWindow(QtWidgets.QMainWindow, ChatForm):
-    def __init__(self, user_email=None):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
+        self.session = session
         self.db = Database()
-        self.current_chat_user_id = None
+        self.runner = QueryRunner(self)
+        # Переписка задаётся ключом ("user", ID собеседника) или ("channel", ID канала)
+        self.current_chat = None
+        # Ключ переписки -> уже загруженные сообщения (ID, sender, recipient или канал, text, sent_at)
+        self.conversations = {}
+        self.has_older = {}  # Ключ переписки -> есть ли в БД более старые сообщения
+        self.has_newer = {}  # Ключ переписки -> есть ли между загруженными и последними сообщениями пропуск
+        self.replacing_messages = False  # Смена переписки двигает прокрутку - догрузка не нужна
+        self.last_incoming_id = None  # ID последнего входящего личного сообщения, о котором знает окно
+        self.conversation_items = {}  # Ключ переписки -> строка списка
+        self.unread = {}  # Ключ переписки -> число непрочитанных сообщений
+        self.read_markers = {}  # Ключ переписки -> ID последнего отмеченного прочитанным сообщения
+        self.transfers = {}  # Ключ фоновой передачи файла -> (сделано, всего)
 
         # Инициализация UI без изменения структуры формы
         self.init_chat_ui()
         self.load_user_data()
         self.load_employees()
+        self.load_channels()
         self.setup_connections()
+        self.start_relay()
 
     def init_chat_ui(self):
         """Инициализация интерфейса чата внутри widget_2"""
@@ -29,7 +49,7 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
             self.widget_2.layout().setContentsMargins(0, 0, 0, 0)
             self.widget_2.layout().setSpacing(10)
 
-        # Список сотрудников (левая часть)
+        # Список каналов и сотрудников (левая часть)
         self.employees_list = QtWidgets.QListWidget()
         self.employees_list.setStyleSheet("""
             QListWidget {
@@ -51,15 +71,9 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
         """)
 
         # Область сообщений (правая часть)
-        self.messages_area = QtWidgets.QScrollArea()
-        self.messages_area.setWidgetResizable(True)
-        self.messages_area.setFrameShape(QtWidgets.QFrame.Shape.NoFrame)
-
-        self.messages_widget = QtWidgets.QWidget()
-        self.messages_widget.setLayout(QtWidgets.QVBoxLayout())
-        self.messages_widget.layout().setAlignment(QtCore.Qt.AlignmentFlag.AlignTop)
-        self.messages_widget.layout().setContentsMargins(10, 10, 10, 10)
-        self.messages_area.setWidget(self.messages_widget)
+        self.messages_model = MessageModel(self.session.id, self.get_user_name, self)
+        self.messages_view = MessageView()
+        self.messages_view.setModel(self.messages_model)
 
         # Поле ввода и кнопка отправки
         self.message_input = QtWidgets.QLineEdit()
@@ -74,8 +88,7 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
             }
         """)
 
-        self.send_button = QtWidgets.QPushButton("Отправить")
-        self.send_button.setStyleSheet("""
+        button_style = """
             QPushButton {
                 background: #94a5ff;
                 border-radius: 10px;
@@ -90,25 +103,74 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
             QPushButton:pressed {
                 background: #717ec3;
             }
-        """)
+        """
+        self.send_button = QtWidgets.QPushButton("Отправить")
+        self.send_button.setStyleSheet(button_style)
+        self.attach_button = QtWidgets.QPushButton("Файл")
+        self.attach_button.setToolTip("Отправить файл")
+        self.attach_button.setStyleSheet(button_style)
 
         input_layout = QtWidgets.QHBoxLayout()
         input_layout.addWidget(self.message_input)
+        input_layout.addWidget(self.attach_button)
         input_layout.addWidget(self.send_button)
 
+        # Ход передачи файлов
+        self.transfer_bar = QtWidgets.QProgressBar()
+        self.transfer_bar.setRange(0, 1000)
+        self.transfer_bar.setTextVisible(False)
+        self.transfer_bar.setMaximumHeight(8)
+        self.transfer_label = QtWidgets.QLabel()
+        self.transfer_label.setStyleSheet("font: 10pt 'Segoe UI'; color: gray;")
+        self.transfer_bar.hide()
+        self.transfer_label.hide()
+
         # Правая панель (сообщения + ввод)
         right_panel = QtWidgets.QWidget()
         right_panel.setLayout(QtWidgets.QVBoxLayout())
         right_panel.layout().setContentsMargins(0, 0, 0, 0)
-        right_panel.layout().addWidget(self.messages_area)
+        right_panel.layout().addWidget(self.messages_view)
+        right_panel.layout().addWidget(self.transfer_label)
+        right_panel.layout().addWidget(self.transfer_bar)
         right_panel.layout().addLayout(input_layout)
 
-        # Левая панель (список сотрудников)
+        # Поиск по переписке
+        self.search_input = QtWidgets.QLineEdit()
+        self.search_input.setPlaceholderText("Поиск по сообщениям...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("""
+            QLineEdit {
+                border: 1px solid #94a5ff;
+                border-radius: 10px;
+                padding: 6px;
+                font: 11pt "Segoe UI";
+            }
+        """)
+
+        self.search_results = QtWidgets.QTextBrowser()
+        self.search_results.setOpenLinks(False)
+        self.search_results.setStyleSheet("""
+            QTextBrowser {
+                border: 1px solid #94a5ff;
+                border-radius: 10px;
+                font: 11pt "Segoe UI";
+                background: white;
+            }
+        """)
+        self.search_results.hide()
+
+        self.create_channel_button = QtWidgets.QPushButton("Создать канал")
+        self.create_channel_button.setStyleSheet(button_style)
+
+        # Левая панель (каналы и сотрудники)
         left_panel = QtWidgets.QWidget()
         left_panel.setLayout(QtWidgets.QVBoxLayout())
         left_panel.layout().setContentsMargins(0, 0, 0, 0)
-        left_panel.layout().addWidget(QtWidgets.QLabel("Сотрудники"))
+        left_panel.layout().addWidget(QtWidgets.QLabel("Каналы и сотрудники"))
+        left_panel.layout().addWidget(self.search_input)
+        left_panel.layout().addWidget(self.search_results)
         left_panel.layout().addWidget(self.employees_list)
+        left_panel.layout().addWidget(self.create_channel_button)
 
         # Добавляем обе панели в widget_2
         self.widget_2.layout().addWidget(left_panel)
@@ -120,35 +182,104 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
 
     def load_user_data(self):
         """Загрузка данных пользователя"""
-        if self.user_email:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
+        self.profil.setText(self.session.profile_text())
 
     def load_employees(self):
-        """Загрузка списка сотрудников"""
+        """Загрузка списка сотрудников в фоне"""
+        self.runner.run(("chat_users", self.session.id), Database.get_chat_users, self.session.id,
+                        on_result=self.show_employees,
+                        on_error=lambda e: print(f"Ошибка загрузки сотрудников: {e}"))
+        self.load_unread_counts()
+
+    def load_channels(self):
+        """Загрузка каналов пользователя вместе с числом непрочитанных сообщений"""
+        self.runner.run(("channels", self.session.id), Database.get_user_channels, self.session.id,
+                        on_result=self.show_channels,
+                        on_error=lambda e: print(f"Ошибка загрузки каналов: {e}"))
+
+    def load_unread_counts(self):
+        """Загрузка числа непрочитанных сообщений по всем собеседникам"""
+        self.runner.run(("unread", self.session.id), Database.get_unread_counts, self.session.id,
+                        on_result=self.show_unread_counts,
+                        on_error=lambda e: print(f"Ошибка загрузки непрочитанных сообщений: {e}"))
+
+    def show_unread_counts(self, counts):
+        """Обновление счётчиков непрочитанных личных сообщений в списке"""
+        self.set_unread("user", {("user", peer_id): count for peer_id, count in counts.items()})
+
+    def set_unread(self, kind, counts):
+        """Замена счётчиков непрочитанных сообщений для переписок вида kind"""
+        # Открытая переписка прочитана, даже если отметка ещё не дошла до БД
+        counts.pop(self.current_chat, None)
+        self.unread = {key: count for key, count in self.unread.items() if key[0] != kind}
+        self.unread.update(counts)
+        for key in self.conversation_items:
+            if key[0] == kind:
+                self.update_unread_badge(key)
+
+    def update_unread_badge(self, key):
+        """Отображение счётчика непрочитанных сообщений у строки списка"""
+        item = self.conversation_items.get(key)
+        if item is None:
+            return
+        title = item.data(QtCore.Qt.ItemDataRole.UserRole + 1)
+        count = self.unread.get(key, 0)
+        item.setText(f"{title}  [{count}]" if count else title)
+        font = item.font()
+        font.setBold(bool(count))
+        item.setFont(font)
+
+    def show_employees(self, employees):
+        """Заполнение списка сотрудников"""
         try:
-            self.employees_list.clear()
-
-            current_user = self.db.get_user_by_email(self.user_email)
-            if not current_user:
-                return
-
-            employees = self.db.get_chat_users(current_user[0])
-
-            for emp in employees:
-                item = QtWidgets.QListWidgetItem(f"{emp[1]} {emp[2]} {emp[3]} ({emp[4]})")
-                item.setData(QtCore.Qt.ItemDataRole.UserRole, emp[0])
-                self.employees_list.addItem(item)
-
+            self.set_list_items("user", [(("user", emp[0]), f"{emp[1]} {emp[2]} {emp[3]} ({emp[4]})")
+                                         for emp in employees])
         except Exception as e:
             print(f"Ошибка загрузки сотрудников: {e}")
 
+    def show_channels(self, channels):
+        """Заполнение списка каналов и подписка на их уведомления"""
+        self.set_list_items("channel", [(("channel", channel[0]), f"# {channel[1]}") for channel in channels])
+        self.set_unread("channel", {("channel", channel[0]): channel[2] for channel in channels if channel[2]})
+        self.relay.join_channels(channel[0] for channel in channels)
+
+    def set_list_items(self, kind, entries):
+        """Замена строк списка вида kind: каналы - сверху, сотрудники - под ними"""
+        for key in [key for key in self.conversation_items if key[0] == kind]:
+            self.employees_list.takeItem(self.employees_list.row(self.conversation_items.pop(key)))
+
+        row = 0 if kind == "channel" else self.employees_list.count()
+        for key, title in entries:
+            item = QtWidgets.QListWidgetItem(title)
+            item.setData(QtCore.Qt.ItemDataRole.UserRole + 1, title)
+            self.employees_list.insertItem(row, item)
+            row += 1
+            self.conversation_items[key] = item
+            self.update_unread_badge(key)
+
+        current = self.conversation_items.get(self.current_chat)
+        if current is not None:
+            self.employees_list.setCurrentItem(current)
+
+    def item_key(self, item):
+        """Ключ переписки строки списка"""
+        for key, conversation_item in self.conversation_items.items():
+            if conversation_item is item:
+                return key
+        return None
+
     def setup_connections(self):
         """Настройка соединений сигналов и слотов"""
         self.employees_list.itemClicked.connect(self.start_chat)
+        self.messages_view.verticalScrollBar().valueChanged.connect(self.on_messages_scrolled)
+        self.search_input.returnPressed.connect(self.search_messages)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
+        self.search_results.anchorClicked.connect(self.on_search_result_clicked)
         self.send_button.clicked.connect(self.send_message)
         self.message_input.returnPressed.connect(self.send_message)
+        self.attach_button.clicked.connect(self.attach_file)
+        self.messages_view.doubleClicked.connect(self.on_message_double_clicked)
+        self.create_channel_button.clicked.connect(self.create_channel)
 
         # Подключение кнопок навигации
         self.home.clicked.connect(self.go_home)
@@ -164,175 +295,504 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
         self.pushButton_2.clicked.connect(self.logout)
 
     def start_chat(self, item):
-        """Начало чата с выбранным сотрудником"""
-        self.current_chat_user_id = item.data(QtCore.Qt.ItemDataRole.UserRole)
-        self.load_messages(self.current_chat_user_id)
-
-    def load_messages(self, recipient_id):
-        """Загрузка сообщений с выбранным сотрудником"""
-        # Очищаем предыдущие сообщения
-        for i in reversed(range(self.messages_widget.layout().count())):
-            widget = self.messages_widget.layout().itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
+        """Открытие переписки с выбранным сотрудником или канала"""
+        key = self.item_key(item)
+        if key is None:
+            return
+        self.current_chat = key
+        self.messages_model.highlight_id = None
+        self.load_messages(key)
+
+    def load_messages(self, key):
+        """Загрузка сообщений выбранной переписки"""
+        # Уже загруженные сообщения показываем сразу, из БД запрашиваем только новые
+        self.show_conversation(key, self.conversations.get(key, []))
+
+        self.fetch_new_messages(key)
+
+    def since_query(self, key, after_id, limit):
+        """Метод Database и аргументы для сообщений переписки после after_id"""
+        kind, target_id = key
+        if kind == "channel":
+            return Database.get_channel_messages_since, target_id, after_id, limit
+        return Database.get_chat_messages_since, self.session.id, target_id, after_id, limit
+
+    def before_query(self, key, before):
+        """Метод Database и аргументы для страницы истории переписки перед before"""
+        kind, target_id = key
+        if kind == "channel":
+            return Database.get_channel_messages_before, target_id, before, CHAT_PAGE_SIZE
+        return Database.get_chat_messages_before, self.session.id, target_id, before, CHAT_PAGE_SIZE
+
+    def fetch_new_messages(self, key):
+        """Догрузка сообщений, пришедших после последнего загруженного"""
+        cached = self.conversations.setdefault(key, [])
+        if not cached and key not in self.has_older:
+            # Переписка открывается впервые - только последняя страница
+            self.fetch_older_messages(key)
+            return
 
-        try:
-            current_user = self.db.get_user_by_email(self.user_email)
-            if not current_user:
-                return
+        after_id = cached[-1][0] if cached else 0
+        # После перехода из поиска более новые сообщения догружаются страницами при прокрутке вниз
+        limit = CHAT_PAGE_SIZE if self.has_newer.get(key) else CHAT_FETCH_LIMIT
+        self.runner.run(("messages", self.session.id, key, after_id, limit),
+                        *self.since_query(key, after_id, limit),
+                        on_result=lambda messages: self.on_messages_loaded(key, after_id, limit, messages),
+                        on_error=lambda e: print(f"Ошибка загрузки сообщений: {e}"))
+
+    def on_messages_loaded(self, key, after_id, limit, messages):
+        """Добавление загруженных сообщений в кэш переписки и в чат"""
+        cached = self.conversations.setdefault(key, [])
+        # Эти сообщения уже добавлены другим обработчиком того же запроса
+        if (cached[-1][0] if cached else 0) != after_id:
+            return
+        cached.extend(messages)
+
+        # Пока сообщения загружались, пользователь мог открыть другой чат
+        if key == self.current_chat:
+            # Автопрокрутка вниз, если пользователь не читает старые сообщения
+            at_bottom = self.messages_view.is_at_bottom()
+            self.messages_model.append_messages(messages)
+            if at_bottom:
+                self.messages_view.scrollToBottom()
+            self.mark_conversation_read(key)
+
+        if self.has_newer.get(key):
+            self.has_newer[key] = len(messages) == limit
+        elif len(messages) == limit:
+            self.fetch_new_messages(key)
+
+    def fetch_older_messages(self, key):
+        """Загрузка предыдущей страницы истории (или последней, если переписка ещё не загружена)"""
+        if not self.has_older.get(key, True):
+            return
 
-            messages = self.db.get_chat_messages(current_user[0], recipient_id)
+        cached = self.conversations.setdefault(key, [])
 
-            for msg in messages:
-                self.add_message_to_chat(msg[0], msg[2], msg[3], current_user[0])
+        before = (cached[0][4], cached[0][0]) if cached else None
+        self.runner.run(("history", self.session.id, key, before),
+                        *self.before_query(key, before),
+                        on_result=lambda messages: self.on_history_loaded(key, before, messages),
+                        on_error=lambda e: print(f"Ошибка загрузки истории сообщений: {e}"))
 
-        except Exception as e:
-            print(f"Ошибка загрузки сообщений: {e}")
+    def on_history_loaded(self, key, before, messages):
+        """Добавление страницы истории в начало переписки"""
+        cached = self.conversations.setdefault(key, [])
+        # Страница уже добавлена другим обработчиком того же запроса
+        if ((cached[0][4], cached[0][0]) if cached else None) != before:
+            return
+        self.has_older[key] = len(messages) == CHAT_PAGE_SIZE
+        cached[:0] = messages
 
-    def add_message_to_chat(self, sender_id, text, timestamp, current_user_id):
-        """Добавление сообщения в чат"""
-        sender_name = self.get_user_name(sender_id)
+        if key != self.current_chat:
+            return
 
-        if isinstance(timestamp, QtCore.QDateTime):
-            timestamp_str = timestamp.toString('dd.MM.yyyy HH:mm')
-        elif hasattr(timestamp, 'strftime'):
-            timestamp_str = timestamp.strftime('%d.%m.%Y %H:%M')
+        if before is None:
+            self.show_conversation(key, cached)
+            self.mark_conversation_read(key)
         else:
-            timestamp_str = str(timestamp)
+            # Видимые сообщения остаются на месте, старые появляются выше
+            self.messages_view.keep_position(lambda: self.messages_model.prepend_messages(messages))
 
-        message_widget = QtWidgets.QWidget()
-        message_layout = QtWidgets.QVBoxLayout(message_widget)
-        message_layout.setContentsMargins(5, 5, 5, 5)
+        # Если страница поместилась целиком, прокрутки вверх не будет - догружаем сразу
+        if self.messages_view.is_at_top():
+            self.fetch_older_messages(key)
 
-        header = QtWidgets.QLabel(f"{sender_name} - {timestamp_str}")
-        header.setStyleSheet("font: bold 10pt 'Segoe UI';")
+    def mark_conversation_read(self, key):
+        """Сдвинуть отметку о прочтении открытой переписки до последнего сообщения"""
+        cached = self.conversations.get(key)
+        if not cached or cached[-1][0] <= self.read_markers.get(key, 0):
+            return
+        kind, target_id = key
+        try:
+            if kind == "channel":
+                self.db.mark_channel_read(target_id, self.session.id, cached[-1][0])
+            else:
+                self.db.mark_read(self.session.id, target_id, cached[-1][0])
+            self.read_markers[key] = cached[-1][0]
+        except Exception as e:
+            print(f"Ошибка сохранения отметки о прочтении: {e}")
+        self.unread.pop(key, None)
+        self.update_unread_badge(key)
 
-        message_text = QtWidgets.QLabel(text)
-        message_text.setWordWrap(True)
-        message_text.setStyleSheet("""
-            QLabel {
-                background: #E1E5FF;
-                border-radius: 10px;
-                padding: 8px;
-                margin: 2px;
-            }
-        """)
+    def show_conversation(self, key, messages):
+        """Показать переписку, прокрутив её к последнему сообщению"""
+        self.replacing_messages = True
+        try:
+            self.messages_model.set_messages(messages, key[0])
+            self.messages_view.scrollToBottom()
+        finally:
+            self.replacing_messages = False
+
+    def on_messages_scrolled(self, value):
+        """Догрузка истории при прокрутке к началу переписки"""
+        if self.replacing_messages or self.current_chat is None:
+            return
+        if self.messages_view.is_at_top():
+            self.fetch_older_messages(self.current_chat)
+        elif self.has_newer.get(self.current_chat) and self.messages_view.is_at_bottom():
+            self.fetch_new_messages(self.current_chat)
+
+    def search_messages(self):
+        """Поиск по личным перепискам пользователя"""
+        query = self.search_input.text().strip()
+        if not search_terms(query):
+            return
+        self.runner.run(("search", self.session.id, query), Database.search_messages, self.session.id, query,
+                        on_result=lambda hits: self.show_search_results(query, hits),
+                        on_error=lambda e: print(f"Ошибка поиска сообщений: {e}"))
 
-        if sender_id == current_user_id:
-            message_layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignRight)
-            message_text.setStyleSheet("""
-                QLabel {
-                    background: #94a5ff;
-                    color: white;
-                    border-radius: 10px;
-                    padding: 8px;
-                    margin: 2px;
-                }
-            """)
-        else:
-            message_layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignLeft)
+    def show_search_results(self, query, hits):
+        """Вывод найденных сообщений со ссылками для перехода к ним"""
+        if query != self.search_input.text().strip():
+            return
 
-        message_layout.addWidget(header)
-        message_layout.addWidget(message_text)
+        terms = search_terms(query)
+        blocks = []
+        for message_id, sender, recipient, text, sent_at, _ in hits:
+            peer_id = recipient if sender == self.session.id else sender
+            blocks.append(
+                f'<p><a href="message:{peer_id}:{message_id}">{html.escape(self.get_user_name(peer_id))}</a>'
+                f' <span style="color: gray;">{format_timestamp(sent_at)}</span><br>'
+                f'{highlight_snippet(text, terms)}</p>')
+        self.search_results.setHtml("".join(blocks) or "<p>Ничего не найдено</p>")
+
+        self.employees_list.hide()
+        self.search_results.show()
+
+    def on_search_text_changed(self, text):
+        """Возврат к списку сотрудников при очистке поиска"""
+        if not text.strip():
+            self.search_results.hide()
+            self.employees_list.show()
+
+    def on_search_result_clicked(self, url):
+        """Переход к найденному сообщению"""
+        _, peer_id, message_id = url.toString().split(":")
+        self.jump_to_message(("user", int(peer_id)), int(message_id))
+
+    def jump_to_message(self, key, message_id):
+        """Открыть переписку на найденном сообщении, загрузив только окно вокруг него"""
+        cached = self.conversations.get(key)
+        if cached and cached[0][0] <= message_id <= cached[-1][0]:
+            self.open_found_message(key, message_id)
+            return
 
-        self.messages_widget.layout().addWidget(message_widget)
+        self.runner.run(("around", self.session.id, key, message_id),
+                        Database.get_chat_messages_around, self.session.id, key[1], message_id,
+                        on_result=lambda window: self.on_window_loaded(key, message_id, window),
+                        on_error=lambda e: print(f"Ошибка загрузки сообщений: {e}"))
 
-        # Автопрокрутка вниз
-        scroll_bar = self.messages_area.verticalScrollBar()
-        scroll_bar.setValue(scroll_bar.maximum())
+    def on_window_loaded(self, key, message_id, window):
+        older, newer = window
+        if not newer:
+            return
+        half = CHAT_PAGE_SIZE // 2
+        self.conversations[key] = older + newer
+        self.has_older[key] = len(older) == half
+        self.has_newer[key] = len(newer) == half + 1
+        self.open_found_message(key, message_id)
+
+    def open_found_message(self, key, message_id):
+        """Показать переписку с выделенным найденным сообщением"""
+        self.current_chat = key
+        item = self.conversation_items.get(key)
+        if item is not None:
+            self.employees_list.setCurrentItem(item)
+
+        self.messages_model.highlight_id = message_id
+        self.show_conversation(key, self.conversations[key])
+        self.replacing_messages = True
+        try:
+            self.messages_view.scroll_to_message(message_id)
+        finally:
+            self.replacing_messages = False
 
     def get_user_name(self, user_id):
-        """Получение имени пользователя по ID"""
+        """Получение имени пользователя по ID из справочника сотрудников"""
         try:
-            sql = "SELECT firstname, name, lastname FROM userr WHERE iduser = %s"
-            self.db.cursor.execute(sql, (user_id,))
-            user = self.db.cursor.fetchone()
+            user = self.db.get_user(user_id)
             if user:
-                return f"{user[0]} {user[1]} {user[2]}"
+                return f"{user[1]} {user[2]} {user[3]}"
             return "Неизвестный"
         except Exception as e:
             print(f"Ошибка получения имени пользователя: {e}")
             return "Неизвестный"
 
+    def start_relay(self):
+        """Подписка на уведомления о новых сообщениях"""
+        self.relay = RelayClient(self.session.id, self)
+        self.relay.message_notified.connect(self.on_message_notified)
+        self.relay.channel_notified.connect(self.on_channel_notified)
+        self.relay.poll_due.connect(self.poll_incoming)
+        # Подключаемся, когда известно, с какого сообщения опрашивать БД при обрыве связи
+        self.runner.run(("last_incoming", self.session.id), Database.get_last_incoming_id, self.session.id,
+                        on_result=self.on_last_incoming_id,
+                        on_error=lambda e: print(f"Ошибка загрузки сообщений: {e}"))
+
+    def on_last_incoming_id(self, message_id):
+        if self.last_incoming_id is None:
+            self.last_incoming_id = message_id
+        self.relay.connect_to_relay()
+
+    def on_message_notified(self, sender_id, message_id):
+        """Новое сообщение от sender_id"""
+        self.last_incoming_id = max(self.last_incoming_id or 0, message_id)
+        if ("user", sender_id) == self.current_chat:
+            self.fetch_new_messages(self.current_chat)
+        else:
+            # Счётчики всех собеседников пересчитываются одним запросом
+            self.load_unread_counts()
+
+    def on_channel_notified(self, channel_id, message_id):
+        """Новое сообщение в канале channel_id (или приглашение в новый канал)"""
+        if ("channel", channel_id) == self.current_chat:
+            self.fetch_new_messages(self.current_chat)
+        else:
+            self.load_channels()
+
+    def poll_incoming(self):
+        """Проверка новых входящих сообщений в БД, когда ретранслятор недоступен"""
+        after_id = self.last_incoming_id or 0
+        self.runner.run(("incoming", self.session.id, after_id),
+                        Database.get_incoming_since, self.session.id, after_id,
+                        on_result=self.on_incoming_polled,
+                        on_error=self.on_poll_failed)
+        # Каналы опрашиваются целиком: счётчики приходят вместе со списком
+        self.load_channels()
+        if self.current_chat is not None and self.current_chat[0] == "channel":
+            self.fetch_new_messages(self.current_chat)
+
+    def on_incoming_polled(self, messages):
+        # По каждому собеседнику достаточно последнего сообщения
+        latest = {}
+        for message_id, sender_id in messages:
+            latest[sender_id] = message_id
+        for sender_id, message_id in latest.items():
+            self.on_message_notified(sender_id, message_id)
+        self.relay.poll_finished(bool(messages))
+
+    def on_poll_failed(self, error):
+        print(f"Ошибка проверки новых сообщений: {error}")
+        self.relay.poll_finished(False)
+
     def send_message(self):
         """Отправка сообщения"""
-        if not self.current_chat_user_id:
-            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите сотрудника для переписки")
+        if self.current_chat is None:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите сотрудника или канал для переписки")
             return
 
         message_text = self.message_input.text().strip()
         if not message_text:
             return
 
+        if self.post_message(self.current_chat, message_text):
+            self.message_input.clear()
+
+    def post_message(self, key, message_text, attachment=None):
+        """Запись сообщения в переписку key; возвращает True при успехе"""
+        kind, target_id = key
         try:
-            current_user = self.db.get_user_by_email(self.user_email)
-            if not current_user:
-                return
+            if kind == "channel":
+                message_id = self.db.send_channel_message(target_id, self.session.id, message_text, attachment)
+            else:
+                message_id = self.db.send_message(self.session.id, target_id, message_text, attachment)
+        except Exception as e:
+            print(f"Ошибка отправки сообщения: {e}")
+            message_id = None
+        if not message_id:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", "Не удалось отправить сообщение")
+            return False
 
-            self.db.send_message(current_user[0], self.current_chat_user_id, message_text)
+        # Окна получателей дочитают сообщение из БД по уведомлению ретранслятора
+        if kind == "channel":
+            self.relay.notify_channel(target_id, message_id)
+        else:
+            self.relay.notify_message(target_id, message_id)
 
-            current_time = QtCore.QDateTime.currentDateTime().toPyDateTime()
-            self.add_message_to_chat(current_user[0], message_text, current_time, current_user[0])
+        # Отправленное сообщение (и ответы, пришедшие до него) приходят вместе с ID
+        self.fetch_new_messages(key)
+        return True
 
-            self.message_input.clear()
+    def attach_file(self):
+        """Выбор файла и его загрузка в хранилище вложений в фоне"""
+        if self.current_chat is None:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите сотрудника или канал для переписки")
+            return
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Отправить файл")
+        if not path:
+            return
 
+        key = self.current_chat
+        transfer = ("upload", path)
+        self.runner.run(transfer, Database.store_blob, path,
+                        on_progress=lambda done, total: self.on_transfer_progress(transfer, done, total),
+                        on_result=lambda sha256: self.on_file_stored(transfer, key, path, sha256),
+                        on_error=lambda e: self.on_transfer_failed(transfer, "Не удалось загрузить файл", e))
+        self.on_transfer_progress(transfer, 0, 0)
+
+    def on_file_stored(self, transfer, key, path, sha256):
+        """Файл в хранилище - отправляем сообщение с вложением"""
+        self.finish_transfer(transfer)
+        filename = os.path.basename(path)
+        size = os.path.getsize(path)
+        self.post_message(key, f"📎 {filename} ({format_size(size)})", (sha256, filename))
+
+    def on_message_double_clicked(self, index):
+        """Сохранение вложения сообщения в файл"""
+        if self.current_chat is None:
+            return
+        try:
+            attachment = self.db.get_attachment(index.data(MessageIdRole), self.current_chat[0] == "channel")
         except Exception as e:
-            print(f"Ошибка отправки сообщения: {e}")
-            QtWidgets.QMessageBox.critical(self, "Ошибка", "Не удалось отправить сообщение")
+            print(f"Ошибка загрузки вложения: {e}")
+            return
+        if not attachment:
+            return
+
+        sha256, filename, size = attachment
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить вложение", filename)
+        if not path:
+            return
+
+        transfer = ("download", sha256, path)
+        self.runner.run(transfer, Database.read_blob, sha256, path,
+                        on_progress=lambda done, total: self.on_transfer_progress(transfer, done, total),
+                        on_result=lambda _: self.finish_transfer(transfer),
+                        on_error=lambda e: self.on_transfer_failed(transfer, "Не удалось сохранить файл", e))
+        self.on_transfer_progress(transfer, 0, size)
+
+    def on_transfer_progress(self, transfer, done, total):
+        self.transfers[transfer] = (done, total)
+        self.show_transfers()
+
+    def show_transfers(self):
+        """Общий ход всех идущих передач файлов"""
+        if not self.transfers:
+            self.transfer_bar.hide()
+            self.transfer_label.hide()
+            return
+        done = sum(progress[0] for progress in self.transfers.values())
+        total = sum(progress[1] for progress in self.transfers.values())
+        self.transfer_bar.setValue(int(1000 * done / total) if total else 0)
+        self.transfer_label.setText(f"Передача файлов: {len(self.transfers)}, "
+                                    f"{int(100 * done / total) if total else 0}%")
+        self.transfer_bar.show()
+        self.transfer_label.show()
+
+    def finish_transfer(self, transfer):
+        self.transfers.pop(transfer, None)
+        self.show_transfers()
+
+    def on_transfer_failed(self, transfer, message, error):
+        print(f"{message}: {error}")
+        self.finish_transfer(transfer)
+        QtWidgets.QMessageBox.critical(self, "Ошибка", message)
+
+    def create_channel(self):
+        """Диалог создания канала с выбором участников"""
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Новый канал")
+        dialog.setMinimumSize(400, 450)
+        layout = QtWidgets.QVBoxLayout(dialog)
+
+        name_input = QtWidgets.QLineEdit()
+        name_input.setPlaceholderText("Название канала")
+        layout.addWidget(name_input)
+
+        layout.addWidget(QtWidgets.QLabel("Участники:"))
+        members_list = QtWidgets.QListWidget()
+        try:
+            users = self.db.get_chat_users(self.session.id)
+        except Exception as e:
+            print(f"Ошибка загрузки сотрудников: {e}")
+            users = []
+        for user in users:
+            item = QtWidgets.QListWidgetItem(f"{user[1]} {user[2]} {user[3]} ({user[4]})")
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, user[0])
+            item.setFlags(item.flags() | QtCore.Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.CheckState.Unchecked)
+            members_list.addItem(item)
+        layout.addWidget(members_list)
+
+        button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.StandardButton.Ok |
+                                                QtWidgets.QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+
+        if dialog.exec() != QtWidgets.QDialog.DialogCode.Accepted:
+            return
+
+        name = name_input.text().strip()
+        member_ids = [members_list.item(row).data(QtCore.Qt.ItemDataRole.UserRole)
+                      for row in range(members_list.count())
+                      if members_list.item(row).checkState() == QtCore.Qt.CheckState.Checked]
+        if not name or not member_ids:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Укажите название канала и хотя бы одного участника")
+            return
+
+        channel_id = self.db.create_channel(name, self.session.id, member_ids)
+        if channel_id is None:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", "Не удалось создать канал")
+            return
+        # Участники подписываются на канал, не дожидаясь первого сообщения
+        self.relay.notify_channel(channel_id, 0, member_ids)
+        self.load_channels()
 
     # Методы навигации
     def go_home(self):
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
     def go_deal(self):
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_task(self):
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_client(self):
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -349,6 +809,8 @@ class ChatWindow(QtWidgets.QMainWindow, ChatForm):
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
+        self.relay.close()
+        self.runner.cancel_all()
         self.db.close()
         event.accept()
 
@@ -2,15 +2,14 @@ import sys
 from PyQt6 import QtWidgets, QtCore, QtGui
 from ui.date import Ui_MainWindow as DateForm
 from datetime import datetime
-from database import Database
+from database import Database, day_range
 
 
 class DateWindow(QtWidgets.QMainWindow, DateForm):
-    def __init__(self, user_email):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
-        self.current_user = None
+        self.session = session
         self.db = Database()
 
         # Добавляем QLabel для отображения текущей даты (перенесено ниже меню)
@@ -56,25 +55,15 @@ class DateWindow(QtWidgets.QMainWindow, DateForm):
 
     def load_user_data(self):
         """Загрузка данных пользователя"""
-        try:
-            self.current_user = self.db.get_user_by_email(self.user_email)
-            if self.current_user and hasattr(self, 'profil'):
-                self.profil.setText(
-                    f"{self.current_user[1]} {self.current_user[2]}\n"
-                    f"{self.current_user[6]} ({self.current_user[5]})"
-                )
-        except Exception as e:
-            print(f"Ошибка загрузки данных пользователя: {e}")
+        if hasattr(self, 'profil'):
+            self.profil.setText(self.session.profile_text())
 
     def load_calendar_data(self):
         """Загрузка данных для календаря"""
         try:
-            if not self.current_user:
-                return
-
             # Получаем даты задач и сделок пользователя
-            task_dates = self.db.get_user_task_dates(self.current_user[0])
-            deal_dates = self.db.get_user_deal_dates(self.current_user[0])
+            task_dates = self.db.get_user_task_dates(self.session.id)
+            deal_dates = self.db.get_user_deal_dates(self.session.id)
 
             # Форматируем даты для выделения в календаре
             self.highlight_dates(task_dates, deal_dates)
@@ -125,16 +114,13 @@ class DateWindow(QtWidgets.QMainWindow, DateForm):
     def on_date_selected(self):
         """Обработчик выбора даты в календаре"""
         selected_date = self.calendarWidget.selectedDate()
-        date_str = selected_date.toString("yyyy-MM-dd")
+        day_start, day_end = day_range(selected_date.toPyDate())
         self.date_label.setText(f"Выбрана дата: {selected_date.toString('dd.MM.yyyy')}")
 
         try:
-            if not self.current_user:
-                return
-
             # Получаем задачи и сделки на выбранную дату
-            tasks = self.db.get_tasks_for_date(self.current_user[0], date_str)
-            deals = self.db.get_deals_for_date(self.current_user[0], date_str)
+            tasks = self.db.get_tasks_for_date(self.session.id, day_start, day_end)
+            deals = self.db.get_deals_for_date(self.session.id, day_start, day_end)
 
             # Показываем информацию в диалоговом окне
             self.show_date_info(selected_date.toString("dd.MM.yyyy"), tasks, deals)
@@ -245,60 +231,60 @@ class DateWindow(QtWidgets.QMainWindow, DateForm):
     def go_home(self):
         """Переход на главный экран"""
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
     def go_task(self):
         """Переход к задачам"""
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_client(self):
         """Переход к клиентам"""
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         """Переход к сотрудникам"""
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_deal(self):
         """Переход к сделкам"""
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def go_chat(self):
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
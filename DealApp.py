@@ -1,31 +1,43 @@
-import sys
 import traceback
 from PyQt6 import QtWidgets, QtCore, QtGui
-from openpyxl.drawing.image import Image  # Добавляем импорт для работы с изображениями
-from openpyxl.worksheet.page import PageMargins  # Для настройки полей
 from ui.deals import Ui_MainWindow as DealForm
-from datetime import datetime
-from database import Database
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
-import io
+from database import Database, DEAL_PAGE_SIZE
+from worker import QueryRunner
+from tablemodel import Column, RowTableModel, RowFilterProxyModel, setup_table_view, add_filter_edit
+import invoices
+from invoicepdf import InvoicePreviewDialog, PdfCache
+
+
+# Цвет строки сделки по статусу
+STATUS_COLORS = {
+    "Не обработан": QtGui.QColor(255, 200, 200),
+    "Обработка": QtGui.QColor(255, 255, 200),
+    "Выставлен счёт/КП": QtGui.QColor(200, 255, 200),
+    "Оплата": QtGui.QColor(200, 200, 255),
+    "В производстве": QtGui.QColor(200, 255, 255),
+    "Завершен": QtGui.QColor(200, 200, 200),
+}
 
 
 class DealWindow(QtWidgets.QMainWindow, DealForm):
-    def __init__(self, user_email):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
-        self.current_user = None
-        self.deal_data = None
+        self.session = session
+        self.deals_after = None  # Ключ (date1, iddeal) последней загруженной сделки
+        self.has_more_deals = True
+        self.deals_generation = 0  # Номер перезагрузки таблицы, чтобы отбрасывать устаревшие страницы
         self.selected_deal_id = None
         self.db = Database()
+        self.runner = QueryRunner(self)
+        self.pdf_cache = PdfCache()
 
         self.init_ui()
         self.load_user_data()
         self.load_deals()
 
         self.pushButton.clicked.connect(self.add_new_deal)
+        self.batch_bills_button.clicked.connect(self.generate_bills_batch)
         self.pushButton_2.clicked.connect(self.logout)
         self.home.clicked.connect(self.go_home)
         self.task.clicked.connect(self.go_task)
@@ -38,86 +50,214 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
         self.notification.clicked.connect(self.show_notifications)
         self.help.clicked.connect(self.show_help)
 
-        self.tableWidget.cellDoubleClicked.connect(self.show_deal_details)
+        self.tableView.doubleClicked.connect(self.show_deal_details)
+        self.tableView.customContextMenuRequested.connect(self.show_deals_menu)
+        self.tableView.verticalScrollBar().valueChanged.connect(self.on_deals_scrolled)
 
     def init_ui(self):
         """Настройка интерфейса"""
-        self.tableWidget.setColumnCount(6)
-        self.tableWidget.setHorizontalHeaderLabels([
-            "ID", "Название", "Тип", "Статус", "Организация", "Исполнитель"
-        ])
-        self.tableWidget.setColumnWidth(0, 50)
-        self.tableWidget.setColumnWidth(1, 200)
-        self.tableWidget.setColumnWidth(2, 150)
-        self.tableWidget.setColumnWidth(3, 150)
-        self.tableWidget.setColumnWidth(4, 150)
-        self.tableWidget.setColumnWidth(5, 150)
-        self.tableWidget.setColumnHidden(0, True)
+        # Строки таблицы - кортежи из Database.get_deals_page, цвет строки - по статусу
+        self.deals_model = RowTableModel([
+            Column("ID", 0), Column("Название", 1), Column("Тип", 2),
+            Column("Статус", 3), Column("Организация", 4), Column("Исполнитель", 5)
+        ], row_background=lambda deal: STATUS_COLORS.get(deal[3]), parent=self)
+        self.deals_proxy = RowFilterProxyModel(self.deals_model, self)
+        setup_table_view(self.tableView, self.deals_proxy)
+        self.filter_edit = add_filter_edit(self.tableView, self.deals_proxy)
+
+        self.tableView.setColumnWidth(0, 50)
+        self.tableView.setColumnWidth(1, 200)
+        self.tableView.setColumnWidth(2, 150)
+        self.tableView.setColumnWidth(3, 150)
+        self.tableView.setColumnWidth(4, 150)
+        self.tableView.setColumnWidth(5, 150)
+        self.tableView.setColumnHidden(0, True)
+        # Несколько сделок выделяются с Ctrl/Shift, действия над ними - в контекстном меню
+        self.tableView.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tableView.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
+
+        # Пакетное формирование счетов - под кнопкой добавления сделки
+        self.batch_bills_button = QtWidgets.QPushButton("Счета пакетом", parent=self.centralwidget)
+        self.batch_bills_button.setGeometry(QtCore.QRect(260, 460, 181, 51))
+        self.batch_bills_button.setStyleSheet(self.pushButton.styleSheet())
+        self.batch_progress = None
 
     def load_user_data(self):
         """Загрузка данных пользователя"""
+        self.profil.setText(self.session.profile_text())
+
+        if self.session.role.lower() != 'менеджер':
+            self.pushButton.setVisible(False)
+        if self.session.role.lower() not in ('бухгалтер', 'админ'):
+            self.batch_bills_button.setVisible(False)
+
+    def load_deals(self):
+        """Загрузка первой страницы сделок в таблицу"""
+        # Текущие строки остаются на экране, пока не придёт первая страница
+        self.deals_after = None
+        self.deals_generation += 1
+        self.has_more_deals = True
+        self.fetch_more_deals()
+
+    def fetch_more_deals(self):
+        """Догрузка следующей страницы сделок в фоне"""
+        if not self.has_more_deals:
+            return
+
+        executor_id = self.session.id if self.session.role.lower() == 'менеджер' else None
+        generation, after = self.deals_generation, self.deals_after
+        # Повторные сигналы прокрутки до прихода страницы присоединяются к тому же запросу
+        self.runner.run(("deals", generation, executor_id, after),
+                        Database.get_deals_page, executor_id, after, DEAL_PAGE_SIZE,
+                        on_result=lambda deals: self.on_deals_loaded(generation, after, deals),
+                        on_error=lambda e: print(f"Ошибка загрузки сделок: {e}"))
+
+    def on_deals_loaded(self, generation, after, deals):
+        """Добавление загруженной страницы сделок"""
+        # Таблица перезагружена или страница уже добавлена
+        if generation != self.deals_generation or after != self.deals_after:
+            return
+
+        self.has_more_deals = len(deals) == DEAL_PAGE_SIZE
+        if deals:
+            self.deals_after = (deals[-1][6], deals[-1][0])
+        if after is None:
+            # Перезагрузка: меняются только строки, отличающиеся от показанных
+            self.deals_model.set_rows(deals)
+        else:
+            self.deals_model.append_rows(deals)
+
+    def on_deals_scrolled(self, value):
+        """Догрузка сделок при прокрутке к концу таблицы"""
+        if self.has_more_deals and value >= self.tableView.verticalScrollBar().maximum() - 5:
+            self.fetch_more_deals()
+
+    def find_deal(self, deal_id):
+        """Загруженная сделка по ID"""
+        return next((d for d in self.deals_model.rows() if d[0] == deal_id), None)
+
+    def selected_deals(self):
+        """Выделенные в таблице сделки"""
+        return [self.deals_proxy.row(index.row()) for index in self.tableView.selectionModel().selectedRows()]
+
+    def status_name(self, status_id):
+        return dict(self.db.get_all_deal_statuses()).get(status_id)
+
+    def update_deal_rows(self, deal_ids, changes):
+        """Изменить поля загруженных сделок без перезагрузки таблицы.
+
+        changes - {номер поля строки: новое значение}
+        """
+        deal_ids = set(deal_ids)
+        rows = []
+        for deal in self.deals_model.rows():
+            if deal[0] in deal_ids:
+                deal = list(deal)
+                for field, value in changes.items():
+                    deal[field] = value
+                deal = tuple(deal)
+            rows.append(deal)
+        self.deals_model.set_rows(rows)
+
+    def remove_deal_rows(self, deal_ids):
+        """Убрать сделки из таблицы без перезагрузки"""
+        deal_ids = set(deal_ids)
+        self.deals_model.set_rows([deal for deal in self.deals_model.rows() if deal[0] not in deal_ids])
+
+    def show_deals_menu(self, pos):
+        """Действия над выделенными сделками"""
+        deals = self.selected_deals()
+        if not deals:
+            return
+        role = self.session.role.lower()
+        # Менеджер меняет статус только своих сделок, передача и удаление - у админа
+        can_change_status = role == 'админ' or (
+                role == 'менеджер' and all(deal[5] == self.session.full_name for deal in deals))
+        can_manage = role == 'админ'
+        if not can_change_status and not can_manage:
+            return
+
+        menu = QtWidgets.QMenu(self)
+        if can_change_status:
+            menu.addAction(f"Изменить статус ({len(deals)})", lambda: self.bulk_change_status(deals))
+        if can_manage:
+            menu.addAction(f"Передать исполнителю ({len(deals)})", lambda: self.bulk_reassign(deals))
+            menu.addSeparator()
+            menu.addAction(f"Удалить ({len(deals)})", lambda: self.bulk_delete(deals))
+        menu.exec(self.tableView.viewport().mapToGlobal(pos))
+
+    def bulk_change_status(self, deals):
+        """Смена статуса выделенных сделок одной транзакцией"""
         try:
-            self.current_user = self.db.get_user_by_email(self.user_email)
-            if self.current_user:
-                self.profil.setText(
-                    f"{self.current_user[1]} {self.current_user[2]}\n"
-                    f"{self.current_user[6]} ({self.current_user[5]})"
-                )
+            statuses = self.db.get_all_deal_statuses()
+            names = [status_name for status_id, status_name in statuses]
+            current = names.index(deals[0][3]) if deals[0][3] in names else 0
+            name, ok = QtWidgets.QInputDialog.getItem(self, "Изменить статус",
+                                                      f"Новый статус для сделок ({len(deals)}):",
+                                                      names, current, False)
+            if not ok:
+                return
+            status_id = dict((status_name, status_id) for status_id, status_name in statuses)[name]
+            deal_ids = [deal[0] for deal in deals]
+            if self.db.update_deals_status(deal_ids, status_id):
+                self.update_deal_rows(deal_ids, {3: name})
+            else:
+                QtWidgets.QMessageBox.warning(self, "Ошибка", "Не удалось изменить статус сделок")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
-                if self.current_user[5].lower() != 'менеджер':
-                    self.pushButton.setVisible(False)
+    def bulk_reassign(self, deals):
+        """Передача выделенных сделок другому исполнителю одной транзакцией"""
+        try:
+            employees = self.db.get_all_employees()
+            # Исполнители сделок - менеджеры
+            managers = [e for e in employees if (e[5] or "").lower() == 'менеджер'] or employees
+            # Пустые имя или отчество не выводятся как "None"
+            names = [" ".join(p for p in e[1:4] if p) for e in managers]
+            name, ok = QtWidgets.QInputDialog.getItem(self, "Передать исполнителю",
+                                                      f"Исполнитель для сделок ({len(deals)}):",
+                                                      names, 0, False)
+            if not ok:
+                return
+            executor = managers[names.index(name)]
+            deal_ids = [deal[0] for deal in deals]
+            if self.db.update_deals_executor(deal_ids, executor[0]):
+                self.update_deal_rows(deal_ids, {5: name})
+            else:
+                QtWidgets.QMessageBox.warning(self, "Ошибка", "Не удалось передать сделки")
         except Exception as e:
-            print(f"Ошибка загрузки данных пользователя: {e}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
-    def load_deals(self):
-        """Загрузка сделок в таблицу"""
+    def bulk_delete(self, deals):
+        """Удаление выделенных сделок одной транзакцией"""
+        answer = QtWidgets.QMessageBox.question(
+            self, "Удаление сделок",
+            f"Удалить выделенные сделки ({len(deals)}) вместе со счетами?",
+            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No,
+            QtWidgets.QMessageBox.StandardButton.No)
+        if answer != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
         try:
-            if self.current_user[5].lower() == 'менеджер':
-                deals = self.db.get_deals_by_executor(self.current_user[0])
+            deal_ids = [deal[0] for deal in deals]
+            if self.db.delete_deals(deal_ids):
+                self.remove_deal_rows(deal_ids)
             else:
-                deals = self.db.get_all_deals()
-
-            self.deal_data = deals
-            self.tableWidget.setRowCount(len(deals))
-
-            for row, deal in enumerate(deals):
-                self.tableWidget.setItem(row, 0, QtWidgets.QTableWidgetItem(str(deal[0])))
-                self.tableWidget.setItem(row, 1, QtWidgets.QTableWidgetItem(deal[1]))
-                self.tableWidget.setItem(row, 2, QtWidgets.QTableWidgetItem(deal[2]))
-                self.tableWidget.setItem(row, 3, QtWidgets.QTableWidgetItem(deal[3]))
-                self.tableWidget.setItem(row, 4, QtWidgets.QTableWidgetItem(deal[4]))
-                self.tableWidget.setItem(row, 5, QtWidgets.QTableWidgetItem(deal[5]))
-
-                if deal[3] == "Не обработан":
-                    color = QtGui.QColor(255, 200, 200)
-                elif deal[3] == "Обработка":
-                    color = QtGui.QColor(255, 255, 200)
-                elif deal[3] == "Выставлен счёт/КП":
-                    color = QtGui.QColor(200, 255, 200)
-                elif deal[3] == "Оплата":
-                    color = QtGui.QColor(200, 200, 255)
-                elif deal[3] == "В производстве":
-                    color = QtGui.QColor(200, 255, 255)
-                elif deal[3] == "Завершен":
-                    color = QtGui.QColor(200, 200, 200)
-
-                for col in range(6):
-                    self.tableWidget.item(row, col).setBackground(color)
+                QtWidgets.QMessageBox.warning(self, "Ошибка", "Не удалось удалить сделки")
         except Exception as e:
-            print(f"Ошибка загрузки сделок: {e}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
-    def show_deal_details(self, row, column):
+    def show_deal_details(self, index):
         """Показ деталей сделки"""
         try:
-            self.selected_deal_id = int(self.tableWidget.item(row, 0).text())
-            deal = next((d for d in self.deal_data if d[0] == self.selected_deal_id), None)
+            self.selected_deal_id = self.deals_proxy.row(index.row())[0]
+            deal = self.find_deal(self.selected_deal_id)
             if not deal:
                 return
 
             # Проверяем, что в deal достаточно элементов
-            if len(deal) < 12:  # Если в кортеже меньше 12 элементов
+            if len(deal) < 13:  # Если в кортеже меньше 13 элементов
                 # Создаем новый кортеж с недостающими значениями, заполненными None
-                deal = deal + (None,) * (12 - len(deal))
+                deal = deal + (None,) * (13 - len(deal))
 
             dialog = QtWidgets.QDialog(self)
             dialog.setWindowTitle("Детали сделки")
@@ -143,10 +283,10 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
 
             # Показываем финансовую информацию для бухгалтеров, админов или менеджеров (если их сделка)
             show_finance = (
-                    self.current_user[5].lower() == 'бухгалтер' or
-                    self.current_user[5].lower() == 'админ' or
-                    (self.current_user[5].lower() == 'менеджер' and
-                     deal[5] == f"{self.current_user[1]} {self.current_user[2]} {self.current_user[3]}")
+                    self.session.role.lower() == 'бухгалтер' or
+                    self.session.role.lower() == 'админ' or
+                    (self.session.role.lower() == 'менеджер' and
+                     deal[5] == self.session.full_name)
             )
 
             if show_finance:
@@ -159,16 +299,16 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                 form_layout.addRow("Итоговая сумма:", QtWidgets.QLabel(total))
 
             # Добавляем возможность просмотра счета для тех, кто может видеть финансовую информацию
-            if show_finance and deal[11] is not None:  # Проверяем наличие счета (поле 11)
-                view_bill_btn = QtWidgets.QPushButton("Просмотреть счет")
-                view_bill_btn.clicked.connect(lambda: self.view_bill(deal[11]))
+            if show_finance and deal[11] is not None:  # Проверяем наличие счета (поле 11 - размер файла)
+                view_bill_btn = QtWidgets.QPushButton(f"Просмотреть счет ({max(1, deal[11] // 1024)} КБ)")
+                view_bill_btn.clicked.connect(lambda: self.view_bill(deal[0]))
                 form_layout.addRow("Счет:", view_bill_btn)
 
             layout.addLayout(form_layout)
             button_box = QtWidgets.QDialogButtonBox()
 
             # Бухгалтер может загрузить счет и указать цену только в определенных статусах
-            if (self.current_user[5].lower() == 'бухгалтер' and
+            if (self.session.role.lower() == 'бухгалтер' and
                     deal[3] in ["Обработка", "Выставлен счёт/КП"]):
 
                 # Проверяем, можно ли загружать счет (если еще не загружен)
@@ -184,8 +324,8 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                     set_price_btn.clicked.connect(lambda: self.set_price_nds(dialog))
 
             # Менеджер может менять статус только своих сделок
-            elif (self.current_user[5].lower() == 'менеджер' and
-                  deal[5] == f"{self.current_user[1]} {self.current_user[2]} {self.current_user[3]}"):
+            elif (self.session.role.lower() == 'менеджер' and
+                  deal[5] == self.session.full_name):
                 status_combo = QtWidgets.QComboBox()
                 statuses = self.db.get_all_deal_statuses()
                 for status_id, status_name in statuses:
@@ -211,197 +351,24 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить детали сделки: {str(e)}")
 
     def generate_bill(self, deal_id):
-        """Генерация счета с корректным отображением чисел и изображениями"""
+        """Генерация счета: (данные счета, файл XLSX) или None"""
         try:
             # 1. Получаем данные сделки
-            deal = next((d for d in self.deal_data if d[0] == deal_id), None)
+            deal = self.find_deal(deal_id)
             if not deal:
                 QtWidgets.QMessageBox.warning(self, "Ошибка", "Сделка не найдена")
                 return None
 
-            # 2. Получаем данные организации
-            org_data = self.db.get_organization_details(deal[4])
+            # 2. Получаем данные организации (поле 12 - ID организации)
+            org_data = self.db.get_organization_details(deal[12])
             if not org_data:
                 QtWidgets.QMessageBox.warning(self, "Ошибка", "Организация не найдена")
                 return None
 
-            # 3. Подготавливаем данные
-            supplier = {
-                'name': "ООО «НГ-СОФТ»",
-                'inn': "9729293217",
-                'kpp': "771701001",
-                'address': "г. Москва, ул. 1-я Мытищинская, д. 28, стр. 1",
-                'phone': "+7 (495) 682-26-20",
-                'director': "Сукиасян Р.Х."
-            }
-
-            client = {
-                'name': org_data.get('name', "Без названия"),
-                'inn': org_data.get('inn', "не указан"),
-                'kpp': org_data.get('kpp', "не указан"),
-                'address': org_data.get('address', "не указан")
-            }
-
-            # 4. Финансовые расчеты
-            price = float(deal[8]) if deal[8] else 0.0
-            nds = int(deal[9]) if deal[9] else 20
-            nds_sum = round(price * nds / 100, 2)
-            total = round(price + nds_sum, 2)
-
-            # 5. Создаем Excel-документ
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Счет"
-
-            # 6. Настройка стилей
-            bold = Font(bold=True, name='Arial', size=10)
-            header_font = Font(bold=True, name='Arial', size=12)
-            regular = Font(name='Arial', size=10)
-            center = Alignment(horizontal='center', vertical='center')
-            right = Alignment(horizontal='right', vertical='center')
-            left = Alignment(horizontal='left', vertical='center', wrap_text=True)
-            border = Border(left=Side(style='thin'), right=Side(style='thin'),
-                            top=Side(style='thin'), bottom=Side(style='thin'))
-            border_thick = Border(bottom=Side(style='thick'))
-
-            # 7. Устанавливаем ширину столбцов
-            column_widths = {
-                'A': 5,  # №
-                'B': 40,  # Наименование
-                'C': 8,  # Кол-во
-                'D': 5,  # Ед.
-                'E': 15,  # Цена
-                'F': 8,  # НДС
-                'G': 15,  # Сумма НДС
-                'H': 18  # Всего (увеличено для больших сумм)
-            }
-
-            for col, width in column_widths.items():
-                ws.column_dimensions[col].width = width
-
-            # 8. Заполнение шапки
-            # Номер счета и дата
-            ws.merge_cells('A1:H1')
-            ws['A1'] = f"Счет № {deal_id} от {datetime.now().strftime('%d.%m.%Y')}"
-            ws['A1'].font = header_font
-            ws['A1'].alignment = center
-
-            # Поставщик
-            ws.merge_cells('A3:B3')
-            ws['A3'] = "Поставщик:"
-            ws['A3'].font = bold
-
-            ws.merge_cells('C3:H3')
-            ws['C3'] = (f"{supplier['name']}\n"
-                        f"ИНН {supplier['inn']} КПП {supplier['kpp']}\n"
-                        f"Адрес: {supplier['address']}\n"
-                        f"Тел.: {supplier['phone']}")
-            ws['C3'].font = regular
-            ws['C3'].alignment = left
-            ws.row_dimensions[3].height = 60
-
-            # Покупатель
-            ws.merge_cells('A5:B5')
-            ws['A5'] = "Покупатель:"
-            ws['A5'].font = bold
-
-            ws.merge_cells('C5:H5')
-            ws['C5'] = (f"{client['name']}\n"
-                        f"ИНН {client['inn']} КПП {client['kpp']}\n"
-                        f"Адрес: {client['address']}")
-            ws['C5'].font = regular
-            ws['C5'].alignment = left
-            ws.row_dimensions[5].height = 45
-
-            # 9. Таблица товаров
-            headers = ["№", "Товары (работы, услуги)", "Кол-во", "Ед.", "Цена", "НДС", "Сумма НДС", "Всего"]
-
-            # Заголовки таблицы
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=7, column=col, value=header)
-                cell.font = bold
-                cell.border = border
-                cell.alignment = center
-
-            # Данные товара
-            data_row = [
-                1,  # №
-                deal[1],  # Наименование
-                1,  # Кол-во
-                "шт.",  # Ед.
-                price,  # Цена
-                f"{nds}%",  # НДС
-                nds_sum,  # Сумма НДС
-                total  # Всего
-            ]
-
-            for col, value in enumerate(data_row, 1):
-                cell = ws.cell(row=8, column=col, value=value)
-                cell.font = regular
-                cell.border = border
-                cell.alignment = center if col not in [2, 5, 7, 8] else right
-
-                # Форматирование числовых колонок
-                if col in [5, 7, 8]:
-                    cell.number_format = '#,##0.00'
-                    # Автоматическое расширение столбца для больших чисел
-                    if len(f"{value:,.2f}") > ws.column_dimensions[chr(64 + col)].width:
-                        ws.column_dimensions[chr(64 + col)].width = len(f"{value:,.2f}") + 2
-
-            # 10. Итого и Всего к оплате
-            ws.merge_cells('A10:G10')
-            ws['A10'] = "Итого:"
-            ws['A10'].font = bold
-            ws['H10'] = total
-            ws['H10'].font = bold
-            ws['H10'].number_format = '#,##0.00'
-            ws['H10'].border = border_thick
-
-            ws.merge_cells('A12:G12')
-            ws['A12'] = "Всего к оплате:"
-            ws['A12'].font = header_font
-            ws['H12'] = total
-            ws['H12'].font = header_font
-            ws['H12'].number_format = '#,##0.00'
-            ws['H12'].border = border_thick
-
-            # 11. Подпись и печать
-            try:
-                # Печать
-                pech_img = Image("res/pech.png")
-                pech_img.width = 100
-                pech_img.height = 100
-                ws.add_image(pech_img, "D15")
-
-                # Подпись
-                pod_img = Image("res/pod.png")
-                pod_img.width = 100
-                pod_img.height = 50
-                ws.add_image(pod_img, "F15")
-            except Exception as img_error:
-                print(f"Ошибка загрузки изображений: {img_error}")
-                # Запасной вариант
-                ws['D15'] = "[МЕСТО ДЛЯ ПЕЧАТИ]"
-                ws['F15'] = "[МЕСТО ДЛЯ ПОДПИСИ]"
-                ws['D15'].font = regular
-                ws['F15'].font = regular
-
-            # Подписи
-            ws['D17'] = "М.П."
-            ws['D17'].alignment = center
-            ws['F17'] = supplier['director']
-            ws['F17'].alignment = center
-
-            # 12. Настройка страницы
-            ws.page_margins = PageMargins(left=0.5, right=0.5, top=0.5, bottom=0.5)
-            ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
-            ws.page_setup.paperSize = ws.PAPERSIZE_A4
-
-            # 13. Сохранение
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return output.getvalue()
+            # 3. Формируем счет тем же кодом, что и пакетное формирование
+            data = invoices.invoice_data(deal_id, deal[1], deal[8], deal[9],
+                                         org_data.get('name'), org_data.get('inn'), org_data.get('kpp'))
+            return data, invoices.render_invoice(data)
 
         except Exception as e:
             traceback.print_exc()
@@ -413,7 +380,7 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
         """Генерация и сохранение счета"""
         try:
             # Получаем данные сделки
-            deal = next((d for d in self.deal_data if d[0] == self.selected_deal_id), None)
+            deal = self.find_deal(self.selected_deal_id)
 
             # Проверяем наличие названия организации
             if not deal[4] or not deal[4].strip():
@@ -422,7 +389,7 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                 return
 
             # Проверяем существование организации в базе
-            org_data = self.db.get_organization_details(deal[4])
+            org_data = self.db.get_organization_details(deal[12])
             if not org_data:
                 QtWidgets.QMessageBox.warning(self, "Ошибка",
                                               f"Организация '{deal[4]}' не найдена в базе данных.\n"
@@ -436,45 +403,142 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                 return
 
             # Генерируем счет
-            bill_data = self.generate_bill(self.selected_deal_id)
-            if not bill_data:
+            bill = self.generate_bill(self.selected_deal_id)
+            if not bill:
                 return
+            data, bill_data = bill
 
-            # Сохраняем в базу данных
-            if self.db.update_deal_bill(self.selected_deal_id, bill_data):
+            # Сохраняем в базу данных вместе с данными, по которым сформирован счет
+            if self.db.update_deal_bill(self.selected_deal_id, bill_data, data):
                 QtWidgets.QMessageBox.information(self, "Успех",
                                                   "Счет успешно сгенерирован и сохранен")
                 dialog.accept()
-                self.load_deals()
+                self.update_deal_rows([self.selected_deal_id], {11: len(bill_data)})
 
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка",
                                            f"Произошла ошибка при генерации счета: {str(e)}")
 
-    def view_bill(self, bill_data):
-        """Просмотр счета"""
+    def generate_bills_batch(self):
+        """Формирование счетов по всем сделкам, отобранным фильтром, в фоне"""
+        if self.runner.is_running("invoices"):
+            return
+
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Счета пакетом")
+        layout = QtWidgets.QFormLayout(dialog)
+
+        status_combo = QtWidgets.QComboBox()
+        status_combo.addItem("Все статусы", None)
         try:
-            # Создаем временный файл для просмотра
-            import tempfile
-            import os
-            import subprocess
-
-            # Определяем расширение файла
-            file_extension = '.xlsx'  # Так как мы генерируем только Excel-файлы
-
-            with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as temp_file:
-                temp_file.write(bill_data)
-                temp_file_path = temp_file.name
-
-            # Открываем файл с помощью стандартного приложения системы
-            if sys.platform == "win32":
-                os.startfile(temp_file_path)
-            elif sys.platform == "darwin":
-                subprocess.run(["open", temp_file_path])
-            else:
-                subprocess.run(["xdg-open", temp_file_path])
+            for status_id, status_name in self.db.get_all_deal_statuses():
+                status_combo.addItem(status_name, status_name)
+        except Exception as e:
+            print(f"Ошибка загрузки статусов: {e}")
+        layout.addRow("Статус:", status_combo)
+
+        date_from = QtWidgets.QDateEdit(QtCore.QDate.currentDate().addMonths(-1))
+        date_from.setCalendarPopup(True)
+        layout.addRow("Созданы с:", date_from)
+        date_to = QtWidgets.QDateEdit(QtCore.QDate.currentDate())
+        date_to.setCalendarPopup(True)
+        layout.addRow("по:", date_to)
+
+        regenerate = QtWidgets.QCheckBox("Пересоздать уже сформированные счета")
+        layout.addRow(regenerate)
+
+        button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.StandardButton.Ok |
+                                                QtWidgets.QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+
+        if dialog.exec() != QtWidgets.QDialog.DialogCode.Accepted:
+            return
+
+        first = date_from.date().toPyDate()
+        # Дата "по" включается в отбор
+        last = date_to.date().addDays(1).toPyDate()
+
+        self.batch_progress = QtWidgets.QProgressDialog("Формирование счетов...", "Отменить", 0, 0, self)
+        self.batch_progress.setWindowTitle("Счета пакетом")
+        self.batch_progress.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        self.batch_progress.setMinimumDuration(0)
+        self.batch_progress.canceled.connect(self.cancel_bills_batch)
+        self.batch_progress.show()
+
+        self.runner.run("invoices", invoices.generate_invoices,
+                        status_combo.currentData(), first, last, not regenerate.isChecked(),
+                        on_progress=self.on_bills_progress,
+                        on_result=self.on_bills_generated,
+                        on_error=self.on_bills_failed)
+
+    def on_bills_progress(self, done, total):
+        if self.batch_progress is not None:
+            self.batch_progress.setMaximum(total)
+            self.batch_progress.setValue(done)
+
+    def cancel_bills_batch(self):
+        # Счета, уже записанные в БД, остаются
+        self.runner.cancel("invoices")
+        self.batch_progress = None
+        self.load_deals()
+
+    def close_batch_progress(self):
+        if self.batch_progress is not None:
+            progress, self.batch_progress = self.batch_progress, None
+            # closeEvent диалога хода выполнения выдаёт canceled
+            progress.canceled.disconnect()
+            progress.close()
+
+    def on_bills_generated(self, report):
+        """Итог пакетного формирования счетов"""
+        self.close_batch_progress()
+        text = f"Сформировано счетов: {len(report['saved'])}"
+        if report['failed']:
+            text += f"\nНе удалось сформировать: {len(report['failed'])}"
+            details = "\n".join(f"Сделка {deal_id}: {error}" for deal_id, error in report['failed'])
+            box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Icon.Warning, "Счета пакетом", text,
+                                        parent=self)
+            box.setDetailedText(details)
+            box.exec()
+        else:
+            QtWidgets.QMessageBox.information(self, "Счета пакетом", text)
+        if report['saved']:
+            self.load_deals()
+
+    def on_bills_failed(self, error):
+        self.close_batch_progress()
+        print(f"Ошибка пакетного формирования счетов: {error}")
+        QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать счета: {error}")
+
+    def view_bill(self, deal_id):
+        """Просмотр счета в PDF в окне программы"""
+        try:
+            bill_info = self.db.get_deal_bill_info(deal_id)
+            if not bill_info:
+                QtWidgets.QMessageBox.warning(self, "Ошибка", "Счет не найден")
+                return
+            issued, data = bill_info
+
+            if data is None:
+                # Счет сохранен до хранения данных - строим по текущей сделке
+                deal = self.find_deal(deal_id)
+                if not deal:
+                    QtWidgets.QMessageBox.warning(self, "Ошибка", "Сделка не найдена")
+                    return
+                org_data = self.db.get_organization_details(deal[12]) or {}
+                data = invoices.invoice_data(deal_id, deal[1], deal[8], deal[9],
+                                             org_data.get('name'), org_data.get('inn'), org_data.get('kpp'))
+            # Счет, который уже открывали, берется из кэша без формирования
+            pdf = self.pdf_cache.get(data, issued)
+
+            preview = InvoicePreviewDialog(data, issued, pdf,
+                                           load_xlsx=lambda: self.db.get_deal_bill(deal_id), parent=self)
+            preview.exec()
 
         except Exception as e:
+            traceback.print_exc()
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось открыть счет: {str(e)}")
 
     def set_price_nds(self, dialog):
@@ -494,7 +558,9 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                     ):
                         QtWidgets.QMessageBox.information(self, "Успех", "Данные успешно обновлены")
                         dialog.accept()
-                        self.load_deals()
+                        self.update_deal_rows([self.selected_deal_id], {
+                            3: "Выставлен счёт/КП", 8: price, 9: nds, 10: total_price
+                        })
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
@@ -504,7 +570,7 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
             if self.db.update_deal_status(self.selected_deal_id, new_status_id):
                 QtWidgets.QMessageBox.information(self, "Успех", "Статус изменен")
                 dialog.accept()
-                self.load_deals()
+                self.update_deal_rows([self.selected_deal_id], {3: self.status_name(new_status_id)})
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
@@ -567,7 +633,7 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
                     name=name,
                     type_id=type_id,
                     org_id=org_id,
-                    executor_id=self.current_user[0],
+                    executor_id=self.session.id,
                     end_date=end_date
             ):
                 QtWidgets.QMessageBox.information(self, "Успех", "Сделка создана")
@@ -588,61 +654,61 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
     def go_home(self):
         """Переход на главный экран"""
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
     def go_task(self):
         """Переход к задачам"""
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_client(self):
         """Переход к клиентам"""
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         """Переход к сотрудникам"""
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_date(self):
         # Выход из системы
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def go_chat(self):
         # Выход из системы
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -653,6 +719,7 @@ class DealWindow(QtWidgets.QMainWindow, DealForm):
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
+        self.runner.cancel_all()
         self.db.close()
         event.accept()
 
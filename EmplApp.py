@@ -1,13 +1,14 @@
 from PyQt6 import QtWidgets, QtCore, QtGui
 from ui.employee import Ui_MainWindow as EmpForm
 from database import Database
+from tablemodel import Column, RowTableModel, RowFilterProxyModel, setup_table_view, add_filter_edit
 
 
 class EmplWindow(QtWidgets.QMainWindow, EmpForm):
-    def __init__(self, user_email=None):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
+        self.session = session
         self.db = Database()
 
         self.pushButton_2.clicked.connect(self.logout)
@@ -23,44 +24,39 @@ class EmplWindow(QtWidgets.QMainWindow, EmpForm):
         self.notification.clicked.connect(self.show_notifications)
         self.help.clicked.connect(self.show_help)
 
+        self.init_table()
         self.load_data()
         self.check_user_role()
 
+    def init_table(self):
+        """Настройка таблицы сотрудников"""
+        # Строки - (ID, фамилия, имя, отчество, email, роль, должность) из справочника сотрудников
+        self.emp_model = RowTableModel([
+            Column("Фамилия", 1), Column("Имя", 2), Column("Отчество", 3),
+            Column("Email", 4), Column("Роль", 5), Column("Должность", 6)
+        ], parent=self)
+        self.emp_proxy = RowFilterProxyModel(self.emp_model, self)
+        setup_table_view(self.tableView, self.emp_proxy)
+        self.filter_edit = add_filter_edit(self.tableView, self.emp_proxy)
+
+        self.tableView.setColumnWidth(0, 150)
+        self.tableView.setColumnWidth(1, 150)
+        self.tableView.setColumnWidth(2, 150)
+        self.tableView.setColumnWidth(3, 200)
+        self.tableView.setColumnWidth(4, 100)
+        self.tableView.setColumnWidth(5, 150)
+
     def load_data(self):
         try:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
-
-                employees = self.db.get_all_employees()
-
-                self.tableWidget.setColumnCount(6)
-                self.tableWidget.setHorizontalHeaderLabels(
-                    ["Фамилия", "Имя", "Отчество", "Email", "Роль", "Должность"])
-                self.tableWidget.setRowCount(len(employees))
-
-                for row, emp in enumerate(employees):
-                    for col, value in enumerate(emp):
-                        item = QtWidgets.QTableWidgetItem(str(value))
-                        self.tableWidget.setItem(row, col, item)
-
-                self.tableWidget.setColumnWidth(0, 150)
-                self.tableWidget.setColumnWidth(1, 150)
-                self.tableWidget.setColumnWidth(2, 150)
-                self.tableWidget.setColumnWidth(3, 200)
-                self.tableWidget.setColumnWidth(4, 100)
-                self.tableWidget.setColumnWidth(5, 150)
+            self.profil.setText(self.session.profile_text())
+            self.emp_model.set_rows(self.db.get_all_employees())
 
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
 
     def check_user_role(self):
-        try:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data and user_data[5] != "админ":
-                self.pushButton.hide()
-        except Exception as e:
-            print(f"Ошибка проверки роли: {e}")
+        if self.session.role != "админ":
+            self.pushButton.hide()
 
     def show_add_emp_dialog(self):
         dialog = QtWidgets.QDialog(self)
@@ -250,7 +246,7 @@ class EmplWindow(QtWidgets.QMainWindow, EmpForm):
 
     def go_home(self):
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
@@ -262,50 +258,50 @@ class EmplWindow(QtWidgets.QMainWindow, EmpForm):
 
     def go_client(self):
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_task(self):
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_deal(self):
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def go_chat(self):
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
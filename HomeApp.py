@@ -2,14 +2,16 @@ from PyQt6 import QtWidgets, QtCore
 from ui.home import Ui_MainWindow as HomeForm
 from datetime import datetime
 from database import Database
+from worker import QueryRunner
 
 
 class HomeWindow(QtWidgets.QMainWindow, HomeForm):
-    def __init__(self, user_email):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
+        self.session = session
         self.db = Database()
+        self.runner = QueryRunner(self)
 
         self.init_ui()
         self.load_data()
@@ -89,30 +91,34 @@ class HomeWindow(QtWidgets.QMainWindow, HomeForm):
 
     def load_data(self):
         """Загрузка данных"""
+        self.profil.setText(self.session.profile_text())
+
+        # Сделки за сегодня и счётчики задач одним запросом в фоне
+        self.runner.run(("dashboard", self.session.id), Database.get_dashboard_snapshot, self.session.id,
+                        on_result=self.show_snapshot,
+                        on_error=lambda e: print(f"Ошибка загрузки данных: {e}"))
+
+    def show_snapshot(self, snapshot):
+        """Отображение сводки главного окна"""
         try:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
-
-                # Очищаем старые карточки
-                for i in reversed(range(self.cards_layout.count())):
-                    self.cards_layout.itemAt(i).widget().setParent(None)
-
-                # Добавляем новые карточки
-                deals_stats = self.db.get_today_deals_stats()
-                for status, count, total in deals_stats:
-                    card = self.create_deal_card(status, count, total)
-                    self.cards_layout.addWidget(card)
-
-                # Если нет сделок, показываем сообщение
-                if not deals_stats:
-                    no_deals_label = QtWidgets.QLabel("Сегодня сделок нет")
-                    no_deals_label.setStyleSheet("font: 12pt 'Nirmala UI';")
-                    self.cards_layout.addWidget(no_deals_label)
-
-                tasks_count, urgent_count = self.db.get_user_tasks_count(user_data[0])
-                self.task_do.setText(str(tasks_count))
-                self.task_sos.setText(str(urgent_count))
+            # Очищаем старые карточки
+            for i in reversed(range(self.cards_layout.count())):
+                self.cards_layout.itemAt(i).widget().setParent(None)
+
+            # Добавляем новые карточки
+            deals_stats = snapshot['deals']
+            for status, count, total in deals_stats:
+                card = self.create_deal_card(status, count, total)
+                self.cards_layout.addWidget(card)
+
+            # Если нет сделок, показываем сообщение
+            if not deals_stats:
+                no_deals_label = QtWidgets.QLabel("Сегодня сделок нет")
+                no_deals_label.setStyleSheet("font: 12pt 'Nirmala UI';")
+                self.cards_layout.addWidget(no_deals_label)
+
+            self.task_do.setText(str(snapshot['tasks']))
+            self.task_sos.setText(str(snapshot['urgent']))
         except Exception as e:
             print(f"Ошибка загрузки данных: {e}")
 
@@ -125,60 +131,60 @@ class HomeWindow(QtWidgets.QMainWindow, HomeForm):
 
     def go_client(self):
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)  # Передаем email
+        self.client_window = ClientWindow(self.session)  # Передаем email
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)  # Передаем email
+        self.empl_window = EmplWindow(self.session)  # Передаем email
         self.empl_window.show()
         self.close()
 
     def go_task(self):
         # Выход из системы
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_deal(self):
         # Выход из системы
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         # Выход из системы
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def go_chat(self):
         # Выход из системы
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -189,5 +195,6 @@ class HomeWindow(QtWidgets.QMainWindow, HomeForm):
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
+        self.runner.cancel_all()
         self.db.close()
         event.accept()
\ No newline at end of file
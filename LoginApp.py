@@ -2,6 +2,7 @@ import sys
 from PyQt6 import QtWidgets
 from ui.auth import Ui_MainWindow as AuthForm
 from database import Database
+from session import Session
 
 
 class Authorization(QtWidgets.QMainWindow, AuthForm):
@@ -35,7 +36,8 @@ class Authorization(QtWidgets.QMainWindow, AuthForm):
                 # Создаем главное окно если его нет
                 if not self.home_window:
                     from HomeApp import HomeWindow
-                    self.home_window = HomeWindow(email)
+                    session = Session.from_row(email, user_data)
+                    self.home_window = HomeWindow(session)
 
                 self.home_window.show()
             else:
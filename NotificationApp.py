@@ -3,9 +3,9 @@ from PyQt6.QtCore import Qt
 
 
 class NotificationWindow(QtWidgets.QDialog):
-    def __init__(self, user_email, parent=None):
+    def __init__(self, session, parent=None):
         super().__init__(parent)
-        self.user_email = user_email
+        self.session = session
         self.setWindowTitle("Уведомления")
         self.setWindowModality(Qt.WindowModality.ApplicationModal)
         self.resize(500, 400)
@@ -90,16 +90,12 @@ class NotificationWindow(QtWidgets.QDialog):
             self.scroll_layout.itemAt(i).widget().setParent(None)
 
         try:
-            # Получаем данные пользователя
-            user_data = self.db.get_user_by_email(self.user_email)
-            if not user_data:
-                return
-
-            user_id = user_data[0]
+            user_id = self.session.id
 
             # Получаем задачи, которые скоро истекут (в течение 24 часов)
-            urgent_tasks = self.db.get_overdue_tasks(user_id)
-            today_tasks = self.db.get_today_tasks(user_id)
+            buckets = self.db.get_task_buckets(user_id)
+            urgent_tasks = buckets['overdue']
+            today_tasks = buckets['today']
 
             # Добавляем уведомления о задачах
             if urgent_tasks:
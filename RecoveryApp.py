@@ -311,3 +311,8 @@ class RecoveryWindow(QtWidgets.QMainWindow, RecoveryForm):
         self.login_window = Authorization()
         self.login_window.show()
         self.close()
+
+    def closeEvent(self, event):
+        """Обработчик закрытия окна"""
+        self.db.close()
+        event.accept()
@@ -5,10 +5,10 @@ import sys
 
 
 class SetWindow(QtWidgets.QMainWindow, SetForm):
-    def __init__(self, user_email=None):
+    def __init__(self, session):
         super().__init__()
         self.setupUi(self)
-        self.user_email = user_email
+        self.session = session
         self.db = Database()
 
         self.init_ui()
@@ -21,10 +21,8 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
         self.hide_admin_buttons()
 
         # Check if user is admin and show appropriate buttons
-        if self.user_email:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data and user_data[5] == 'админ':  # Check if role is admin
-                self.show_admin_buttons()
+        if self.session.role == 'админ':
+            self.show_admin_buttons()
 
     def hide_admin_buttons(self):
         """Hide admin-only buttons"""
@@ -44,11 +42,7 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
     def load_user_data(self):
         """Load user data to display"""
-        if self.user_email:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                # Display user info
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
+        self.profil.setText(self.session.profile_text())
 
     def setup_connections(self):
         """Setup button connections"""
@@ -79,9 +73,6 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
     def change_user_info(self, field):
         """Change user's name, firstname or lastname"""
-        if not self.user_email:
-            return
-
         # Create custom dialog with Russian buttons
         dialog = QtWidgets.QInputDialog(self)
         dialog.setWindowTitle(f"Изменить {self.get_field_name(field)}")
@@ -92,16 +83,15 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
         if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted and dialog.textValue():
             text = dialog.textValue()
             try:
-                user_data = self.db.get_user_by_email(self.user_email)
-                if user_data:
-                    if self.db.update_user_info(user_data[0], field, text):
-                        # Reload user data
-                        self.load_user_data()
-                        QtWidgets.QMessageBox.information(
-                            self,
-                            "Успех",
-                            f"{self.get_field_name(field).capitalize()} успешно изменено"
-                        )
+                if self.db.update_user_info(self.session.id, field, text):
+                    # Refresh the session so every window sees the new name
+                    self.session.refresh(self.db)
+                    self.load_user_data()
+                    QtWidgets.QMessageBox.information(
+                        self,
+                        "Успех",
+                        f"{self.get_field_name(field).capitalize()} успешно изменено"
+                    )
             except Exception as e:
                 QtWidgets.QMessageBox.critical(
                     self,
@@ -120,9 +110,6 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
     def manage_entity(self, entity_type):
         """Manage different entities (posts, task types, etc.)"""
-        if not self.user_email:
-            return
-
         # Get current entities
         if entity_type == 'post':
             entities = self.db.get_all_posts()
@@ -244,9 +231,6 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
     def add_new_role(self):
         """Add new role to the system"""
-        if not self.user_email:
-            return
-
         # Create custom dialog with Russian buttons
         dialog = QtWidgets.QInputDialog(self)
         dialog.setWindowTitle("Добавить роль")
@@ -272,56 +256,56 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
     def go_home(self):
         from HomeApp import HomeWindow
-        self.home_window = HomeWindow(self.user_email)
+        self.home_window = HomeWindow(self.session)
         self.home_window.show()
         self.close()
 
     def go_deal(self):
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_task(self):
         from TaskApp import TaskWindow
-        self.task_window = TaskWindow(self.user_email)
+        self.task_window = TaskWindow(self.session)
         self.task_window.show()
         self.close()
 
     def go_client(self):
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_chat(self):
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -343,7 +327,13 @@ class SetWindow(QtWidgets.QMainWindow, SetForm):
 
 if __name__ == "__main__":
     import sys
+    from session import Session
     app = QtWidgets.QApplication(sys.argv)
-    window = SetWindow("i.oleg@ng-soft.ru")
+    db = Database()
+    try:
+        session = Session.load(db, "i.oleg@ng-soft.ru")
+    finally:
+        db.close()
+    window = SetWindow(session)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -2,16 +2,39 @@ from PyQt6 import QtWidgets, QtCore, QtGui
 from datetime import datetime
 from ui.tasks import Ui_MainWindow as TaskForm
 from database import Database
+from worker import QueryRunner
+from tablemodel import Column, RowTableModel, RowFilterProxyModel, setup_table_view
 
 
 
+# Столбец с действием над задачей
+ACTION_COLUMN = 4
+
+OVERDUE_BACKGROUND = QtGui.QColor(255, 230, 230)
+OVERDUE_FOREGROUND = QtGui.QColor(200, 0, 0)
+ACTION_BACKGROUND = QtGui.QColor("#4CAF50")
+ACTION_FOREGROUND = QtGui.QColor("white")
+
+
+def format_deadline(value):
+    """Срок задачи для таблицы"""
+    if isinstance(value, datetime):
+        return value.strftime("%d.%m.%Y %H:%M")
+    return str(value) if value else ""
+
+
+def is_overdue(task):
+    return isinstance(task[4], datetime) and task[4] < datetime.now()
+
+
 class TaskWindow(QtWidgets.QMainWindow, TaskForm):
-    def __init__(self, user_email=None):
+    def __init__(self, session):
         super().__init__()
         try:
             self.setupUi(self)
-            self.user_email = user_email
+            self.session = session
             self.db = Database()
+            self.runner = QueryRunner(self)
 
             # Инициализация таблиц
             self.overdue_table = None
@@ -65,9 +88,21 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
 
     def create_table(self):
         """Создание и настройка таблицы задач"""
-        table = QtWidgets.QTableWidget()
-        table.setColumnCount(5)
-        table.setHorizontalHeaderLabels(["Тип", "Описание", "От кого", "Срок", "Действие"])
+        # Строки - (ID, тип, описание, от кого, срок) из Database.get_task_buckets
+        model = RowTableModel([
+            Column("Тип", 1),
+            Column("Описание", 2, tooltip=True),
+            Column("От кого", 3),
+            Column("Срок", 4, format_deadline,
+                   background=lambda task: OVERDUE_BACKGROUND if is_overdue(task) else None,
+                   foreground=lambda task: OVERDUE_FOREGROUND if is_overdue(task) else None),
+            Column("Действие", None, lambda _: "Выполнить",
+                   background=lambda task: ACTION_BACKGROUND,
+                   foreground=lambda task: ACTION_FOREGROUND)
+        ], parent=self)
+        table = QtWidgets.QTableView()
+        setup_table_view(table, RowFilterProxyModel(model, table))
+        table.clicked.connect(self.on_task_clicked)
 
         # Настройка поведения столбцов
         table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
@@ -77,14 +112,12 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
         table.horizontalHeader().setSectionResizeMode(4, QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
 
         table.verticalHeader().setVisible(False)
-        table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         table.setWordWrap(True)
         table.setTextElideMode(QtCore.Qt.TextElideMode.ElideNone)
 
         # Стилизация таблицы
         table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 font: 12pt "Segoe UI";
                 border: 1px solid #d6d6d6;
                 gridline-color: #d6d6d6;
@@ -98,12 +131,12 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
                 border: 1px solid #7a8eff;
                 border-radius: 0px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 border-right: 1px solid #d6d6d6;
                 border-bottom: 1px solid #d6d6d6;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #94a5ff;
                 color: white;
             }
@@ -112,20 +145,6 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
                 border: 1px solid #7a8eff;
                 border-radius: 0px;
             }
-            QPushButton {
-                background-color: #4CAF50;
-                color: white;
-                border: none;
-                padding: 5px 10px;
-                text-align: center;
-                text-decoration: none;
-                font-size: 12px;
-                margin: 2px;
-                border-radius: 3px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
         """)
 
         table.verticalHeader().setDefaultSectionSize(60)
@@ -143,25 +162,26 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
     def load_data(self):
         """Загрузка данных о пользователе и задачах"""
         try:
-            user_data = self.db.get_user_by_email(self.user_email)
-            if user_data:
-                self.profil.setText(f"{user_data[1]} {user_data[2]}\n{user_data[6]} ({user_data[5]})")
-                self.load_user_tasks(user_data[0])
+            self.profil.setText(self.session.profile_text())
+            self.load_user_tasks(self.session.id)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
 
     def load_user_tasks(self, user_id):
         """Загрузка задач пользователя по категориям"""
+        # Загрузка задач из базы данных одним запросом в фоне
+        self.runner.run(("tasks", user_id), Database.get_task_buckets, user_id,
+                        on_result=self.show_tasks,
+                        on_error=lambda e: QtWidgets.QMessageBox.critical(
+                            self, "Ошибка", f"Ошибка загрузки задач: {str(e)}"))
+
+    def show_tasks(self, buckets):
+        """Заполнение таблиц задачами по категориям"""
         try:
-            # Загрузка задач из базы данных
-            overdue_tasks = self.db.get_overdue_tasks(user_id)
-            today_tasks = self.db.get_today_tasks(user_id)
-            future_tasks = self.db.get_future_tasks(user_id)
-
             # Заполнение таблиц
-            self.fill_table(self.overdue_table, overdue_tasks)
-            self.fill_table(self.today_table, today_tasks)
-            self.fill_table(self.future_table, future_tasks)
+            self.fill_table(self.overdue_table, buckets['overdue'])
+            self.fill_table(self.today_table, buckets['today'])
+            self.fill_table(self.future_table, buckets['future'])
 
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки задач: {str(e)}")
@@ -169,43 +189,16 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
     def fill_table(self, table, tasks):
         """Заполнение таблицы задачами"""
         try:
-            table.setRowCount(len(tasks))
-
-            for row, task in enumerate(tasks):
-                task_id = task[0]
-                for col, value in enumerate(task[1:]):
-                    item = QtWidgets.QTableWidgetItem(str(value) if value else "")
-                    item.setFlags(QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable)
-
-                    if col == 1:  # Столбец с описанием
-                        item.setToolTip(str(value))
-
-                    if col == 3 and value:  # Столбец с датой
-                        if isinstance(value, datetime):
-                            item.setText(value.strftime("%d.%m.%Y %H:%M"))
-                            if value < datetime.now():
-                                item.setBackground(QtGui.QColor(255, 230, 230))
-                                item.setForeground(QtGui.QColor(200, 0, 0))
-                        else:
-                            item.setText(str(value))
-
-                    table.setItem(row, col, item)
-
-                # Добавляем кнопку выполнения
-                self.add_complete_button(table, row, task_id)
-                table.resizeRowToContents(row)
-
-            table.resizeColumnsToContents()
-            table.horizontalHeader().setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeMode.Stretch)
+            table.model().sourceModel().set_rows(tasks)
+            table.resizeRowsToContents()
 
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка заполнения таблицы: {str(e)}")
 
-    def add_complete_button(self, table, row, task_id):
-        """Добавление кнопки выполнения задачи"""
-        btn = QtWidgets.QPushButton("Выполнить")
-        btn.clicked.connect(lambda: self.complete_task(task_id))
-        table.setCellWidget(row, 4, btn)
+    def on_task_clicked(self, index):
+        """Щелчок по «Выполнить» отмечает задачу выполненной"""
+        if index.column() == ACTION_COLUMN:
+            self.complete_task(index.model().row(index.row())[0])
 
     def complete_task(self, task_id):
         """Отметка задачи как выполненной"""
@@ -301,7 +294,7 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
     def load_recipients(self):
         """Загрузка списка сотрудников"""
         try:
-            recipients = self.db.get_other_users(self.user_email)
+            recipients = self.db.get_other_users(self.session.id)
             self.recipient_combo.clear()
             for recipient in recipients:
                 self.recipient_combo.addItem(recipient[1], recipient[0])
@@ -320,11 +313,8 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
                 QtWidgets.QMessageBox.warning(self, "Ошибка", "Введите описание задачи")
                 return
 
-            # Получаем ID отправителя
-            sender_id = self.db.get_user_by_email(self.user_email)[0]
-
             # Добавляем задачу
-            if self.db.create_task(task_type_id, description, sender_id, recipient_id, deadline):
+            if self.db.create_task(task_type_id, description, self.session.id, recipient_id, deadline):
                 # Обновляем список задач
                 self.load_data()
                 dialog.accept()
@@ -339,7 +329,7 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
         """Возврат на главное окно"""
         try:
             from HomeApp import HomeWindow
-            self.home_window = HomeWindow(self.user_email)
+            self.home_window = HomeWindow(self.session)
             self.home_window.show()
             self.close()
         except Exception as e:
@@ -357,50 +347,50 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
 
     def go_client(self):
         from ClientApp import ClientWindow
-        self.client_window = ClientWindow(self.user_email)
+        self.client_window = ClientWindow(self.session)
         self.client_window.show()
         self.close()
 
     def go_empl(self):
         from EmplApp import EmplWindow
-        self.empl_window = EmplWindow(self.user_email)
+        self.empl_window = EmplWindow(self.session)
         self.empl_window.show()
         self.close()
 
     def go_deal(self):
         from DealApp import DealWindow
-        self.deal_window = DealWindow(self.user_email)
+        self.deal_window = DealWindow(self.session)
         self.deal_window.show()
         self.close()
 
     def go_date(self):
         from DateApp import DateWindow
-        self.date_window = DateWindow(self.user_email)
+        self.date_window = DateWindow(self.session)
         self.date_window.show()
         self.close()
 
     def go_sett(self):
         from SetApp import SetWindow
-        self.set_window = SetWindow(self.user_email)
+        self.set_window = SetWindow(self.session)
         self.set_window.show()
         self.close()
 
     def go_chat(self):
         from ChatApp import ChatWindow
-        self.chat_window = ChatWindow(self.user_email)
+        self.chat_window = ChatWindow(self.session)
         self.chat_window.show()
         self.close()
 
     def go_ana(self):
         from AnApp import AnWindow
-        self.ana_window = AnWindow(self.user_email)
+        self.ana_window = AnWindow(self.session)
         self.ana_window.show()
         self.close()
 
     def show_notifications(self):
         from NotificationApp import NotificationWindow
         """Показать уведомления"""
-        self.notification_window = NotificationWindow(self.user_email)
+        self.notification_window = NotificationWindow(self.session)
         self.notification_window.exec()
 
     def show_help(self):
@@ -412,6 +402,7 @@ class TaskWindow(QtWidgets.QMainWindow, TaskForm):
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
         try:
+            self.runner.cancel_all()
             self.db.close()
             event.accept()
         except Exception as e:
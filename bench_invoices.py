@@ -0,0 +1,215 @@
+"""Замер времени формирования счёта: прежний код и шаблон invoices.InvoiceTemplate.
+
+Запуск: python bench_invoices.py [N]
+
+render_invoice_baseline() - замороженная копия DealApp.generate_bill до
+появления шаблона (без обращений к окну и БД). Она нужна только как точка
+отсчёта для замера и не должна меняться вместе с invoices.py.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import datetime
+
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.worksheet.page import PageMargins
+
+from invoices import RES_DIR, SUPPLIER, get_template, invoice_data
+
+
+def render_invoice_baseline(data, issued=None):
+    """Счёт так, как его формировал DealApp.generate_bill до шаблона.
+
+    Стили, разметка и полноразмерные печать и подпись готовятся заново
+    для каждого счёта.
+    """
+    client = data['client']
+    supplier = SUPPLIER
+    issued = issued or datetime.now()
+
+    # Финансовые расчеты
+    price = data['price']
+    nds = data['nds']
+    nds_sum = round(price * nds / 100, 2)
+    total = round(price + nds_sum, 2)
+
+    # Создаем Excel-документ
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Счет"
+
+    # Настройка стилей
+    bold = Font(bold=True, name='Arial', size=10)
+    header_font = Font(bold=True, name='Arial', size=12)
+    regular = Font(name='Arial', size=10)
+    center = Alignment(horizontal='center', vertical='center')
+    right = Alignment(horizontal='right', vertical='center')
+    left = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    border_thick = Border(bottom=Side(style='thick'))
+
+    # Устанавливаем ширину столбцов
+    column_widths = {
+        'A': 5,  # №
+        'B': 40,  # Наименование
+        'C': 8,  # Кол-во
+        'D': 5,  # Ед.
+        'E': 15,  # Цена
+        'F': 8,  # НДС
+        'G': 15,  # Сумма НДС
+        'H': 18  # Всего (увеличено для больших сумм)
+    }
+
+    for col, width in column_widths.items():
+        ws.column_dimensions[col].width = width
+
+    # Номер счета и дата
+    ws.merge_cells('A1:H1')
+    ws['A1'] = f"Счет № {data['deal_id']} от {issued.strftime('%d.%m.%Y')}"
+    ws['A1'].font = header_font
+    ws['A1'].alignment = center
+
+    # Поставщик
+    ws.merge_cells('A3:B3')
+    ws['A3'] = "Поставщик:"
+    ws['A3'].font = bold
+
+    ws.merge_cells('C3:H3')
+    ws['C3'] = (f"{supplier['name']}\n"
+                f"ИНН {supplier['inn']} КПП {supplier['kpp']}\n"
+                f"Адрес: {supplier['address']}\n"
+                f"Тел.: {supplier['phone']}")
+    ws['C3'].font = regular
+    ws['C3'].alignment = left
+    ws.row_dimensions[3].height = 60
+
+    # Покупатель
+    ws.merge_cells('A5:B5')
+    ws['A5'] = "Покупатель:"
+    ws['A5'].font = bold
+
+    ws.merge_cells('C5:H5')
+    ws['C5'] = (f"{client['name']}\n"
+                f"ИНН {client['inn']} КПП {client['kpp']}\n"
+                f"Адрес: {client['address']}")
+    ws['C5'].font = regular
+    ws['C5'].alignment = left
+    ws.row_dimensions[5].height = 45
+
+    # Таблица товаров
+    headers = ["№", "Товары (работы, услуги)", "Кол-во", "Ед.", "Цена", "НДС", "Сумма НДС", "Всего"]
+
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=7, column=col, value=header)
+        cell.font = bold
+        cell.border = border
+        cell.alignment = center
+
+    data_row = [1, data['title'], 1, "шт.", price, f"{nds}%", nds_sum, total]
+
+    for col, value in enumerate(data_row, 1):
+        cell = ws.cell(row=8, column=col, value=value)
+        cell.font = regular
+        cell.border = border
+        cell.alignment = center if col not in [2, 5, 7, 8] else right
+
+        if col in [5, 7, 8]:
+            cell.number_format = '#,##0.00'
+            if len(f"{value:,.2f}") > ws.column_dimensions[chr(64 + col)].width:
+                ws.column_dimensions[chr(64 + col)].width = len(f"{value:,.2f}") + 2
+
+    # Итого и Всего к оплате
+    ws.merge_cells('A10:G10')
+    ws['A10'] = "Итого:"
+    ws['A10'].font = bold
+    ws['H10'] = total
+    ws['H10'].font = bold
+    ws['H10'].number_format = '#,##0.00'
+    ws['H10'].border = border_thick
+
+    ws.merge_cells('A12:G12')
+    ws['A12'] = "Всего к оплате:"
+    ws['A12'].font = header_font
+    ws['H12'] = total
+    ws['H12'].font = header_font
+    ws['H12'].number_format = '#,##0.00'
+    ws['H12'].border = border_thick
+
+    # Подпись и печать: исходные файлы целиком
+    try:
+        pech_img = Image(os.path.join(RES_DIR, "pech.png"))
+        pech_img.width = 100
+        pech_img.height = 100
+        ws.add_image(pech_img, "D15")
+
+        pod_img = Image(os.path.join(RES_DIR, "pod.png"))
+        pod_img.width = 100
+        pod_img.height = 50
+        ws.add_image(pod_img, "F15")
+    except Exception as img_error:
+        print(f"Ошибка загрузки изображений: {img_error}")
+        ws['D15'] = "[МЕСТО ДЛЯ ПЕЧАТИ]"
+        ws['F15'] = "[МЕСТО ДЛЯ ПОДПИСИ]"
+        ws['D15'].font = regular
+        ws['F15'].font = regular
+
+    ws['D17'] = "М.П."
+    ws['D17'].alignment = center
+    ws['F17'] = supplier['director']
+    ws['F17'].alignment = center
+
+    # Настройка страницы
+    ws.page_margins = PageMargins(left=0.5, right=0.5, top=0.5, bottom=0.5)
+    ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
+    ws.page_setup.paperSize = ws.PAPERSIZE_A4
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def benchmark(count):
+    """Время формирования одного счёта: прежний код и общий шаблон"""
+    samples = [invoice_data(i, f"Внедрение CRM, этап {i}", 10000 + i * 137.5, 20,
+                            f"ООО «Клиент {i}»", f"77{i:08d}", "770101001")
+               for i in range(1, count + 1)]
+
+    # Прогрев: загрузка модулей openpyxl и PIL, чтение картинок, заготовка шаблона
+    template = get_template()
+    render_invoice_baseline(samples[0])
+    template.render(samples[0])
+
+    # Варианты чередуются, чтобы фоновая нагрузка влияла на оба одинаково
+    rebuilt = cached = 0.0
+    for data in samples:
+        started = time.perf_counter()
+        render_invoice_baseline(data)
+        rebuilt += time.perf_counter() - started
+
+        started = time.perf_counter()
+        template.render(data)
+        cached += time.perf_counter() - started
+    rebuilt /= count
+    cached /= count
+
+    print(f"Счетов: {count}")
+    print(f"Прежний код:  {rebuilt * 1000:.1f} мс на счёт")
+    print(f"Общий шаблон: {cached * 1000:.1f} мс на счёт")
+    print(f"Ускорение:    {rebuilt / cached:.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени формирования счетов crm")
+    parser.add_argument("count", type=int, nargs="?", default=200, help="число счетов (по умолчанию 200)")
+    args = parser.parse_args(argv)
+    benchmark(args.count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import threading
+import time
+
+
+# Справочники: первый столбец - ID, второй - название
+REFERENCE_TABLES = {
+    'statusdeal': "SELECT idstatusdeal, name FROM statusdeal ORDER BY name",
+    'typedeal': "SELECT idtypedeal, name FROM typedeal ORDER BY name",
+    'post': "SELECT idpost, name FROM post ORDER BY name",
+    'role': "SELECT idrole, name FROM role ORDER BY name",
+    'typetask': "SELECT idtypetask, name FROM typetask ORDER BY name",
+    'organization': "SELECT idorganization, name, inn, kpp FROM organization"
+}
+
+# Сколько секунд хранить таблицу: организации добавляют и правят в других копиях приложения
+REFERENCE_MAX_AGE = {
+    'organization': 300
+}
+
+
+class ReferenceCache:
+    """Кэш справочных таблиц с поиском по ID и по названию.
+
+    Таблица читается из БД при первом обращении и хранится до вызова
+    invalidate(), который делают методы Database, изменяющие справочники.
+    Таблицы из max_age дополнительно перечитываются не реже чем раз в
+    указанное число секунд.
+    """
+
+    def __init__(self, queries, max_age=None):
+        self._queries = queries
+        self._max_age = max_age or {}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _table(self, cursor, table):
+        """Загрузить таблицу, если её нет в кэше или она устарела"""
+        with self._lock:
+            cached = self._tables.get(table)
+            max_age = self._max_age.get(table)
+            if cached is not None and max_age is not None and time.monotonic() - cached['loaded_at'] > max_age:
+                cached = None
+            if cached is None:
+                cursor.execute(self._queries[table])
+                rows = tuple(cursor.fetchall())
+                cached = {
+                    'rows': rows,
+                    'by_id': {row[0]: row for row in rows},
+                    'by_name': {row[1]: row for row in rows},
+                    'loaded_at': time.monotonic()
+                }
+                self._tables[table] = cached
+            return cached
+
+    def rows(self, cursor, table):
+        """Все строки справочника"""
+        return list(self._table(cursor, table)['rows'])
+
+    def get(self, cursor, table, entity_id):
+        """Строка справочника по ID"""
+        return self._table(cursor, table)['by_id'].get(entity_id)
+
+    def id_by_name(self, cursor, table, name):
+        """ID элемента справочника по названию"""
+        row = self._table(cursor, table)['by_name'].get(name)
+        return row[0] if row else None
+
+    def invalidate(self, table=None):
+        """Сбросить одну таблицу или весь кэш"""
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+
+class TTLCache:
+    """Кэш значений с ограниченным временем жизни.
+
+    Подходит для данных, которые меняются и в других копиях приложения:
+    свои изменения сбрасывают кэш через invalidate(), чужие становятся
+    видны не позже чем через ttl секунд.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._items = {}  # ключ -> (значение, момент устаревания)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Значение по ключу или None, если его нет или оно устарело"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            return value
+
+    def put(self, key, value):
+        """Сохранить значение"""
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        """Сбросить одно значение или весь кэш"""
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+# Сотрудники: ID, фамилия, имя, отчество, email, роль, должность
+USER_DIRECTORY_SQL = """SELECT u.iduser, u.firstname, u.name, u.lastname, u.email,
+                               r.name, p.name
+                        FROM userr u
+                        JOIN role r ON u.idr = r.idrole
+                        JOIN post p ON u.idp = p.idpost
+                        ORDER BY u.firstname, u.name"""
+
+
+class UserDirectory:
+    """Справочник сотрудников, загружаемый одним запросом.
+
+    Сбрасывается методами Database, изменяющими сотрудников, и
+    перечитывается не реже чем раз в max_age секунд, чтобы были видны
+    сотрудники, добавленные в других копиях приложения.
+    """
+
+    def __init__(self, sql, max_age=300):
+        self._sql = sql
+        self.max_age = max_age
+        self._users = None
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, cursor):
+        """Загрузить справочник, если его нет или он устарел"""
+        with self._lock:
+            if self._users is None or time.monotonic() - self._loaded_at > self.max_age:
+                cursor.execute(self._sql)
+                self._users = tuple(cursor.fetchall())
+                self._by_id = {row[0]: row for row in self._users}
+                self._loaded_at = time.monotonic()
+            return self._users, self._by_id
+
+    def users(self, cursor):
+        """Все сотрудники, упорядоченные по фамилии и имени"""
+        return list(self._load(cursor)[0])
+
+    def get(self, cursor, user_id):
+        """Сотрудник по ID"""
+        return self._load(cursor)[1].get(user_id)
+
+    def invalidate(self):
+        """Сбросить справочник"""
+        with self._lock:
+            self._users = None
+            self._by_id = {}
+
+
+reference_cache = ReferenceCache(REFERENCE_TABLES, REFERENCE_MAX_AGE)
+user_directory = UserDirectory(USER_DIRECTORY_SQL)
+
+# Сводка главного окна: возврат на главную в течение ttl не обращается к БД
+dashboard_cache = TTLCache(30)
@@ -0,0 +1,277 @@
+import html
+import re
+from collections import OrderedDict
+
+from PyQt6 import QtWidgets, QtCore, QtGui
+
+
+# Роли данных модели сообщений
+MessageIdRole = QtCore.Qt.ItemDataRole.UserRole + 1
+HeaderRole = QtCore.Qt.ItemDataRole.UserRole + 2
+OutgoingRole = QtCore.Qt.ItemDataRole.UserRole + 3
+HighlightRole = QtCore.Qt.ItemDataRole.UserRole + 4
+
+
+def format_timestamp(timestamp):
+    """Дата и время сообщения для заголовка"""
+    if isinstance(timestamp, QtCore.QDateTime):
+        return timestamp.toString('dd.MM.yyyy HH:mm')
+    if hasattr(timestamp, 'strftime'):
+        return timestamp.strftime('%d.%m.%Y %H:%M')
+    return str(timestamp)
+
+
+def format_size(size):
+    """Размер файла для подписи вложения"""
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def highlight_snippet(text, terms, radius=40):
+    """HTML-фрагмент текста вокруг первого найденного слова с выделением найденных слов"""
+    if not terms:
+        return html.escape(text)
+    pattern = re.compile("|".join(rf"\b{re.escape(term)}\w*" for term in terms), re.IGNORECASE)
+
+    match = pattern.search(text)
+    start = max(match.start() - radius, 0) if match else 0
+    end = min((match.end() if match else 0) + radius, len(text))
+    snippet = text[start:end]
+
+    parts = []
+    position = 0
+    for found in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[position:found.start()]))
+        parts.append(f"<b>{html.escape(found.group())}</b>")
+        position = found.end()
+    parts.append(html.escape(snippet[position:]))
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class MessageModel(QtCore.QAbstractListModel):
+    """Сообщения открытой переписки.
+
+    Строки хранятся в виде, в котором их возвращает
+    Database.get_chat_messages_since: (idmessage, sender, recipient, text, sent_at);
+    у сообщений канала вместо получателя - ID канала. ID личных сообщений и
+    сообщений каналов пересекаются, поэтому модель помнит вид переписки (kind).
+    Имя отправителя запрашивается через name_for один раз на отправителя.
+    """
+
+    def __init__(self, current_user_id, name_for, parent=None):
+        super().__init__(parent)
+        self.current_user_id = current_user_id
+        self._name_for = name_for
+        self._names = {}
+        self._messages = []
+        self.kind = None  # "user" или "channel"
+        self.highlight_id = None  # Сообщение, к которому перешли из поиска
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._messages)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return message[3]
+        if role == MessageIdRole:
+            return message[0]
+        if role == OutgoingRole:
+            return message[1] == self.current_user_id
+        if role == HighlightRole:
+            return message[0] == self.highlight_id
+        if role == HeaderRole:
+            return f"{self.sender_name(message[1])} - {format_timestamp(message[4])}"
+        return None
+
+    def sender_name(self, sender_id):
+        """Имя отправителя"""
+        name = self._names.get(sender_id)
+        if name is None:
+            name = self._name_for(sender_id)
+            self._names[sender_id] = name
+        return name
+
+    def set_messages(self, messages, kind="user"):
+        """Заменить все сообщения"""
+        self.beginResetModel()
+        self._messages = list(messages)
+        self.kind = kind
+        self.endResetModel()
+
+    def row_of(self, message_id):
+        """Номер строки сообщения или None"""
+        for row, message in enumerate(self._messages):
+            if message[0] == message_id:
+                return row
+        return None
+
+    def prepend_messages(self, messages):
+        """Добавить более старые сообщения в начало переписки"""
+        if not messages:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = messages
+        self.endInsertRows()
+
+    def append_messages(self, messages):
+        """Добавить сообщения в конец переписки"""
+        if not messages:
+            return
+        first = len(self._messages)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(messages) - 1)
+        self._messages.extend(messages)
+        self.endInsertRows()
+
+
+class MessageDelegate(QtWidgets.QStyledItemDelegate):
+    """Отрисовка сообщения: заголовок и «пузырь» с текстом.
+
+    Разбивка текста на строки считается один раз для пары
+    (сообщение, ширина области) и хранится в ограниченном кэше,
+    поэтому прокрутка не пересчитывает переносы.
+    """
+
+    MARGIN = 5
+    PADDING = 8
+    SPACING = 2
+    RADIUS = 10
+    MAX_WIDTH = 0.7  # Доля ширины области, которую может занять сообщение
+    CACHE_SIZE = 2000
+
+    INCOMING = QtGui.QColor("#E1E5FF")
+    OUTGOING = QtGui.QColor("#94a5ff")
+    HIGHLIGHT = QtGui.QColor("#717ec3")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.header_font = QtGui.QFont("Segoe UI", 10)
+        self.header_font.setBold(True)
+        self.text_font = QtGui.QFont("Segoe UI", 12)
+        self._header_metrics = QtGui.QFontMetrics(self.header_font)
+        self._text_metrics = QtGui.QFontMetrics(self.text_font)
+        self._layouts = OrderedDict()  # (вид переписки, ID сообщения, ширина) -> (размер текста, QStaticText)
+
+    def _available_width(self, option):
+        view = self.parent()
+        if isinstance(view, QtWidgets.QAbstractItemView):
+            return view.viewport().width()
+        return option.rect.width()
+
+    def _layout(self, index, width):
+        """Размер и подготовленный текст сообщения для ширины области width"""
+        key = (index.model().kind, index.data(MessageIdRole), width)
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+            return layout
+
+        text = index.data(QtCore.Qt.ItemDataRole.DisplayRole) or ""
+        text_width = max(int(width * self.MAX_WIDTH) - 2 * self.PADDING, 50)
+        size = self._text_metrics.boundingRect(
+            QtCore.QRect(0, 0, text_width, 1 << 20),
+            QtCore.Qt.TextFlag.TextWordWrap, text).size()
+
+        static = QtGui.QStaticText(text)
+        static.setTextFormat(QtCore.Qt.TextFormat.PlainText)
+        static.setTextWidth(size.width() + 1)
+        static.prepare(QtGui.QTransform(), self.text_font)
+
+        layout = (size, static)
+        self._layouts[key] = layout
+        if len(self._layouts) > self.CACHE_SIZE:
+            self._layouts.popitem(last=False)
+        return layout
+
+    def sizeHint(self, option, index):
+        width = self._available_width(option)
+        size, _ = self._layout(index, width)
+        height = (2 * self.MARGIN + self._header_metrics.height() + self.SPACING
+                  + size.height() + 2 * self.PADDING)
+        return QtCore.QSize(width, height)
+
+    def paint(self, painter, option, index):
+        rect = option.rect
+        size, static = self._layout(index, self._available_width(option))
+        outgoing = index.data(OutgoingRole)
+        header = index.data(HeaderRole)
+
+        bubble_width = size.width() + 2 * self.PADDING
+        header_width = self._header_metrics.horizontalAdvance(header)
+        top = rect.top() + self.MARGIN
+        if outgoing:
+            bubble_left = rect.right() - self.MARGIN - bubble_width
+            header_left = rect.right() - self.MARGIN - header_width
+        else:
+            bubble_left = rect.left() + self.MARGIN
+            header_left = bubble_left
+
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+
+        painter.setFont(self.header_font)
+        painter.setPen(option.palette.color(QtGui.QPalette.ColorRole.Text))
+        painter.drawText(QtCore.QPoint(header_left, top + self._header_metrics.ascent()), header)
+
+        bubble_top = top + self._header_metrics.height() + self.SPACING
+        bubble = QtCore.QRectF(bubble_left, bubble_top, bubble_width, size.height() + 2 * self.PADDING)
+        if index.data(HighlightRole):
+            painter.setPen(QtGui.QPen(self.HIGHLIGHT, 2))
+        else:
+            painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        painter.setBrush(self.OUTGOING if outgoing else self.INCOMING)
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+
+        painter.setFont(self.text_font)
+        painter.setPen(QtGui.QColor("white") if outgoing else QtGui.QColor("black"))
+        painter.drawStaticText(QtCore.QPointF(bubble_left + self.PADDING, bubble_top + self.PADDING), static)
+        painter.restore()
+
+
+class MessageView(QtWidgets.QListView):
+    """Лента сообщений: отрисовываются только видимые строки модели"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setItemDelegate(MessageDelegate(self))
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
+        self.setFocusPolicy(QtCore.Qt.FocusPolicy.NoFocus)
+        self.setResizeMode(QtWidgets.QListView.ResizeMode.Adjust)
+        self.setFrameShape(QtWidgets.QFrame.Shape.NoFrame)
+        self.setStyleSheet("QListView { background: white; }")
+
+    def is_at_bottom(self):
+        """Прокручена ли лента до конца"""
+        scroll_bar = self.verticalScrollBar()
+        return scroll_bar.value() >= scroll_bar.maximum() - 5
+
+    def is_at_top(self):
+        """Прокручена ли лента к началу (или вся помещается в область)"""
+        return self.verticalScrollBar().value() <= 5
+
+    def scroll_to_message(self, message_id):
+        """Прокрутить ленту так, чтобы сообщение было в центре"""
+        row = self.model().row_of(message_id)
+        if row is not None:
+            self.scrollTo(self.model().index(row), QtWidgets.QAbstractItemView.ScrollHint.PositionAtCenter)
+
+    def keep_position(self, change):
+        """Выполнить change (вставку строк сверху), не сдвигая видимые сообщения"""
+        scroll_bar = self.verticalScrollBar()
+        from_bottom = scroll_bar.maximum() - scroll_bar.value()
+        change()
+        # Пересчитать высоты сразу, а не при следующей отрисовке, чтобы знать новый диапазон прокрутки
+        self.executeDelayedItemsLayout()
+        scroll_bar.setValue(scroll_bar.maximum() - from_bottom)
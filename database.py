@@ -1,28 +1,209 @@
-import pymysql
+import hashlib
+import json
+import os
+import re
+import weakref
+from datetime import date, datetime, time, timedelta
+from pool import get_pool
+from cache import reference_cache, dashboard_cache, user_directory
+
+
+# Размер страницы при постраничной загрузке списка сделок
+DEAL_PAGE_SIZE = 100
+
+# Наибольшее число сообщений переписки за один запрос
+CHAT_FETCH_LIMIT = 500
+
+# Размер страницы истории переписки
+CHAT_PAGE_SIZE = 50
+
+# Размер части файла вложения: в памяти одновременно держится одна часть
+BLOB_CHUNK_SIZE = 256 * 1024
+
+
+def day_range(day=None):
+    """Границы суток [начало, начало следующих суток) по часам клиента"""
+    start = datetime.combine(day or date.today(), time.min)
+    return start, start + timedelta(days=1)
+
+
+def search_terms(query):
+    """Слова поискового запроса без служебных символов полнотекстового поиска"""
+    return re.findall(r"\w+", query.lower())
+
+
+# Частые запросы. Текст запросов вынесен из методов Database, чтобы
+# migrations.py --explain проверял планы именно тех запросов, которые
+# выполняет программа.
+
+USER_BY_EMAIL_SQL = """SELECT userr.iduser, userr.firstname, userr.name, userr.lastname, 
+                              userr.password, role.name as role, post.name as post
+                       FROM userr 
+                       JOIN role ON userr.idr = role.idrole
+                       JOIN post ON userr.idp = post.idpost
+                       WHERE userr.email = %s"""
+
+TODAY_DEALS_STATS_SQL = """SELECT statusdeal.name, COUNT(deal.iddeal), COALESCE(SUM(deal.total_price), 0)
+                           FROM deal
+                           JOIN statusdeal ON deal.idsd = statusdeal.idstatusdeal
+                           WHERE deal.date1 >= %s AND deal.date1 < %s
+                           GROUP BY statusdeal.name"""
+
+# Строка списка сделок: (ID, название, тип, статус, организация, исполнитель,
+# date1, date2, цена, НДС, сумма, размер счета, ID организации)
+DEAL_LIST_SQL = """SELECT d.iddeal, d.name, td.name as type, sd.name as status, 
+                          o.name as organization, 
+                          CONCAT(u.firstname, ' ', u.name, ' ', u.lastname) as executor,
+                          d.date1, d.date2, d.price, d.nds, d.total_price, b.size as bill_size, d.ido
+                   FROM deal d
+                   JOIN typedeal td ON d.idtd = td.idtypedeal
+                   JOIN statusdeal sd ON d.idsd = sd.idstatusdeal
+                   JOIN organization o ON d.ido = o.idorganization
+                   JOIN userr u ON d.executor = u.iduser
+                   LEFT JOIN dealbill b ON b.iddeal = d.iddeal"""
+
+TASK_BUCKETS_SQL = """SELECT t.idtask, tt.name, t.description, 
+                             CONCAT(u.firstname, ' ', u.name), t.date2
+                      FROM task t
+                      JOIN typetask tt ON t.idtt = tt.idtypetask
+                      JOIN userr u ON t.sender = u.iduser
+                      WHERE t.recipient = %s AND t.completed = FALSE
+                      AND t.date2 IS NOT NULL
+                      ORDER BY t.date2"""
+
+USER_TASK_DATES_SQL = """SELECT date2 FROM task 
+                         WHERE recipient = %s AND date2 IS NOT NULL"""
+
+USER_DEAL_DATES_SQL = """SELECT date2 FROM deal 
+                         WHERE executor = %s AND date2 IS NOT NULL"""
+
+TASKS_FOR_DATE_SQL = """SELECT t.description, tt.name, 
+                        CONCAT(u.firstname, ' ', u.name) as sender
+                        FROM task t
+                        JOIN typetask tt ON t.idtt = tt.idtypetask
+                        JOIN userr u ON t.sender = u.iduser
+                        WHERE t.recipient = %s 
+                        AND t.date2 >= %s AND t.date2 < %s"""
+
+DEALS_FOR_DATE_SQL = """SELECT d.name, td.name as type, sd.name as status
+                        FROM deal d
+                        JOIN typedeal td ON d.idtd = td.idtypedeal
+                        JOIN statusdeal sd ON d.idsd = sd.idstatusdeal
+                        WHERE d.executor = %s 
+                        AND d.date2 >= %s AND d.date2 < %s"""
+
+CHAT_MESSAGES_SINCE_SQL = """SELECT idmessage, sender, recipient, message_text, sent_at
+                             FROM ((SELECT idmessage, sender, recipient, message_text, sent_at
+                                    FROM messages
+                                    WHERE sender = %s AND recipient = %s AND idmessage > %s
+                                    ORDER BY idmessage LIMIT %s)
+                                   UNION ALL
+                                   (SELECT idmessage, sender, recipient, message_text, sent_at
+                                    FROM messages
+                                    WHERE sender = %s AND recipient = %s AND idmessage > %s
+                                    ORDER BY idmessage LIMIT %s)) m
+                             ORDER BY idmessage
+                             LIMIT %s"""
+
+SEARCH_MESSAGES_SQL = """SELECT idmessage, sender, recipient, message_text, sent_at,
+                                MATCH(message_text) AGAINST (%s IN BOOLEAN MODE) AS score
+                         FROM messages
+                         WHERE MATCH(message_text) AGAINST (%s IN BOOLEAN MODE)
+                         AND (sender = %s OR recipient = %s)
+                         ORDER BY score DESC, idmessage DESC
+                         LIMIT %s"""
+
+# Отметка о прочтении есть у каждой переписки (её создаёт send_message), поэтому
+# читаются только сообщения после отметки - диапазон по индексу (sender, recipient, idmessage)
+UNREAD_COUNTS_SQL = """SELECT r.peer_id, COUNT(*)
+                       FROM message_read r
+                       JOIN messages m ON m.recipient = r.user_id AND m.sender = r.peer_id
+                                      AND m.idmessage > r.last_read_id
+                       WHERE r.user_id = %s
+                       GROUP BY r.peer_id"""
+
+INCOMING_SINCE_SQL = """SELECT idmessage, sender FROM messages
+                        WHERE recipient = %s AND idmessage > %s
+                        ORDER BY idmessage
+                        LIMIT %s"""
+
+CHANNEL_MESSAGES_SINCE_SQL = """SELECT idchannelmessage, sender, idchannel, message_text, sent_at
+                                FROM channel_message
+                                WHERE idchannel = %s AND idchannelmessage > %s
+                                ORDER BY idchannelmessage
+                                LIMIT %s"""
+
+
+def deals_page_query(executor_id=None, after=None, limit=DEAL_PAGE_SIZE):
+    """Запрос страницы сделок: (sql, параметры), см. Database.get_deals_page"""
+    sql = DEAL_LIST_SQL
+    conditions = []
+    params = []
+
+    if executor_id is not None:
+        conditions.append("d.executor = %s")
+        params.append(executor_id)
+
+    if after is not None:
+        # Keyset-условие: продолжаем сразу после последней загруженной строки
+        conditions.append("(d.date1 < %s OR (d.date1 = %s AND d.iddeal < %s))")
+        params.extend([after[0], after[0], after[1]])
+
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    sql += " ORDER BY d.date1 DESC, d.iddeal DESC LIMIT %s"
+    params.append(limit)
+    return sql, params
+
+
+def chat_messages_before_query(user_a, user_b, before=None, limit=CHAT_PAGE_SIZE):
+    """Запрос страницы истории переписки: (sql, параметры), см. Database.get_chat_messages_before"""
+    condition = ""
+    params = []
+    if before is not None:
+        condition = "AND (sent_at < %s OR (sent_at = %s AND idmessage < %s))"
+        params = [before[0], before[0], before[1]]
+
+    sql = f"""SELECT idmessage, sender, recipient, message_text, sent_at
+              FROM ((SELECT idmessage, sender, recipient, message_text, sent_at
+                     FROM messages
+                     WHERE sender = %s AND recipient = %s {condition}
+                     ORDER BY sent_at DESC, idmessage DESC LIMIT %s)
+                    UNION ALL
+                    (SELECT idmessage, sender, recipient, message_text, sent_at
+                     FROM messages
+                     WHERE sender = %s AND recipient = %s {condition}
+                     ORDER BY sent_at DESC, idmessage DESC LIMIT %s)) m
+              ORDER BY sent_at DESC, idmessage DESC
+              LIMIT %s"""
+    return sql, [user_a, user_b, *params, limit, user_b, user_a, *params, limit, limit]
+
+
+def _release_connection(pool, connector, cursor):
+    """Вернуть соединение в пул (вызывается один раз: из close() или при удалении Database)"""
+    try:
+        cursor.close()
+    except Exception:
+        pass
+    pool.release(connector)
 
 
 class Database:
     def __init__(self):
-        self.connector = pymysql.connect(
-            host="localhost",
-            user="root",
-            password="root",
-            database="crm"
-        )
-        self.connector.autocommit(True)
+        # Соединение берётся из общего пула, а не открывается заново для каждого окна
+        self.pool = get_pool()
+        self.connector = self.pool.acquire()
         self.cursor = self.connector.cursor()
+        # Если close() не вызвали, соединение вернётся в пул при удалении объекта,
+        # иначе пул с ограниченным размером исчерпается
+        self._finalizer = weakref.finalize(self, _release_connection, self.pool, self.connector, self.cursor)
 
     """Методы для авторизации"""
 
     def get_user_by_email(self, email):
         """Получить пользователя по email"""
-        sql = """SELECT userr.iduser, userr.firstname, userr.name, userr.lastname, 
-                        userr.password, role.name as role, post.name as post
-                 FROM userr 
-                 JOIN role ON userr.idr = role.idrole
-                 JOIN post ON userr.idp = post.idpost
-                 WHERE userr.email = %s"""
-        self.cursor.execute(sql, (email,))
+        self.cursor.execute(USER_BY_EMAIL_SQL, (email,))
         return self.cursor.fetchone()
 
     def verify_password(self, plain_password, hashed_password):
@@ -33,47 +214,53 @@ class Database:
 
     """Методы для главного окна"""
 
-    def get_today_deals_stats(self):
-        """Статистика сделок за сегодня"""
-        sql = """SELECT statusdeal.name, COUNT(deal.iddeal), COALESCE(SUM(deal.total_price), 0)
-                 FROM deal
-                 JOIN statusdeal ON deal.idsd = statusdeal.idstatusdeal
-                 WHERE DATE(deal.date1) = CURDATE()
-                 GROUP BY statusdeal.name"""
-        self.cursor.execute(sql)
+    def get_today_deals_stats(self, day_start, day_end):
+        """Статистика сделок за сутки [day_start, day_end)"""
+        self.cursor.execute(TODAY_DEALS_STATS_SQL, (day_start, day_end))
         return self.cursor.fetchall()
 
-    def get_user_tasks_count(self, user_id):
-        """Количество задач пользователя"""
-        # Все активные задачи
-        sql_tasks = """SELECT COUNT(*) FROM task 
-                      WHERE recipient = %s AND (date2 IS NULL OR date2 >= CURDATE())"""
-        self.cursor.execute(sql_tasks, (user_id,))
-        tasks_count = self.cursor.fetchone()[0]
-
-        # Срочные задачи
-        sql_urgent = """SELECT COUNT(*) FROM task 
-                       WHERE recipient = %s AND date2 IS NOT NULL 
-                       AND date2 <= DATE_ADD(CURDATE(), INTERVAL 1 DAY)"""
-        self.cursor.execute(sql_urgent, (user_id,))
-        urgent_count = self.cursor.fetchone()[0]
+    def get_dashboard_snapshot(self, user_id, day=None):
+        """Сводка главного окна за сутки day одним запросом.
+
+        Возвращает словарь: 'deals' - статистика сделок по статусам
+        (название, количество, сумма), 'tasks' - активные задачи пользователя,
+        'urgent' - задачи со сроком не позже начала следующего дня.
+        Результат кэшируется в dashboard_cache.
+        """
+        day_start, day_end = day_range(day)
+        key = (user_id, day_start)
+        snapshot = dashboard_cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        sql = """SELECT 'deal', statusdeal.name, COUNT(deal.iddeal), COALESCE(SUM(deal.total_price), 0)
+                 FROM deal
+                 JOIN statusdeal ON deal.idsd = statusdeal.idstatusdeal
+                 WHERE deal.date1 >= %s AND deal.date1 < %s
+                 GROUP BY statusdeal.name
+                 UNION ALL
+                 SELECT 'tasks', NULL, COUNT(*), 0 FROM task
+                 WHERE recipient = %s AND (date2 IS NULL OR date2 >= %s)
+                 UNION ALL
+                 SELECT 'urgent', NULL, COUNT(*), 0 FROM task
+                 WHERE recipient = %s AND date2 IS NOT NULL AND date2 <= %s"""
+        self.cursor.execute(sql, (day_start, day_end, user_id, day_start, user_id, day_end))
+
+        snapshot = {'deals': [], 'tasks': 0, 'urgent': 0}
+        for kind, status, count, total in self.cursor.fetchall():
+            if kind == 'deal':
+                snapshot['deals'].append((status, int(count), total))
+            else:
+                snapshot[kind] = int(count)
 
-        return tasks_count, urgent_count
+        dashboard_cache.put(key, snapshot)
+        return snapshot
 
     """Методы для работы со сделками"""
 
     def get_all_deals(self):
         """Получение всех сделок с названиями типов, статусов и организаций"""
-        sql = """SELECT d.iddeal, d.name, td.name as type, sd.name as status, 
-                        o.name as organization, 
-                        CONCAT(u.firstname, ' ', u.name, ' ', u.lastname) as executor,
-                        d.date1, d.date2, d.price, d.nds, d.total_price, d.bill
-                 FROM deal d
-                 JOIN typedeal td ON d.idtd = td.idtypedeal
-                 JOIN statusdeal sd ON d.idsd = sd.idstatusdeal
-                 JOIN organization o ON d.ido = o.idorganization
-                 JOIN userr u ON d.executor = u.iduser"""
-        self.cursor.execute(sql)
+        self.cursor.execute(DEAL_LIST_SQL)
         return self.cursor.fetchall()
 
     def create_deal(self, name, type_id, org_id, executor_id, end_date):
@@ -84,27 +271,40 @@ class Database:
                      VALUES (%s, %s, 1, %s, %s, NOW(), %s)"""
             self.cursor.execute(sql, (name, type_id, org_id, executor_id, end_date))
             self.connector.commit()
+            dashboard_cache.invalidate()
             return self.cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка создания сделки: {e}")
             return False
 
     def get_organization_details(self, org_identifier):
-        """Получение информации об организации по ID или названию"""
+        """Получение информации об организации по ID или названию.
+
+        По ID организация берется из справочника в памяти - строки сделок
+        содержат ido, поэтому для счета запрос к БД не нужен. Организации
+        нет в справочнике, если её добавили в другой копии приложения после
+        загрузки: тогда она читается из БД, а справочник сбрасывается.
+        """
         try:
             if isinstance(org_identifier, int) or (isinstance(org_identifier, str) and org_identifier.isdigit()):
                 # Поиск по ID
-                sql = """SELECT idorganization, name, inn, kpp 
-                         FROM organization 
-                         WHERE idorganization = %s"""
+                org_id = int(org_identifier)
+                result = reference_cache.get(self.cursor, 'organization', org_id)
+                if not result:
+                    sql = """SELECT idorganization, name, inn, kpp
+                             FROM organization
+                             WHERE idorganization = %s"""
+                    self.cursor.execute(sql, (org_id,))
+                    result = self.cursor.fetchone()
+                    if result:
+                        reference_cache.invalidate('organization')
             else:
                 # Поиск по названию
                 sql = """SELECT idorganization, name, inn, kpp 
                          FROM organization 
                          WHERE name LIKE %s"""
-
-            self.cursor.execute(sql, (org_identifier,))
-            result = self.cursor.fetchone()
+                self.cursor.execute(sql, (org_identifier,))
+                result = self.cursor.fetchone()
 
             if not result:
                 print(f"Организация {org_identifier} не найдена")
@@ -120,17 +320,54 @@ class Database:
             print(f"Ошибка при получении данных организации: {str(e)}")
             return None
 
-    def update_deal_bill(self, deal_id, bill_data):
+    def update_deal_bill(self, deal_id, bill_data, data=None):
         """Обновление счета сделки"""
+        return self.update_deal_bills([(deal_id, bill_data, data)])
+
+    def update_deal_bills(self, bills):
+        """Сохранение счетов [(ID сделки, файл счета, данные счета)] одной транзакцией.
+
+        Данные счета (invoices.invoice_data) хранятся вместе с файлом: по ним
+        строится просмотр, даже если цена или организация в сделке изменились.
+        """
+        # Счета хранятся отдельно от сделок, чтобы список сделок не читал BLOB
+        sql = """INSERT INTO dealbill (iddeal, content, sha256, size, data, created_at)
+                 VALUES (%s, %s, %s, %s, %s, NOW())
+                 ON DUPLICATE KEY UPDATE content = VALUES(content), sha256 = VALUES(sha256),
+                                         size = VALUES(size), data = VALUES(data),
+                                         created_at = VALUES(created_at)"""
         try:
-            sql = "UPDATE deal SET bill = %s WHERE iddeal = %s"
-            self.cursor.execute(sql, (bill_data, deal_id))
+            self.connector.begin()
+            self.cursor.executemany(sql, [(deal_id, bill_data, hashlib.sha256(bill_data).hexdigest(), len(bill_data),
+                                           json.dumps(data, ensure_ascii=False) if data is not None else None)
+                                          for deal_id, bill_data, data in bills])
             self.connector.commit()
-            return self.cursor.rowcount > 0
+            return True
         except Exception as e:
-            print(f"Ошибка обновления счета сделки: {e}")
+            self.connector.rollback()
+            print(f"Ошибка обновления счетов сделок: {e}")
             return False
 
+    def get_deal_bill(self, deal_id):
+        """Получение файла счета сделки"""
+        sql = "SELECT content FROM dealbill WHERE iddeal = %s"
+        self.cursor.execute(sql, (deal_id,))
+        result = self.cursor.fetchone()
+        return result[0] if result else None
+
+    def get_deal_bill_info(self, deal_id):
+        """Дата формирования счета и данные, по которым он сформирован (без загрузки файла).
+
+        Возвращает (дата, данные или None) или None, если счета нет.
+        Данных нет у счетов, сохранённых до миграции 12.
+        """
+        sql = "SELECT created_at, data FROM dealbill WHERE iddeal = %s"
+        self.cursor.execute(sql, (deal_id,))
+        result = self.cursor.fetchone()
+        if not result:
+            return None
+        return result[0], json.loads(result[1]) if result[1] else None
+
     def update_deal_price(self, deal_id, price, nds, total_price, status_name):
         """Обновление цены, НДС и статуса сделки"""
         try:
@@ -144,6 +381,7 @@ class Database:
                      WHERE iddeal = %s"""
             self.cursor.execute(sql, (price, nds, total_price, status_id, deal_id))
             self.connector.commit()
+            dashboard_cache.invalidate()
             return self.cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка обновления цены сделки: {e}")
@@ -151,78 +389,135 @@ class Database:
 
     def update_deal_status(self, deal_id, status_id):
         """Обновление статуса сделки"""
+        return self.update_deals_status([deal_id], status_id)
+
+    def _update_deals(self, sql, params, deal_ids):
+        """Изменение сделок deal_ids одним запросом WHERE iddeal IN (...) в транзакции.
+
+        sql заканчивается на "WHERE iddeal IN"; при ошибке исключение пробрасывается,
+        иначе возвращается True
+        """
+        deal_ids = list(deal_ids)
+        if not deal_ids:
+            return True
+        placeholders = ", ".join(["%s"] * len(deal_ids))
         try:
-            sql = "UPDATE deal SET idsd = %s WHERE iddeal = %s"
-            self.cursor.execute(sql, (status_id, deal_id))
+            self.connector.begin()
+            # rowcount не проверяется: MySQL не считает строки, где значение не изменилось,
+            # и повторная установка того же статуса не должна выглядеть ошибкой
+            self.cursor.execute(f"{sql} ({placeholders})", list(params) + deal_ids)
             self.connector.commit()
-            return self.cursor.rowcount > 0
+        except Exception:
+            self.connector.rollback()
+            raise
+        dashboard_cache.invalidate()
+        return True
+
+    def update_deals_status(self, deal_ids, status_id):
+        """Смена статуса нескольких сделок"""
+        try:
+            return self._update_deals("UPDATE deal SET idsd = %s WHERE iddeal IN", (status_id,), deal_ids)
+        except Exception as e:
+            print(f"Ошибка обновления статуса сделок: {e}")
+            return False
+
+    def update_deals_executor(self, deal_ids, executor_id):
+        """Передача нескольких сделок другому исполнителю"""
+        try:
+            return self._update_deals("UPDATE deal SET executor = %s WHERE iddeal IN", (executor_id,), deal_ids)
+        except Exception as e:
+            print(f"Ошибка смены исполнителя сделок: {e}")
+            return False
+
+    def delete_deals(self, deal_ids):
+        """Удаление нескольких сделок (счета удаляются каскадно)"""
+        try:
+            return self._update_deals("DELETE FROM deal WHERE iddeal IN", (), deal_ids)
         except Exception as e:
-            print(f"Ошибка обновления статуса сделки: {e}")
+            print(f"Ошибка удаления сделок: {e}")
             return False
 
     def get_status_id_by_name(self, status_name):
         """Получение ID статуса по названию"""
         try:
-            sql = "SELECT idstatusdeal FROM statusdeal WHERE name = %s"
-            self.cursor.execute(sql, (status_name,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
+            return reference_cache.id_by_name(self.cursor, 'statusdeal', status_name)
         except Exception as e:
             print(f"Ошибка получения ID статуса: {e}")
             return None
 
     def get_deals_by_executor(self, executor_id):
         """Получение сделок конкретного исполнителя"""
-        sql = """SELECT d.iddeal, d.name, td.name as type, sd.name as status, 
-                        o.name as organization, 
-                        CONCAT(u.firstname, ' ', u.name, ' ', u.lastname) as executor,
-                        d.date1, d.date2, d.price, d.nds, d.total_price, d.bill
+        self.cursor.execute(DEAL_LIST_SQL + " WHERE d.executor = %s", (executor_id,))
+        return self.cursor.fetchall()
+
+    def get_deals_page(self, executor_id=None, after=None, limit=DEAL_PAGE_SIZE):
+        """Страница сделок, от новых к старым по (date1, iddeal).
+
+        after - ключ (date1, iddeal) последней уже загруженной сделки,
+        None для первой страницы
+        """
+        self.cursor.execute(*deals_page_query(executor_id, after, limit))
+        return self.cursor.fetchall()
+
+    def get_deals_for_invoices(self, status_name=None, date_from=None, date_to=None, missing_only=True):
+        """Сделки с указанной ценой для пакетного формирования счетов.
+
+        Строки - аргументы invoices.invoice_data: (ID, название, цена, НДС,
+        организация, ИНН, КПП). date_from/date_to ограничивают дату создания,
+        missing_only оставляет только сделки без счёта.
+        """
+        sql = """SELECT d.iddeal, d.name, d.price, d.nds, o.name, o.inn, o.kpp
                  FROM deal d
-                 JOIN typedeal td ON d.idtd = td.idtypedeal
                  JOIN statusdeal sd ON d.idsd = sd.idstatusdeal
                  JOIN organization o ON d.ido = o.idorganization
-                 JOIN userr u ON d.executor = u.iduser
-                 WHERE d.executor = %s"""
-        self.cursor.execute(sql, (executor_id,))
+                 LEFT JOIN dealbill b ON b.iddeal = d.iddeal
+                 WHERE d.price IS NOT NULL"""
+        params = []
+
+        if status_name:
+            sql += " AND sd.name = %s"
+            params.append(status_name)
+        if date_from:
+            sql += " AND d.date1 >= %s"
+            params.append(date_from)
+        if date_to:
+            sql += " AND d.date1 < %s"
+            params.append(date_to)
+        if missing_only:
+            sql += " AND b.iddeal IS NULL"
+
+        sql += " ORDER BY d.iddeal"
+        self.cursor.execute(sql, params)
         return self.cursor.fetchall()
 
     """Методы для работы с настройками системы"""
 
     def get_all_deal_statuses(self):
         """Получение всех статусов сделок"""
-        sql = "SELECT idstatusdeal, name FROM statusdeal ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'statusdeal')
 
     def get_all_deal_types(self):
         """Получение всех типов сделок"""
-        sql = "SELECT idtypedeal, name FROM typedeal ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'typedeal')
 
     def get_all_posts(self):
         """Получение всех должностей"""
-        sql = "SELECT idpost, name FROM post ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'post')
 
     def get_all_task_types(self):
         """Получение всех типов задач"""
-        sql = "SELECT idtypetask, name FROM typetask ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'typetask')
 
     def get_all_roles(self):
         """Получение всех ролей"""
-        sql = "SELECT idrole, name FROM role ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'role')
 
     def update_user_info(self, user_id, field, value):
         """Обновление информации о пользователе"""
         sql = f"UPDATE userr SET {field} = %s WHERE iduser = %s"
         self.cursor.execute(sql, (value, user_id))
         self.connector.commit()
+        user_directory.invalidate()
         return self.cursor.rowcount > 0
 
     def add_entity(self, entity_type, name):
@@ -242,6 +537,7 @@ class Database:
         sql = f"INSERT INTO {table} ({column}) VALUES (%s)"
         self.cursor.execute(sql, (name,))
         self.connector.commit()
+        reference_cache.invalidate(table)
         return self.cursor.rowcount > 0
 
     def delete_entity(self, entity_type, entity_id):
@@ -261,21 +557,21 @@ class Database:
         sql = f"DELETE FROM {table} WHERE {id_column} = %s"
         self.cursor.execute(sql, (entity_id,))
         self.connector.commit()
+        reference_cache.invalidate(table)
         return self.cursor.rowcount > 0
 
     """Методы для работы с организациями (клиентами)"""
 
     def get_all_organizations(self):
         """Получение списка всех организаций"""
-        sql = "SELECT idorganization, name, inn, kpp FROM organization"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'organization')
 
     def create_organization(self, name, inn, kpp):
         """Создание новой организации"""
         sql = "INSERT INTO organization (name, inn, kpp) VALUES (%s, %s, %s)"
         self.cursor.execute(sql, (name, inn, kpp))
         self.connector.commit()
+        reference_cache.invalidate('organization')
         return self.cursor.rowcount > 0
 
     """Методы для работы с задачами"""
@@ -293,66 +589,42 @@ class Database:
         self.cursor.execute(sql, (user_id,))
         return self.cursor.fetchall()
 
-    def get_overdue_tasks(self, user_id):
-        """Получение просроченных задач"""
-        sql = """SELECT t.idtask, tt.name, t.description, 
-                        CONCAT(u.firstname, ' ', u.name), t.date2
-                 FROM task t
-                 JOIN typetask tt ON t.idtt = tt.idtypetask
-                 JOIN userr u ON t.sender = u.iduser
-                 WHERE t.recipient = %s AND t.date2 < CURDATE() 
-                 AND t.completed = FALSE
-                 ORDER BY t.date2"""
-        self.cursor.execute(sql, (user_id,))
-        return self.cursor.fetchall()
-
-    def get_today_tasks(self, user_id):
-        """Получение задач на сегодня"""
-        sql = """SELECT t.idtask, tt.name, t.description, 
-                        CONCAT(u.firstname, ' ', u.name), t.date2
-                 FROM task t
-                 JOIN typetask tt ON t.idtt = tt.idtypetask
-                 JOIN userr u ON t.sender = u.iduser
-                 WHERE t.recipient = %s AND DATE(t.date2) = CURDATE()
-                 AND t.completed = FALSE
-                 ORDER BY t.date2"""
-        self.cursor.execute(sql, (user_id,))
-        return self.cursor.fetchall()
-
-    def get_future_tasks(self, user_id):
-        """Получение будущих задач"""
-        sql = """SELECT t.idtask, tt.name, t.description, 
-                        CONCAT(u.firstname, ' ', u.name), t.date2
-                 FROM task t
-                 JOIN typetask tt ON t.idtt = tt.idtypetask
-                 JOIN userr u ON t.sender = u.iduser
-                 WHERE t.recipient = %s AND t.date2 > CURDATE()
-                 AND t.completed = FALSE
-                 ORDER BY t.date2"""
-        self.cursor.execute(sql, (user_id,))
-        return self.cursor.fetchall()
+    def get_task_buckets(self, user_id, today=None):
+        """Открытые задачи пользователя, разбитые на просроченные, на сегодня и будущие.
+
+        Все задачи читаются одним запросом и раскладываются по срокам на клиенте;
+        границы суток задаёт today (по умолчанию - текущая дата клиента).
+        Задачи без срока в разбивку не попадают.
+        """
+        day_start, day_end = day_range(today)
+        self.cursor.execute(TASK_BUCKETS_SQL, (user_id,))
+
+        buckets = {'overdue': [], 'today': [], 'future': []}
+        for task in self.cursor.fetchall():
+            if task[4] < day_start:
+                buckets['overdue'].append(task)
+            elif task[4] < day_end:
+                buckets['today'].append(task)
+            else:
+                buckets['future'].append(task)
+        return buckets
 
     def complete_task(self, task_id):
         """Отметка задачи как выполненной"""
         sql = "UPDATE task SET completed = TRUE, date2 = NOW() WHERE idtask = %s"
         self.cursor.execute(sql, (task_id,))
         self.connector.commit()
+        dashboard_cache.invalidate()
         return self.cursor.rowcount > 0
 
     def get_task_types(self):
         """Получение типов задач"""
-        sql = "SELECT idtypetask, name FROM typetask ORDER BY name"
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return reference_cache.rows(self.cursor, 'typetask')
 
-    def get_other_users(self, current_user_email):
+    def get_other_users(self, current_user_id):
         """Получение списка других пользователей"""
-        sql = """SELECT iduser, CONCAT(firstname, ' ', name) as fullname 
-                 FROM userr 
-                 WHERE iduser != (SELECT iduser FROM userr WHERE email = %s)
-                 ORDER BY firstname, name"""
-        self.cursor.execute(sql, (current_user_email,))
-        return self.cursor.fetchall()
+        return [(user[0], f"{user[1]} {user[2]}")
+                for user in user_directory.users(self.cursor) if user[0] != current_user_id]
 
     def create_task(self, task_type_id, description, sender_id, recipient_id, deadline):
         """Создание новой задачи"""
@@ -360,33 +632,26 @@ class Database:
                  VALUES (%s, %s, %s, %s, NOW(), %s, FALSE)"""
         self.cursor.execute(sql, (task_type_id, description, sender_id, recipient_id, deadline))
         self.connector.commit()
+        dashboard_cache.invalidate()
         return self.cursor.rowcount > 0
 
     """Методы для работы с сотрудниками"""
 
     def get_all_employees(self):
-        """Получение списка всех сотрудников"""
-        sql = """SELECT u.firstname, u.name, u.lastname, u.email, 
-                         r.name as role, p.name as post
-                  FROM userr u
-                  JOIN role r ON u.idr = r.idrole
-                  JOIN post p ON u.idp = p.idpost"""
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        """Все сотрудники: (ID, фамилия, имя, отчество, email, роль, должность)"""
+        return user_directory.users(self.cursor)
+
+    def get_user(self, user_id):
+        """Сотрудник по ID: (ID, фамилия, имя, отчество, email, роль, должность)"""
+        return user_directory.get(self.cursor, user_id)
 
     def get_role_id_by_name(self, role_name):
         """Получение ID роли по названию"""
-        sql = "SELECT idrole FROM role WHERE name = %s"
-        self.cursor.execute(sql, (role_name,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        return reference_cache.id_by_name(self.cursor, 'role', role_name)
 
     def get_post_id_by_name(self, post_name):
         """Получение ID должности по названию"""
-        sql = "SELECT idpost FROM post WHERE name = %s"
-        self.cursor.execute(sql, (post_name,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        return reference_cache.id_by_name(self.cursor, 'post', post_name)
 
     def create_employee(self, firstname, name, lastname, email, password, role_id, post_id):
         """Создание нового сотрудника"""
@@ -394,74 +659,322 @@ class Database:
                  VALUES (%s, %s, %s, %s, SHA2(%s, 256), %s, %s)"""
         self.cursor.execute(sql, (firstname, name, lastname, email, password, role_id, post_id))
         self.connector.commit()
+        user_directory.invalidate()
         return self.cursor.rowcount > 0
 
     """Методы для работы с календарем"""
 
     def get_user_task_dates(self, user_id):
         """Получение дат задач пользователя"""
-        sql = """SELECT date2 FROM task 
-                   WHERE recipient = %s AND date2 IS NOT NULL"""
-        self.cursor.execute(sql, (user_id,))
+        self.cursor.execute(USER_TASK_DATES_SQL, (user_id,))
         return [row[0] for row in self.cursor.fetchall()]
 
     def get_user_deal_dates(self, user_id):
         """Получение дат сделок пользователя"""
-        sql = """SELECT date2 FROM deal 
-                   WHERE executor = %s AND date2 IS NOT NULL"""
-        self.cursor.execute(sql, (user_id,))
+        self.cursor.execute(USER_DEAL_DATES_SQL, (user_id,))
         return [row[0] for row in self.cursor.fetchall()]
 
-    def get_tasks_for_date(self, user_id, date_str):
-        """Получение задач на определенную дату"""
-        sql = """SELECT t.description, tt.name, 
-                   CONCAT(u.firstname, ' ', u.name) as sender
-                   FROM task t
-                   JOIN typetask tt ON t.idtt = tt.idtypetask
-                   JOIN userr u ON t.sender = u.iduser
-                   WHERE t.recipient = %s 
-                   AND DATE(t.date2) = %s"""
-        self.cursor.execute(sql, (user_id, date_str))
+    def get_tasks_for_date(self, user_id, day_start, day_end):
+        """Получение задач на сутки [day_start, day_end)"""
+        self.cursor.execute(TASKS_FOR_DATE_SQL, (user_id, day_start, day_end))
         return self.cursor.fetchall()
 
-    def get_deals_for_date(self, user_id, date_str):
-        """Получение сделок на определенную дату"""
-        sql = """SELECT d.name, td.name as type, sd.name as status
-                   FROM deal d
-                   JOIN typedeal td ON d.idtd = td.idtypedeal
-                   JOIN statusdeal sd ON d.idsd = sd.idstatusdeal
-                   WHERE d.executor = %s 
-                   AND DATE(d.date2) = %s"""
-        self.cursor.execute(sql, (user_id, date_str))
+    def get_deals_for_date(self, user_id, day_start, day_end):
+        """Получение сделок на сутки [day_start, day_end)"""
+        self.cursor.execute(DEALS_FOR_DATE_SQL, (user_id, day_start, day_end))
         return self.cursor.fetchall()
 
     """Методы для работы с чатом"""
 
     def get_chat_users(self, current_user_id):
         """Получение списка пользователей для чата"""
-        sql = """SELECT userr.iduser, userr.firstname, userr.name, userr.lastname, post.name 
-                     FROM userr 
-                     JOIN post ON userr.idp = post.idpost
-                     WHERE userr.iduser != %s"""
-        self.cursor.execute(sql, (current_user_id,))
+        return [(user[0], user[1], user[2], user[3], user[6])
+                for user in user_directory.users(self.cursor) if user[0] != current_user_id]
+
+    def get_chat_messages_since(self, user_a, user_b, after_id=0, limit=CHAT_FETCH_LIMIT):
+        """Сообщения переписки двух пользователей с ID больше after_id.
+
+        Возвращает не более limit строк (idmessage, sender, recipient, message_text, sent_at)
+        по возрастанию ID. Каждое направление переписки читается своей частью
+        UNION ALL по индексу (sender, recipient, idmessage) вместо условия с OR.
+        """
+        self.cursor.execute(CHAT_MESSAGES_SINCE_SQL, (user_a, user_b, after_id, limit,
+                                                      user_b, user_a, after_id, limit, limit))
         return self.cursor.fetchall()
 
-    def get_chat_messages(self, sender_id, recipient_id):
-        """Получение сообщений между двумя пользователями"""
-        sql = """SELECT sender, recipient, message_text, sent_at 
-                     FROM messages 
-                     WHERE (sender = %s AND recipient = %s) OR 
-                           (sender = %s AND recipient = %s)
-                     ORDER BY sent_at"""
-        self.cursor.execute(sql, (sender_id, recipient_id, recipient_id, sender_id))
-        return self.cursor.fetchall()
+    def get_chat_messages_before(self, user_a, user_b, before=None, limit=CHAT_PAGE_SIZE):
+        """Страница истории переписки: limit сообщений, предшествующих before.
+
+        before - ключ (sent_at, idmessage) самого старого уже загруженного
+        сообщения; без него возвращаются последние сообщения. Строки
+        (idmessage, sender, recipient, message_text, sent_at) идут от старых к новым.
+        """
+        self.cursor.execute(*chat_messages_before_query(user_a, user_b, before, limit))
+        return list(reversed(self.cursor.fetchall()))
 
-    def send_message(self, sender_id, recipient_id, message_text):
-        """Отправка сообщения"""
+    def send_message(self, sender_id, recipient_id, message_text, attachment=None):
+        """Отправка сообщения; возвращает его ID.
+
+        attachment - (sha256, имя файла) файла, сохранённого store_blob
+        """
         sql = "INSERT INTO messages (sender, recipient, message_text, sent_at) VALUES (%s, %s, %s, NOW())"
-        self.cursor.execute(sql, (sender_id, recipient_id, message_text))
+        try:
+            self.connector.begin()
+            self.cursor.execute(sql, (sender_id, recipient_id, message_text))
+            message_id = self.cursor.lastrowid
+            if attachment is not None:
+                self.cursor.execute("""INSERT INTO message_attachment (idmessage, sha256, filename)
+                                       VALUES (%s, %s, %s)""", (message_id, *attachment))
+            # Отметка о прочтении для новой переписки: по ней get_unread_counts находит собеседников
+            self.cursor.execute("""INSERT IGNORE INTO message_read (user_id, peer_id, last_read_id)
+                                   VALUES (%s, %s, 0)""", (recipient_id, sender_id))
+            self.connector.commit()
+        except Exception:
+            self.connector.rollback()
+            raise
+        return message_id
+
+    def search_messages(self, user_id, query, limit=50):
+        """Поиск по всем перепискам пользователя.
+
+        Каждое слово запроса должно встречаться в сообщении (в том числе
+        как начало слова). Возвращает строки
+        (idmessage, sender, recipient, message_text, sent_at, релевантность),
+        самые релевантные первыми.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        against = " ".join(f"+{term}*" for term in terms)
+
+        self.cursor.execute(SEARCH_MESSAGES_SQL, (against, against, user_id, user_id, limit))
+        return self.cursor.fetchall()
+
+    def get_chat_messages_around(self, user_a, user_b, message_id, count=CHAT_PAGE_SIZE // 2):
+        """Окно переписки вокруг сообщения message_id.
+
+        Возвращает (более ранние, сообщение и более поздние): до count
+        сообщений перед найденным и до count после него, от старых к новым.
+        """
+        sql = "SELECT sent_at FROM messages WHERE idmessage = %s"
+        self.cursor.execute(sql, (message_id,))
+        row = self.cursor.fetchone()
+        if not row:
+            return [], []
+
+        older = self.get_chat_messages_before(user_a, user_b, (row[0], message_id), count)
+        newer = self.get_chat_messages_since(user_a, user_b, message_id - 1, count + 1)
+        return older, newer
+
+    def get_unread_counts(self, user_id):
+        """Число непрочитанных сообщений от каждого собеседника: {ID собеседника: количество}"""
+        self.cursor.execute(UNREAD_COUNTS_SQL, (user_id,))
+        return dict(self.cursor.fetchall())
+
+    def mark_read(self, user_id, peer_id, last_read_id):
+        """Отметить переписку с peer_id прочитанной до сообщения last_read_id"""
+        sql = """INSERT INTO message_read (user_id, peer_id, last_read_id)
+                 VALUES (%s, %s, %s)
+                 ON DUPLICATE KEY UPDATE last_read_id = GREATEST(last_read_id, VALUES(last_read_id))"""
+        self.cursor.execute(sql, (user_id, peer_id, last_read_id))
         self.connector.commit()
-        return self.cursor.rowcount > 0
+        return True
+
+    def get_last_incoming_id(self, user_id):
+        """ID последнего сообщения, полученного пользователем (0, если их нет)"""
+        sql = "SELECT COALESCE(MAX(idmessage), 0) FROM messages WHERE recipient = %s"
+        self.cursor.execute(sql, (user_id,))
+        return self.cursor.fetchone()[0]
+
+    def get_incoming_since(self, user_id, after_id, limit=CHAT_FETCH_LIMIT):
+        """Новые входящие сообщения пользователя: (idmessage, sender) с ID больше after_id"""
+        self.cursor.execute(INCOMING_SINCE_SQL, (user_id, after_id, limit))
+        return self.cursor.fetchall()
+
+    """Методы для работы с каналами"""
+
+    def get_user_channels(self, user_id):
+        """Каналы пользователя с числом непрочитанных сообщений: (ID, название, непрочитано)"""
+        sql = """SELECT c.idchannel, c.name,
+                        (SELECT COUNT(*) FROM channel_message m
+                         WHERE m.idchannel = c.idchannel AND m.idchannelmessage > cm.last_read_id
+                         AND m.sender <> %s) AS unread
+                 FROM channel_member cm
+                 JOIN channel c ON c.idchannel = cm.idchannel
+                 WHERE cm.iduser = %s
+                 ORDER BY c.name"""
+        self.cursor.execute(sql, (user_id, user_id))
+        return self.cursor.fetchall()
+
+    def create_channel(self, name, creator_id, member_ids):
+        """Создание канала с участниками; возвращает ID канала или None"""
+        members = sorted(set(member_ids) | {creator_id})
+        try:
+            self.connector.begin()
+            self.cursor.execute("""INSERT INTO channel (name, created_by, created_at)
+                                   VALUES (%s, %s, NOW())""", (name, creator_id))
+            channel_id = self.cursor.lastrowid
+            self.cursor.executemany("""INSERT INTO channel_member (idchannel, iduser, last_read_id)
+                                       VALUES (%s, %s, 0)""",
+                                    [(channel_id, user_id) for user_id in members])
+            self.connector.commit()
+        except Exception as e:
+            self.connector.rollback()
+            print(f"Ошибка создания канала: {e}")
+            return None
+        return channel_id
+
+    def send_channel_message(self, channel_id, sender_id, message_text, attachment=None):
+        """Отправка сообщения в канал: одна строка на сообщение независимо от числа участников.
+
+        Возвращает ID сообщения или None, если отправитель не участник канала
+        """
+        sql = """INSERT INTO channel_message (idchannel, sender, message_text, sent_at)
+                 SELECT idchannel, iduser, %s, NOW() FROM channel_member
+                 WHERE idchannel = %s AND iduser = %s"""
+        try:
+            self.connector.begin()
+            self.cursor.execute(sql, (message_text, channel_id, sender_id))
+            sent = self.cursor.rowcount > 0
+            message_id = self.cursor.lastrowid
+            if sent and attachment is not None:
+                self.cursor.execute("""INSERT INTO message_attachment (idchannelmessage, sha256, filename)
+                                       VALUES (%s, %s, %s)""", (message_id, *attachment))
+            self.connector.commit()
+        except Exception:
+            self.connector.rollback()
+            raise
+        return message_id if sent else None
+
+    def get_channel_messages_since(self, channel_id, after_id=0, limit=CHAT_FETCH_LIMIT):
+        """Сообщения канала с ID больше after_id: (ID, sender, idchannel, message_text, sent_at)"""
+        self.cursor.execute(CHANNEL_MESSAGES_SINCE_SQL, (channel_id, after_id, limit))
+        return self.cursor.fetchall()
+
+    def get_channel_messages_before(self, channel_id, before=None, limit=CHAT_PAGE_SIZE):
+        """Страница истории канала перед ключом before = (sent_at, ID), от старых к новым"""
+        condition = ""
+        params = [channel_id]
+        if before is not None:
+            condition = "AND (sent_at < %s OR (sent_at = %s AND idchannelmessage < %s))"
+            params += [before[0], before[0], before[1]]
+
+        sql = f"""SELECT idchannelmessage, sender, idchannel, message_text, sent_at
+                  FROM channel_message
+                  WHERE idchannel = %s {condition}
+                  ORDER BY sent_at DESC, idchannelmessage DESC
+                  LIMIT %s"""
+        self.cursor.execute(sql, params + [limit])
+        return list(reversed(self.cursor.fetchall()))
+
+    def mark_channel_read(self, channel_id, user_id, last_read_id):
+        """Сдвинуть отметку о прочтении канала участником"""
+        sql = """UPDATE channel_member SET last_read_id = GREATEST(last_read_id, %s)
+                 WHERE idchannel = %s AND iduser = %s"""
+        self.cursor.execute(sql, (last_read_id, channel_id, user_id))
+        self.connector.commit()
+        return True
+
+    """Методы для работы с вложениями"""
+
+    def store_blob(self, path, progress=None):
+        """Сохранение файла в хранилище вложений; возвращает SHA-256 содержимого.
+
+        Файл читается частями по BLOB_CHUNK_SIZE дважды: сначала считается
+        хэш, затем, если такого содержимого ещё нет, части записываются в
+        blob_chunk. Уже сохранённый файл повторно не загружается, а
+        прерванная загрузка продолжается с недостающих частей.
+        progress(сделано, всего) вызывается после каждой части.
+        """
+        size = os.path.getsize(path)
+        total = 2 * size
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            done = 0
+            for chunk in iter(lambda: file.read(BLOB_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(done, total)
+        sha256 = digest.hexdigest()
+
+        self.cursor.execute("SELECT complete FROM blob_object WHERE sha256 = %s", (sha256,))
+        row = self.cursor.fetchone()
+        if row and row[0]:
+            if progress:
+                progress(total, total)
+            return sha256
+
+        chunk_count = (size + BLOB_CHUNK_SIZE - 1) // BLOB_CHUNK_SIZE
+        self.cursor.execute("""INSERT IGNORE INTO blob_object (sha256, size, chunk_count, complete, created_at)
+                               VALUES (%s, %s, %s, 0, NOW())""", (sha256, size, chunk_count))
+        self.cursor.execute("SELECT seq FROM blob_chunk WHERE sha256 = %s", (sha256,))
+        stored = {row[0] for row in self.cursor.fetchall()}
+
+        # Файл мог измениться после подсчёта хэша - проверяем то, что записали
+        check = hashlib.sha256()
+        with open(path, 'rb') as file:
+            done = size
+            for seq, chunk in enumerate(iter(lambda: file.read(BLOB_CHUNK_SIZE), b'')):
+                check.update(chunk)
+                if seq not in stored:
+                    self.cursor.execute("INSERT IGNORE INTO blob_chunk (sha256, seq, data) VALUES (%s, %s, %s)",
+                                        (sha256, seq, chunk))
+                done += len(chunk)
+                if progress:
+                    progress(done, total)
+
+        if check.hexdigest() != sha256:
+            self.cursor.execute("DELETE FROM blob_object WHERE sha256 = %s AND complete = 0", (sha256,))
+            raise ValueError(f"Файл {path} изменился во время загрузки")
+        self.cursor.execute("UPDATE blob_object SET complete = 1 WHERE sha256 = %s", (sha256,))
+        return sha256
+
+    def read_blob(self, sha256, path, progress=None):
+        """Выгрузка файла из хранилища вложений в path по одной части за запрос"""
+        self.cursor.execute("SELECT size, chunk_count FROM blob_object WHERE sha256 = %s AND complete = 1",
+                            (sha256,))
+        row = self.cursor.fetchone()
+        if not row:
+            raise ValueError("Файл вложения не найден")
+        size, chunk_count = row
+
+        # Файл появляется под своим именем только целиком и с совпавшим хэшем
+        partial = path + ".part"
+        digest = hashlib.sha256()
+        done = 0
+        try:
+            with open(partial, 'wb') as file:
+                for seq in range(chunk_count):
+                    self.cursor.execute("SELECT data FROM blob_chunk WHERE sha256 = %s AND seq = %s",
+                                        (sha256, seq))
+                    row = self.cursor.fetchone()
+                    if not row:
+                        raise ValueError("Файл вложения повреждён")
+                    chunk = row[0]
+                    digest.update(chunk)
+                    file.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, size)
+            if digest.hexdigest() != sha256:
+                raise ValueError("Файл вложения повреждён")
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return path
+
+    def get_attachment(self, message_id, channel=False):
+        """Вложение сообщения (личного или канала): (sha256, имя файла, размер) или None"""
+        column = "idchannelmessage" if channel else "idmessage"
+        sql = f"""SELECT a.sha256, a.filename, b.size
+                  FROM message_attachment a
+                  JOIN blob_object b ON b.sha256 = a.sha256
+                  WHERE a.{column} = %s"""
+        self.cursor.execute(sql, (message_id,))
+        return self.cursor.fetchone()
 
     """Методы для аналитики"""
 
@@ -542,5 +1055,8 @@ class Database:
         return self.cursor.fetchone()
 
     def close(self):
-        """Закрыть соединение с БД"""
-        self.connector.close()
\ No newline at end of file
+        """Вернуть соединение с БД в пул"""
+        if self.connector is None:
+            return
+        self._finalizer()
+        self.connector = None
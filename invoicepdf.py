@@ -0,0 +1,238 @@
+"""Счёт в PDF и его просмотр в окне программы.
+
+PDF строится через QTextDocument/QPdfWriter по тем же данным, что и XLSX
+(invoices.invoice_data), поэтому для просмотра не нужна программа для
+таблиц. Готовые PDF кэшируются на диске: ключ включает всё, что попадает
+в документ, и версию шаблона, так что изменённая сделка получает новый файл.
+"""
+import hashlib
+import html
+import os
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from invoices import RES_DIR, SUPPLIER
+
+try:
+    from PyQt6.QtPdf import QPdfDocument
+    from PyQt6.QtPdfWidgets import QPdfView
+except ImportError:
+    # Без модуля QtPdf счёт показывается как форматированный текст
+    QPdfDocument = QPdfView = None
+
+
+# Увеличивается при любом изменении вида счёта - старые файлы кэша перестают подходить
+PDF_TEMPLATE_VERSION = 1
+
+# Сколько PDF хранить в кэше
+PDF_CACHE_LIMIT = 500
+
+# Печать и подпись: ресурс документа, файл, размер в счёте
+PDF_IMAGES = [("pech", "pech.png", 100, 100), ("pod", "pod.png", 100, 50)]
+
+
+def format_money(value):
+    """12345.5 -> "12 345,50" """
+    return f"{value:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def invoice_html(data, issued):
+    """Разметка счёта для QTextDocument"""
+    client = data['client']
+    price = data['price']
+    nds = data['nds']
+    nds_sum = round(price * nds / 100, 2)
+    total = round(price + nds_sum, 2)
+
+    def text(value):
+        return html.escape(str(value)).replace("\n", "<br>")
+
+    supplier = (f"{SUPPLIER['name']}\nИНН {SUPPLIER['inn']} КПП {SUPPLIER['kpp']}\n"
+                f"Адрес: {SUPPLIER['address']}\nТел.: {SUPPLIER['phone']}")
+    buyer = f"{client['name']}\nИНН {client['inn']} КПП {client['kpp']}\nАдрес: {client['address']}"
+    cell = 'style="border: 1px solid black; padding: 4px;"'
+
+    return f"""
+    <html><body style="font-family: Arial; font-size: 10pt;">
+    <p align="center" style="font-size: 12pt; font-weight: bold;">
+        Счет № {data['deal_id']} от {issued.strftime('%d.%m.%Y')}</p>
+    <table width="100%" cellspacing="0" cellpadding="4">
+        <tr><td width="25%"><b>Поставщик:</b></td><td>{text(supplier)}</td></tr>
+        <tr><td><b>Покупатель:</b></td><td>{text(buyer)}</td></tr>
+    </table>
+    <br>
+    <table width="100%" cellspacing="0" cellpadding="4" style="border-collapse: collapse;">
+        <tr>
+            <th {cell}>№</th><th {cell}>Товары (работы, услуги)</th><th {cell}>Кол-во</th>
+            <th {cell}>Ед.</th><th {cell}>Цена</th><th {cell}>НДС</th>
+            <th {cell}>Сумма НДС</th><th {cell}>Всего</th>
+        </tr>
+        <tr>
+            <td {cell} align="center">1</td><td {cell}>{text(data['title'])}</td>
+            <td {cell} align="center">1</td><td {cell} align="center">шт.</td>
+            <td {cell} align="right">{format_money(price)}</td><td {cell} align="center">{nds}%</td>
+            <td {cell} align="right">{format_money(nds_sum)}</td><td {cell} align="right">{format_money(total)}</td>
+        </tr>
+    </table>
+    <p align="right"><b>Итого: {format_money(total)}</b></p>
+    <p align="right" style="font-size: 12pt;"><b>Всего к оплате: {format_money(total)}</b></p>
+    <br>
+    <table width="100%">
+        <tr>
+            <td align="center"><img src="pech" width="100" height="100"><br>М.П.</td>
+            <td align="center"><img src="pod" width="100" height="50"><br>{text(SUPPLIER['director'])}</td>
+        </tr>
+    </table>
+    </body></html>
+    """
+
+
+_images = None
+
+
+def invoice_images():
+    """Печать и подпись, загруженные один раз"""
+    global _images
+    if _images is None:
+        _images = {}
+        for name, filename, width, height in PDF_IMAGES:
+            image = QtGui.QImage(os.path.join(RES_DIR, filename))
+            if image.isNull():
+                print(f"Ошибка загрузки изображения {filename}")
+                continue
+            # Вдвое крупнее размера в счёте - для печати
+            _images[name] = image.scaled(width * 2, height * 2, QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                                         QtCore.Qt.TransformationMode.SmoothTransformation)
+    return _images
+
+
+def invoice_document(data, issued):
+    """QTextDocument счёта с подключёнными картинками"""
+    document = QtGui.QTextDocument()
+    for name, image in invoice_images().items():
+        document.addResource(QtGui.QTextDocument.ResourceType.ImageResource.value, QtCore.QUrl(name), image)
+    document.setHtml(invoice_html(data, issued))
+    return document
+
+
+def render_pdf(data, issued):
+    """PDF счёта (A4) по данным invoice_data()"""
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    writer = QtGui.QPdfWriter(buffer)
+    writer.setPageSize(QtGui.QPageSize(QtGui.QPageSize.PageSizeId.A4))
+    writer.setPageMargins(QtCore.QMarginsF(12.7, 12.7, 12.7, 12.7), QtGui.QPageLayout.Unit.Millimeter)
+    writer.setTitle(f"Счет № {data['deal_id']}")
+
+    invoice_document(data, issued).print(writer)
+    del writer  # PDF дописывается в буфер при удалении QPdfWriter
+    buffer.close()
+    return bytes(buffer.data())
+
+
+class PdfCache:
+    """Готовые PDF счетов в каталоге кэша пользователя"""
+
+    def __init__(self, directory=None, limit=PDF_CACHE_LIMIT):
+        if directory is None:
+            base = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.StandardLocation.CacheLocation)
+            directory = os.path.join(base, "invoices")
+        self.directory = directory
+        self.limit = limit
+
+    @staticmethod
+    def key(data, issued):
+        """Имя файла: хэш всего, что попадает в документ, и версии шаблона"""
+        client = data['client']
+        parts = (PDF_TEMPLATE_VERSION, data['deal_id'], data['title'], data['price'], data['nds'],
+                 client['name'], client['inn'], client['kpp'], issued.strftime('%Y-%m-%d'))
+        return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest() + ".pdf"
+
+    def get(self, data, issued):
+        """PDF из кэша или новый, сохранённый в кэш"""
+        path = os.path.join(self.directory, self.key(data, issued))
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            pass
+
+        pdf = render_pdf(data, issued)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Запись через временный файл: другое окно не прочитает недописанный PDF
+            temp_path = path + ".part"
+            with open(temp_path, "wb") as f:
+                f.write(pdf)
+            os.replace(temp_path, path)
+            self.prune()
+        except OSError as e:
+            print(f"Ошибка записи кэша счетов: {e}")
+        return pdf
+
+    def prune(self):
+        """Удаление самых старых файлов сверх limit"""
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pdf")]
+        if len(files) <= self.limit:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.limit]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class InvoicePreviewDialog(QtWidgets.QDialog):
+    """Просмотр счёта в окне программы с сохранением в PDF или XLSX"""
+
+    def __init__(self, data, issued, pdf, load_xlsx=None, parent=None):
+        super().__init__(parent)
+        self.pdf = pdf
+        self.load_xlsx = load_xlsx
+        self.deal_id = data['deal_id']
+        self.setWindowTitle(f"Счет № {self.deal_id}")
+        self.resize(800, 900)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        if QPdfView is not None:
+            # Буфер и документ должны жить, пока открыт просмотр
+            self.buffer = QtCore.QBuffer(self)
+            self.buffer.setData(pdf)
+            self.buffer.open(QtCore.QIODevice.OpenModeFlag.ReadOnly)
+            self.document = QPdfDocument(self)
+            self.document.load(self.buffer)
+            view = QPdfView(self)
+            view.setDocument(self.document)
+            view.setPageMode(QPdfView.PageMode.MultiPage)
+            view.setZoomMode(QPdfView.ZoomMode.FitToWidth)
+        else:
+            view = QtWidgets.QTextBrowser(self)
+            self.text_document = invoice_document(data, issued)
+            view.setDocument(self.text_document)
+        layout.addWidget(view)
+
+        button_box = QtWidgets.QDialogButtonBox()
+        save_pdf_btn = button_box.addButton("Сохранить PDF", QtWidgets.QDialogButtonBox.ButtonRole.ActionRole)
+        save_pdf_btn.clicked.connect(lambda: self.save("pdf", lambda: self.pdf))
+        if load_xlsx is not None:
+            # Файл XLSX из БД загружается, только если его сохраняют
+            save_xlsx_btn = button_box.addButton("Сохранить XLSX", QtWidgets.QDialogButtonBox.ButtonRole.ActionRole)
+            save_xlsx_btn.clicked.connect(lambda: self.save("xlsx", self.load_xlsx))
+        close_btn = button_box.addButton("Закрыть", QtWidgets.QDialogButtonBox.ButtonRole.RejectRole)
+        close_btn.clicked.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def save(self, extension, load):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить счет", f"Счет_{self.deal_id}.{extension}")
+        if not path:
+            return
+        try:
+            content = load()
+            if not content:
+                QtWidgets.QMessageBox.warning(self, "Ошибка", "Счет не найден")
+                return
+            with open(path, "wb") as f:
+                f.write(content)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить счет: {e}")
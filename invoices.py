@@ -0,0 +1,418 @@
+"""Формирование счетов по сделкам.
+
+Пакетный запуск: python invoices.py [--status "Выставлен счёт/КП"] [--from 2024-01-01] [--to 2024-02-01]
+                                    [--all] [--workers N]
+Замер времени формирования счёта: python bench_invoices.py 200
+
+render_invoice() - чистая функция: получает данные счёта и возвращает
+файл XLSX, поэтому счета можно формировать в отдельных процессах.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.utils.exceptions import IllegalCharacterError
+from openpyxl.worksheet.page import PageMargins
+from PIL import Image as PILImage
+
+
+RES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "res")
+
+SUPPLIER = {
+    'name': "ООО «НГ-СОФТ»",
+    'inn': "9729293217",
+    'kpp': "771701001",
+    'address': "г. Москва, ул. 1-я Мытищинская, д. 28, стр. 1",
+    'phone': "+7 (495) 682-26-20",
+    'director': "Сукиасян Р.Х."
+}
+
+# Сколько готовых счетов записывать в БД одной транзакцией
+BILL_BATCH_SIZE = 50
+
+
+def invoice_data(deal_id, title, price, nds, client_name, client_inn, client_kpp):
+    """Данные счёта в виде, который можно передать в другой процесс"""
+    return {
+        'deal_id': deal_id,
+        'title': title,
+        'price': float(price) if price else 0.0,
+        'nds': int(nds) if nds else 20,
+        'client': {
+            'name': client_name or "Без названия",
+            'inn': client_inn or "не указан",
+            'kpp': client_kpp or "не указан",
+            'address': "не указан"
+        }
+    }
+
+
+# Части XLSX, которые render() собирает заново; остальные берутся из заготовки как есть
+SHEET_PART = "xl/worksheets/sheet1.xml"
+CORE_PART = "docProps/core.xml"
+
+
+def text_cell(ref, style, value):
+    """XML ячейки со строкой"""
+    value = str(value)
+    # Управляющие символы недопустимы в XML - как и openpyxl, счёт с ними не формируется
+    if ILLEGAL_CHARACTERS_RE.search(value):
+        raise IllegalCharacterError(f"{value} cannot be used in worksheets.")
+    space = ' xml:space="preserve"' if value != value.strip() else ""
+    return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+
+
+def number_cell(ref, style, value):
+    """XML ячейки с числом"""
+    return f'<c r="{ref}" s="{style}" t="n"><v>{value!r}</v></c>'
+
+
+class InvoiceTemplate:
+    """Шаблон счёта: всё, что не зависит от сделки, собирается один раз.
+
+    Конструктор строит через openpyxl полный лист счёта - стили, ширину
+    столбцов, объединённые ячейки, шапку таблицы, блок поставщика,
+    уменьшенные печать и подпись - с пустыми ячейками сделки и сохраняет
+    его в XLSX-заготовку. render() не создаёт Workbook: он подставляет
+    ячейки сделки и ширину столбцов в XML листа и записывает архив,
+    остальные части которого берутся из заготовки без изменений.
+    """
+
+    # Ширина столбцов
+    COLUMN_WIDTHS = {
+        'A': 5,  # №
+        'B': 40,  # Наименование
+        'C': 8,  # Кол-во
+        'D': 5,  # Ед.
+        'E': 15,  # Цена
+        'F': 8,  # НДС
+        'G': 15,  # Сумма НДС
+        'H': 18  # Всего (увеличено для больших сумм)
+    }
+    MERGED = ['A1:H1', 'A3:B3', 'C3:H3', 'A5:B5', 'C5:H5', 'A10:G10', 'A12:G12']
+    ROW_HEIGHTS = {3: 60, 5: 45}
+    HEADERS = ["№", "Товары (работы, услуги)", "Кол-во", "Ед.", "Цена", "НДС", "Сумма НДС", "Всего"]
+    # Печать и подпись: файл, ячейка, размер в счёте, текст, если файла нет
+    IMAGES = [("pech.png", "D15", 100, 100, "[МЕСТО ДЛЯ ПЕЧАТИ]"),
+              ("pod.png", "F15", 100, 50, "[МЕСТО ДЛЯ ПОДПИСИ]")]
+    # Во сколько раз картинка крупнее размера в счёте (для печати)
+    IMAGE_SCALE = 2
+    # Столбцы сумм: ширина увеличивается под большие числа
+    MONEY_COLUMNS = ['E', 'G', 'H']
+
+    def __init__(self, supplier=SUPPLIER, res_dir=RES_DIR):
+        # Настройка стилей
+        self.bold = Font(bold=True, name='Arial', size=10)
+        self.header_font = Font(bold=True, name='Arial', size=12)
+        self.regular = Font(name='Arial', size=10)
+        self.center = Alignment(horizontal='center', vertical='center')
+        self.right = Alignment(horizontal='right', vertical='center')
+        self.left = Alignment(horizontal='left', vertical='center', wrap_text=True)
+        self.border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                             top=Side(style='thin'), bottom=Side(style='thin'))
+        self.border_thick = Border(bottom=Side(style='thick'))
+        self.supplier = supplier
+
+        # Неизменные ячейки: (адрес, значение, шрифт, выравнивание, рамка)
+        self.static_cells = [
+            ('A3', "Поставщик:", self.bold, None, None),
+            ('C3', (f"{supplier['name']}\n"
+                    f"ИНН {supplier['inn']} КПП {supplier['kpp']}\n"
+                    f"Адрес: {supplier['address']}\n"
+                    f"Тел.: {supplier['phone']}"), self.regular, self.left, None),
+            ('A5', "Покупатель:", self.bold, None, None),
+            ('A8', 1, self.regular, self.center, self.border),  # №
+            ('C8', 1, self.regular, self.center, self.border),  # Кол-во
+            ('D8', "шт.", self.regular, self.center, self.border),  # Ед.
+            ('A10', "Итого:", self.bold, None, None),
+            ('A12', "Всего к оплате:", self.header_font, None, None),
+            ('D17', "М.П.", None, self.center, None),
+            ('F17', supplier['director'], None, self.center, None),
+        ]
+        self.static_cells += [(f"{chr(64 + col)}7", header, self.bold, self.center, self.border)
+                              for col, header in enumerate(self.HEADERS, 1)]
+
+        # Ячейки сделки: (адрес, шрифт, выравнивание, рамка, формат числа); в заготовке без значения
+        money = '#,##0.00'
+        self.deal_cells = [
+            ('A1', self.header_font, self.center, None, None),  # Номер счета и дата
+            ('C5', self.regular, self.left, None, None),  # Покупатель
+            ('B8', self.regular, self.right, self.border, None),  # Наименование
+            ('E8', self.regular, self.right, self.border, money),  # Цена
+            ('F8', self.regular, self.center, self.border, None),  # НДС
+            ('G8', self.regular, self.right, self.border, money),  # Сумма НДС
+            ('H8', self.regular, self.right, self.border, money),  # Всего
+            ('H10', self.bold, None, self.border_thick, money),  # Итого
+            ('H12', self.header_font, None, self.border_thick, money),  # Всего к оплате
+        ]
+
+        self.images = []
+        for name, anchor, width, height, placeholder in self.IMAGES:
+            try:
+                png = self.scaled_png(os.path.join(res_dir, name), width, height)
+            except Exception as img_error:
+                print(f"Ошибка загрузки изображений: {img_error}")
+                png = None
+            self.images.append((png, anchor, width, height, placeholder))
+
+        self.build_skeleton()
+
+    def scaled_png(self, path, width, height):
+        """PNG, уменьшенный до размера в счёте"""
+        with PILImage.open(path) as img:
+            img = img.convert("RGBA")
+            img.thumbnail((width * self.IMAGE_SCALE, height * self.IMAGE_SCALE), PILImage.LANCZOS)
+            output = io.BytesIO()
+            img.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+
+    def build_workbook(self):
+        """Книга счёта без данных сделки"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Счет"
+
+        for col, width in self.COLUMN_WIDTHS.items():
+            ws.column_dimensions[col].width = width
+        for cells in self.MERGED:
+            ws.merge_cells(cells)
+        for row, height in self.ROW_HEIGHTS.items():
+            ws.row_dimensions[row].height = height
+        for coordinate, value, font, alignment, border in self.static_cells:
+            cell = ws[coordinate]
+            cell.value = value
+            if font is not None:
+                cell.font = font
+            if alignment is not None:
+                cell.alignment = alignment
+            if border is not None:
+                cell.border = border
+        for coordinate, font, alignment, border, number_format in self.deal_cells:
+            cell = ws[coordinate]
+            cell.font = font
+            if alignment is not None:
+                cell.alignment = alignment
+            if border is not None:
+                cell.border = border
+            if number_format is not None:
+                cell.number_format = number_format
+
+        # Подпись и печать
+        for png, anchor, width, height, placeholder in self.images:
+            if png is not None:
+                image = Image(io.BytesIO(png))
+                image.width = width
+                image.height = height
+                ws.add_image(image, anchor)
+            else:
+                # Запасной вариант
+                ws[anchor] = placeholder
+                ws[anchor].font = self.regular
+
+        # Настройка страницы
+        ws.page_margins = PageMargins(left=0.5, right=0.5, top=0.5, bottom=0.5)
+        ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
+        ws.page_setup.paperSize = ws.PAPERSIZE_A4
+        return wb
+
+    def build_skeleton(self):
+        """Сохранить книгу без сделки и разметить в XML листа места для данных сделки"""
+        output = io.BytesIO()
+        self.build_workbook().save(output)
+        with zipfile.ZipFile(output) as archive:
+            self.parts = [(name, archive.read(name)) for name in archive.namelist()]
+        parts = dict(self.parts)
+
+        # Фигурные скобки XML экранируются: лист и свойства заполняются через str.format
+        sheet = parts[SHEET_PART].decode("utf-8").replace("{", "{{").replace("}", "}}")
+        self.cell_styles = {}
+        for coordinate, *_ in self.deal_cells:
+            match = re.search(rf'<c r="{coordinate}" s="(\d+)"[^>]*/>', sheet)
+            if match is None:
+                raise RuntimeError(f"В заготовке счёта нет ячейки {coordinate}")
+            self.cell_styles[coordinate] = match.group(1)
+            sheet = sheet[:match.start()] + "{" + coordinate + "}" + sheet[match.end():]
+        sheet, found = re.subn(r"<cols>.*?</cols>", "{cols}", sheet)
+        if found != 1:
+            raise RuntimeError("В заготовке счёта нет ширины столбцов")
+        self.sheet_xml = sheet
+
+        core = parts[CORE_PART].decode("utf-8").replace("{", "{{").replace("}", "}}")
+        self.core_xml = re.sub(r"(<dcterms:(created|modified)[^>]*>)[^<]*(</dcterms:\2>)", r"\1{created}\3", core)
+
+    def render(self, data, issued=None):
+        """Файл счёта XLSX по данным invoice_data()"""
+        client = data['client']
+        issued = issued or datetime.now()
+        style = self.cell_styles
+
+        # Финансовые расчеты
+        price = data['price']
+        nds = data['nds']
+        nds_sum = round(price * nds / 100, 2)
+        total = round(price + nds_sum, 2)
+
+        cells = {
+            'A1': text_cell('A1', style['A1'], f"Счет № {data['deal_id']} от {issued.strftime('%d.%m.%Y')}"),
+            'C5': text_cell('C5', style['C5'], f"{client['name']}\n"
+                                               f"ИНН {client['inn']} КПП {client['kpp']}\n"
+                                               f"Адрес: {client['address']}"),
+            'B8': text_cell('B8', style['B8'], data['title']),
+            'E8': number_cell('E8', style['E8'], price),
+            'F8': text_cell('F8', style['F8'], f"{nds}%"),
+            'G8': number_cell('G8', style['G8'], nds_sum),
+            'H8': number_cell('H8', style['H8'], total),
+            'H10': number_cell('H10', style['H10'], total),
+            'H12': number_cell('H12', style['H12'], total),
+        }
+
+        # Автоматическое расширение столбцов для больших чисел
+        widths = dict(self.COLUMN_WIDTHS)
+        for col, value in zip(self.MONEY_COLUMNS, (price, nds_sum, total)):
+            if len(f"{value:,.2f}") > widths[col]:
+                widths[col] = len(f"{value:,.2f}") + 2
+        cols = "".join(f'<col width="{width}" customWidth="1" min="{ord(col) - 64}" max="{ord(col) - 64}" />'
+                       for col, width in widths.items())
+
+        created = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in self.parts:
+                if name == SHEET_PART:
+                    content = self.sheet_xml.format(cols=cols, **cells).encode("utf-8")
+                elif name == CORE_PART:
+                    content = self.core_xml.format(created=created).encode("utf-8")
+                # PNG уже сжат - повторное сжатие только тратит время
+                archive.writestr(name, content, zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED)
+        return output.getvalue()
+
+
+_template = None
+
+
+def get_template():
+    """Шаблон счёта, общий для всех счетов процесса"""
+    global _template
+    if _template is None:
+        _template = InvoiceTemplate()
+    return _template
+
+
+def render_invoice(data, issued=None):
+    """Файл счёта XLSX по данным invoice_data()"""
+    return get_template().render(data, issued)
+
+
+def render_invoices(invoices, workers=None):
+    """Формирование счетов в пуле процессов.
+
+    Возвращает итератор (ID сделки, файл счёта или None, текст ошибки или None)
+    в порядке готовности.
+    """
+    # spawn, а не fork: вызывающий процесс может держать потоки Qt и соединения с БД
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        futures = {executor.submit(render_invoice, data): data['deal_id'] for data in invoices}
+        for future in as_completed(futures):
+            deal_id = futures[future]
+            try:
+                yield deal_id, future.result(), None
+            except Exception as e:
+                yield deal_id, None, str(e)
+    finally:
+        # При отмене пакета ещё не начатые счета не формируются
+        executor.shutdown(cancel_futures=True)
+
+
+def generate_invoices(db, status_name=None, date_from=None, date_to=None, missing_only=True,
+                      workers=None, batch_size=BILL_BATCH_SIZE, progress=None):
+    """Пакетное формирование счетов по сделкам, отобранным фильтром.
+
+    db - экземпляр Database (функцию можно передать в QueryRunner.run как метод).
+    Готовые счета записываются в БД транзакциями по batch_size штук.
+    progress(сделано, всего) вызывается после каждой сделки.
+    Возвращает {'saved': [ID сделок], 'failed': [(ID сделки, текст ошибки)]}.
+    """
+    deals = db.get_deals_for_invoices(status_name, date_from, date_to, missing_only)
+    report = {'saved': [], 'failed': []}
+    if progress:
+        progress(0, len(deals))
+    if not deals:
+        return report
+
+    invoices = {deal[0]: invoice_data(*deal) for deal in deals}
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if db.update_deal_bills(batch):
+            report['saved'].extend(deal_id for deal_id, _, _ in batch)
+        else:
+            report['failed'].extend((deal_id, "Не удалось сохранить счёт") for deal_id, _, _ in batch)
+        batch.clear()
+
+    done = 0
+    for deal_id, bill_data, error in render_invoices(invoices.values(), workers):
+        if error is None:
+            # Вместе с файлом сохраняются данные, по которым он сформирован
+            batch.append((deal_id, bill_data, invoices[deal_id]))
+            if len(batch) >= batch_size:
+                flush()
+        else:
+            report['failed'].append((deal_id, error))
+        done += 1
+        if progress:
+            progress(done, len(deals))
+    flush()
+    return report
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетное формирование счетов по сделкам crm")
+    parser.add_argument("--status", help="только сделки в этом статусе")
+    parser.add_argument("--from", dest="date_from", type=parse_date, metavar="ГГГГ-ММ-ДД",
+                        help="сделки, созданные начиная с этой даты")
+    parser.add_argument("--to", dest="date_to", type=parse_date, metavar="ГГГГ-ММ-ДД",
+                        help="сделки, созданные до этой даты (не включая её)")
+    parser.add_argument("--all", action="store_true", help="пересоздать и уже сформированные счета")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию - по числу ядер)")
+    args = parser.parse_args(argv)
+
+    from database import Database
+
+    def print_progress(done, total):
+        print(f"\rСчета: {done} из {total}", end="", flush=True)
+
+    db = Database()
+    try:
+        report = generate_invoices(db, args.status, args.date_from, args.date_to, not args.all,
+                                   args.workers, progress=print_progress)
+    finally:
+        db.close()
+
+    print()
+    print(f"Сохранено счетов: {len(report['saved'])}")
+    for deal_id, error in report['failed']:
+        print(f"Сделка {deal_id}: {error}")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
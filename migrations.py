@@ -0,0 +1,556 @@
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pymysql
+from pymysql.cursors import DictCursor
+
+from database import (CHANNEL_MESSAGES_SINCE_SQL, CHAT_FETCH_LIMIT, CHAT_MESSAGES_SINCE_SQL, CHAT_PAGE_SIZE,
+                      DEAL_PAGE_SIZE, DEALS_FOR_DATE_SQL, INCOMING_SINCE_SQL, SEARCH_MESSAGES_SQL,
+                      TASK_BUCKETS_SQL, TASKS_FOR_DATE_SQL, TODAY_DEALS_STATS_SQL, UNREAD_COUNTS_SQL,
+                      USER_BY_EMAIL_SQL, USER_DEAL_DATES_SQL, USER_TASK_DATES_SQL,
+                      chat_messages_before_query, day_range, deals_page_query)
+from pool import DB_CONFIG
+
+
+# Вспомогательные функции
+
+
+def index_exists(cursor, table, name):
+    """Проверить наличие индекса"""
+    sql = """SELECT 1 FROM information_schema.statistics
+             WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+             LIMIT 1"""
+    cursor.execute(sql, (table, name))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, name):
+    """Проверить наличие столбца"""
+    sql = """SELECT 1 FROM information_schema.columns
+             WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+             LIMIT 1"""
+    cursor.execute(sql, (table, name))
+    return cursor.fetchone() is not None
+
+
+def create_index(cursor, table, name, columns, kind="INDEX"):
+    """Создать индекс, если его ещё нет (в MySQL нет CREATE INDEX IF NOT EXISTS)"""
+    if not index_exists(cursor, table, name):
+        cursor.execute(f"CREATE {kind} {name} ON {table} ({columns})")
+
+
+# Миграции
+
+
+def migration_001_base_schema(cursor):
+    """Таблицы, с которыми работает database.py"""
+    statements = [
+        """CREATE TABLE IF NOT EXISTS role (
+               idrole INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(45) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS post (
+               idpost INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(100) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS typetask (
+               idtypetask INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(100) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS statusdeal (
+               idstatusdeal INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(100) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS typedeal (
+               idtypedeal INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(100) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS organization (
+               idorganization INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(255) NOT NULL,
+               inn VARCHAR(12) NOT NULL,
+               kpp VARCHAR(9) NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS userr (
+               iduser INT AUTO_INCREMENT PRIMARY KEY,
+               firstname VARCHAR(45) NOT NULL,
+               name VARCHAR(45) NOT NULL,
+               lastname VARCHAR(45) NULL,
+               email VARCHAR(100) NOT NULL,
+               password VARCHAR(64) NOT NULL,
+               idr INT NOT NULL,
+               idp INT NOT NULL,
+               FOREIGN KEY (idr) REFERENCES role (idrole),
+               FOREIGN KEY (idp) REFERENCES post (idpost)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS deal (
+               iddeal INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(255) NOT NULL,
+               idtd INT NOT NULL,
+               idsd INT NOT NULL,
+               ido INT NOT NULL,
+               executor INT NOT NULL,
+               date1 DATETIME NOT NULL,
+               date2 DATETIME NULL,
+               price DECIMAL(12, 2) NULL,
+               nds INT NULL,
+               total_price DECIMAL(12, 2) NULL,
+               bill LONGBLOB NULL,
+               FOREIGN KEY (idtd) REFERENCES typedeal (idtypedeal),
+               FOREIGN KEY (idsd) REFERENCES statusdeal (idstatusdeal),
+               FOREIGN KEY (ido) REFERENCES organization (idorganization),
+               FOREIGN KEY (executor) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS task (
+               idtask INT AUTO_INCREMENT PRIMARY KEY,
+               idtt INT NOT NULL,
+               description TEXT NOT NULL,
+               sender INT NOT NULL,
+               recipient INT NOT NULL,
+               date1 DATETIME NOT NULL,
+               date2 DATETIME NULL,
+               completed BOOLEAN NOT NULL DEFAULT FALSE,
+               FOREIGN KEY (idtt) REFERENCES typetask (idtypetask),
+               FOREIGN KEY (sender) REFERENCES userr (iduser),
+               FOREIGN KEY (recipient) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS messages (
+               idmessage INT AUTO_INCREMENT PRIMARY KEY,
+               sender INT NOT NULL,
+               recipient INT NOT NULL,
+               message_text TEXT NOT NULL,
+               sent_at DATETIME NOT NULL,
+               FOREIGN KEY (sender) REFERENCES userr (iduser),
+               FOREIGN KEY (recipient) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+
+        # Справочные значения, на которые опирается код (id=1 - "Не обработан")
+        """INSERT IGNORE INTO statusdeal (idstatusdeal, name) VALUES
+               (1, 'Не обработан'), (2, 'Обработка'), (3, 'Выставлен счёт/КП'),
+               (4, 'Оплата'), (5, 'В производстве'), (6, 'Завершен')""",
+        """INSERT IGNORE INTO role (idrole, name) VALUES
+               (1, 'админ'), (2, 'менеджер'), (3, 'бухгалтер')"""
+    ]
+    for sql in statements:
+        cursor.execute(sql)
+
+
+def migration_002_hot_indexes(cursor):
+    """Индексы под условия частых запросов Database"""
+    # Задачи получателя: активные, просроченные, на сегодня, счётчики на главной
+    create_index(cursor, "task", "idx_task_recipient_completed_date2", "recipient, completed, date2")
+    # Календарь: сроки сделок исполнителя
+    create_index(cursor, "deal", "idx_deal_executor_date2", "executor, date2")
+    # Список сделок по страницам и статистика за день
+    create_index(cursor, "deal", "idx_deal_date1", "date1")
+    create_index(cursor, "deal", "idx_deal_executor_date1", "executor, date1")
+    # Переписка двух сотрудников
+    create_index(cursor, "messages", "idx_messages_pair_sent", "sender, recipient, sent_at")
+    # Авторизация и восстановление пароля
+    create_index(cursor, "userr", "idx_userr_email", "email")
+
+
+def migration_003_dealbill(cursor):
+    """Отдельное хранилище файлов счетов"""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS dealbill (
+                          iddeal INT PRIMARY KEY,
+                          content LONGBLOB NOT NULL,
+                          sha256 CHAR(64) NOT NULL,
+                          size INT UNSIGNED NOT NULL,
+                          created_at DATETIME NOT NULL,
+                          FOREIGN KEY (iddeal) REFERENCES deal (iddeal) ON DELETE CASCADE
+                      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
+    # Переносим счета, сохранённые в deal.bill до появления таблицы
+    cursor.execute("""INSERT IGNORE INTO dealbill (iddeal, content, sha256, size, created_at)
+                      SELECT iddeal, bill, SHA2(bill, 256), LENGTH(bill), NOW()
+                      FROM deal WHERE bill IS NOT NULL""")
+
+
+def migration_004_task_recipient_date2(cursor):
+    """Индекс для задач получателя на дату без условия completed"""
+    # В idx_task_recipient_completed_date2 диапазон по date2 без completed не используется
+    create_index(cursor, "task", "idx_task_recipient_date2", "recipient, date2")
+
+
+def migration_005_messages_pair_id(cursor):
+    """Индекс для догрузки переписки по последнему полученному ID"""
+    create_index(cursor, "messages", "idx_messages_pair_id", "sender, recipient, idmessage")
+
+
+def migration_006_messages_recipient_id(cursor):
+    """Индекс для опроса новых входящих сообщений по последнему ID"""
+    create_index(cursor, "messages", "idx_messages_recipient_id", "recipient, idmessage")
+
+
+def migration_007_message_read(cursor):
+    """Отметки о прочтении: последнее прочитанное сообщение каждой переписки"""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS message_read (
+                          user_id INT NOT NULL,
+                          peer_id INT NOT NULL,
+                          last_read_id INT NOT NULL,
+                          PRIMARY KEY (user_id, peer_id),
+                          FOREIGN KEY (user_id) REFERENCES userr (iduser),
+                          FOREIGN KEY (peer_id) REFERENCES userr (iduser)
+                      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
+    # Переписка до появления отметок считается прочитанной, иначе при первом
+    # запуске все старые сообщения показываются как непрочитанные
+    cursor.execute("""INSERT IGNORE INTO message_read (user_id, peer_id, last_read_id)
+                      SELECT recipient, sender, MAX(idmessage) FROM messages
+                      GROUP BY recipient, sender""")
+
+
+def migration_008_messages_fulltext(cursor):
+    """Полнотекстовый индекс для поиска по переписке"""
+    create_index(cursor, "messages", "ft_messages_text", "message_text", kind="FULLTEXT INDEX")
+
+
+def migration_009_channels(cursor):
+    """Каналы: одна строка на сообщение, участники со своими отметками о прочтении"""
+    statements = [
+        """CREATE TABLE IF NOT EXISTS channel (
+               idchannel INT AUTO_INCREMENT PRIMARY KEY,
+               name VARCHAR(100) NOT NULL,
+               created_by INT NOT NULL,
+               created_at DATETIME NOT NULL,
+               FOREIGN KEY (created_by) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS channel_member (
+               idchannel INT NOT NULL,
+               iduser INT NOT NULL,
+               last_read_id INT NOT NULL DEFAULT 0,
+               PRIMARY KEY (idchannel, iduser),
+               INDEX idx_channel_member_user (iduser),
+               FOREIGN KEY (idchannel) REFERENCES channel (idchannel) ON DELETE CASCADE,
+               FOREIGN KEY (iduser) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS channel_message (
+               idchannelmessage INT AUTO_INCREMENT PRIMARY KEY,
+               idchannel INT NOT NULL,
+               sender INT NOT NULL,
+               message_text TEXT NOT NULL,
+               sent_at DATETIME NOT NULL,
+               INDEX idx_channel_message_sent (idchannel, sent_at),
+               FOREIGN KEY (idchannel) REFERENCES channel (idchannel) ON DELETE CASCADE,
+               FOREIGN KEY (sender) REFERENCES userr (iduser)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ]
+    for sql in statements:
+        cursor.execute(sql)
+
+
+def migration_010_attachments(cursor):
+    """Вложения чата: файлы хранятся один раз по SHA-256, частями фиксированного размера"""
+    statements = [
+        """CREATE TABLE IF NOT EXISTS blob_object (
+               sha256 CHAR(64) PRIMARY KEY,
+               size BIGINT UNSIGNED NOT NULL,
+               chunk_count INT UNSIGNED NOT NULL,
+               complete TINYINT(1) NOT NULL DEFAULT 0,
+               created_at DATETIME NOT NULL
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS blob_chunk (
+               sha256 CHAR(64) NOT NULL,
+               seq INT UNSIGNED NOT NULL,
+               data MEDIUMBLOB NOT NULL,
+               PRIMARY KEY (sha256, seq),
+               FOREIGN KEY (sha256) REFERENCES blob_object (sha256) ON DELETE CASCADE
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS message_attachment (
+               idattachment INT AUTO_INCREMENT PRIMARY KEY,
+               idmessage INT NULL,
+               idchannelmessage INT NULL,
+               sha256 CHAR(64) NOT NULL,
+               filename VARCHAR(255) NOT NULL,
+               INDEX idx_attachment_message (idmessage),
+               INDEX idx_attachment_channel_message (idchannelmessage),
+               FOREIGN KEY (idmessage) REFERENCES messages (idmessage) ON DELETE CASCADE,
+               FOREIGN KEY (idchannelmessage) REFERENCES channel_message (idchannelmessage) ON DELETE CASCADE,
+               FOREIGN KEY (sha256) REFERENCES blob_object (sha256)
+           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+    ]
+    for sql in statements:
+        cursor.execute(sql)
+
+
+def migration_011_channel_message_id(cursor):
+    """Индекс для догрузки сообщений канала и счётчика непрочитанных по ID"""
+    # В idx_channel_message_sent после idchannel идёт sent_at, условие по ID им не ограничивается
+    create_index(cursor, "channel_message", "idx_channel_message_id", "idchannel, idchannelmessage")
+
+
+def migration_012_dealbill_data(cursor):
+    """Данные, по которым сформирован счёт, для просмотра без расхождений со сделкой"""
+    # Цена, НДС и реквизиты организации в сделке могут измениться после формирования счёта
+    if not column_exists(cursor, "dealbill", "data"):
+        cursor.execute("ALTER TABLE dealbill ADD COLUMN data TEXT NULL")
+
+
+MIGRATIONS = [
+    (1, "Базовая схема", migration_001_base_schema),
+    (2, "Индексы частых запросов", migration_002_hot_indexes),
+    (3, "Хранилище счетов dealbill", migration_003_dealbill),
+    (4, "Индекс задач получателя по сроку", migration_004_task_recipient_date2),
+    (5, "Индекс переписки по ID сообщения", migration_005_messages_pair_id),
+    (6, "Индекс входящих сообщений по ID", migration_006_messages_recipient_id),
+    (7, "Отметки о прочтении переписки", migration_007_message_read),
+    (8, "Полнотекстовый поиск по сообщениям", migration_008_messages_fulltext),
+    (9, "Каналы и групповые чаты", migration_009_channels),
+    (10, "Вложения чата", migration_010_attachments),
+    (11, "Индекс сообщений канала по ID", migration_011_channel_message_id),
+    (12, "Данные счёта в dealbill", migration_012_dealbill_data)
+]
+
+
+# Запуск миграций
+
+
+def connect(create_database=True, database=None):
+    """Подключение к БД (по умолчанию - из DB_CONFIG); база создаётся, если её ещё нет"""
+    config = dict(DB_CONFIG)
+    database = database or config["database"]
+    config.pop("database")
+    connection = pymysql.connect(**config)
+    connection.autocommit(True)
+    with connection.cursor() as cursor:
+        if create_database:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database} DEFAULT CHARACTER SET utf8mb4")
+    connection.select_db(database)
+    return connection
+
+
+def applied_versions(cursor):
+    """Версии уже применённых миграций"""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                          version INT PRIMARY KEY,
+                          description VARCHAR(255) NOT NULL,
+                          applied_at DATETIME NOT NULL
+                      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(connection, target=None):
+    """Применить недостающие миграции (до версии target включительно)"""
+    applied = []
+    with connection.cursor() as cursor:
+        done = applied_versions(cursor)
+        for version, description, apply in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"Миграция {version}: {description}")
+            apply(cursor)
+            cursor.execute("""INSERT INTO schema_migrations (version, description, applied_at)
+                              VALUES (%s, %s, NOW())""", (version, description))
+            applied.append(version)
+    return applied
+
+
+def print_status(connection):
+    """Показать состояние миграций"""
+    with connection.cursor() as cursor:
+        done = applied_versions(cursor)
+    for version, description, _ in MIGRATIONS:
+        mark = "x" if version in done else " "
+        print(f"[{mark}] {version}: {description}")
+
+
+# Демонстрационные данные
+
+
+def seed_demo_data(connection, count, days=365):
+    """Заполнить БД случайными сотрудниками, организациями, сделками и задачами.
+
+    Даты распределяются по последним days дням, чтобы выборка за одни сутки
+    была малой долей таблицы и планы запросов совпадали с рабочей БД.
+    """
+    rnd = random.Random(count)
+    now = datetime.now()
+
+    def moment():
+        return now - timedelta(days=rnd.randint(0, days), minutes=rnd.randint(0, 1439))
+
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT IGNORE INTO post (idpost, name) VALUES (1, 'Менеджер')")
+        cursor.execute("INSERT IGNORE INTO typedeal (idtypedeal, name) VALUES (1, 'Поставка')")
+        cursor.execute("INSERT IGNORE INTO typetask (idtypetask, name) VALUES (1, 'Звонок')")
+
+        users = max(count // 500, 5)
+        cursor.executemany(
+            """INSERT INTO userr (firstname, name, lastname, email, password, idr, idp)
+               VALUES (%s, %s, %s, %s, SHA2(%s, 256), %s, 1)""",
+            [("Демо", f"Сотрудник{i}", "", f"demo{i}.{count}@example.com", "demo", rnd.randint(1, 3))
+             for i in range(users)])
+        cursor.execute("SELECT iduser FROM userr")
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany(
+            "INSERT INTO organization (name, inn, kpp) VALUES (%s, %s, %s)",
+            [(f"ООО Демо {i}", f"{rnd.randint(10 ** 9, 10 ** 10 - 1)}", f"{rnd.randint(10 ** 8, 10 ** 9 - 1)}")
+             for i in range(max(count // 100, 5))])
+        cursor.execute("SELECT idorganization FROM organization")
+        org_ids = [row[0] for row in cursor.fetchall()]
+
+        deals = []
+        for i in range(count):
+            start = moment()
+            price = rnd.randint(1, 1000) * 1000
+            deals.append((f"Демо-сделка {i}", rnd.randint(1, 6), rnd.choice(org_ids), rnd.choice(user_ids),
+                          start, start + timedelta(days=rnd.randint(1, 60)), price, 20, price * 1.2))
+        cursor.executemany(
+            """INSERT INTO deal (name, idtd, idsd, ido, executor, date1, date2, price, nds, total_price)
+               VALUES (%s, 1, %s, %s, %s, %s, %s, %s, %s, %s)""", deals)
+
+        tasks = []
+        for i in range(count):
+            start = moment()
+            tasks.append((f"Демо-задача {i}", rnd.choice(user_ids), rnd.choice(user_ids), start,
+                          start + timedelta(days=rnd.randint(1, 30)), rnd.random() < 0.5))
+        cursor.executemany(
+            """INSERT INTO task (idtt, description, sender, recipient, date1, date2, completed)
+               VALUES (1, %s, %s, %s, %s, %s, %s)""", tasks)
+
+        messages = [(rnd.choice(user_ids), rnd.choice(user_ids), f"Сообщение {i}", moment())
+                    for i in range(count)]
+        cursor.executemany(
+            "INSERT INTO messages (sender, recipient, message_text, sent_at) VALUES (%s, %s, %s, %s)",
+            messages)
+        # Переписка прочитана до середины, чтобы у счётчика непрочитанных было что считать
+        cursor.execute("""INSERT IGNORE INTO message_read (user_id, peer_id, last_read_id)
+                          SELECT recipient, sender, MIN(idmessage) FROM messages
+                          GROUP BY recipient, sender""")
+
+        channels = max(count // 1000, 5)
+        cursor.executemany(
+            "INSERT INTO channel (name, created_by, created_at) VALUES (%s, %s, %s)",
+            [(f"Демо-канал {i} {count}", rnd.choice(user_ids), moment()) for i in range(channels)])
+        cursor.execute("SELECT idchannel FROM channel")
+        channel_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            "INSERT IGNORE INTO channel_member (idchannel, iduser) VALUES (%s, %s)",
+            [(channel_id, user_id) for channel_id in channel_ids for user_id in user_ids
+             if rnd.random() < 0.5])
+        cursor.executemany(
+            "INSERT INTO channel_message (idchannel, sender, message_text, sent_at) VALUES (%s, %s, %s, %s)",
+            [(rnd.choice(channel_ids), rnd.choice(user_ids), f"Сообщение канала {i}", moment())
+             for i in range(count)])
+
+        # Свежая статистика, иначе оптимизатор оценивает таблицы по пустому состоянию
+        cursor.execute("""ANALYZE TABLE userr, organization, deal, task, messages, message_read,
+                                        channel, channel_member, channel_message""")
+        cursor.fetchall()
+    print(f"Добавлено: {users} сотрудников, {count} сделок, {count} задач, {count} сообщений, "
+          f"{channels} каналов и {count} сообщений в них")
+
+
+# Проверка планов запросов
+
+
+def hot_queries(day=None):
+    """Частые запросы database.py с параметрами-образцами.
+
+    Текст запросов берётся из database.py, поэтому проверяются те же
+    запросы с соединениями справочников, что выполняет программа.
+    Для каждого указаны индекс основной таблицы и допустимые типы доступа
+    из EXPLAIN: условия по дате должны давать range, а не полный
+    просмотр (ALL/index).
+    """
+    start, end = day_range(day)
+    return [
+        ("get_user_by_email", USER_BY_EMAIL_SQL, ("user@example.com",),
+         "idx_userr_email", ("ref", "const")),
+        ("get_deals_page", *deals_page_query(None, None, DEAL_PAGE_SIZE),
+         "idx_deal_date1", ("index",)),
+        ("get_deals_page (менеджер)", *deals_page_query(1, None, DEAL_PAGE_SIZE),
+         "idx_deal_executor_date1", ("ref",)),
+        ("get_deals_page (следующая страница)", *deals_page_query(None, (end, 1 << 30), DEAL_PAGE_SIZE),
+         "idx_deal_date1", ("range",)),
+        ("get_today_deals_stats", TODAY_DEALS_STATS_SQL, (start, end),
+         "idx_deal_date1", ("range",)),
+        ("get_task_buckets", TASK_BUCKETS_SQL, (1,),
+         "idx_task_recipient_completed_date2", ("range",)),
+        ("get_tasks_for_date", TASKS_FOR_DATE_SQL, (1, start, end),
+         "idx_task_recipient_date2", ("range",)),
+        ("get_deals_for_date", DEALS_FOR_DATE_SQL, (1, start, end),
+         "idx_deal_executor_date2", ("range",)),
+        ("get_user_deal_dates", USER_DEAL_DATES_SQL, (1,),
+         "idx_deal_executor_date2", ("range", "ref")),
+        ("get_user_task_dates", USER_TASK_DATES_SQL, (1,),
+         "idx_task_recipient_date2", ("range", "ref")),
+        ("get_chat_messages_before", *chat_messages_before_query(1, 2, (end, 1 << 30), CHAT_PAGE_SIZE),
+         "idx_messages_pair_sent", ("range",)),
+        ("get_chat_messages_since", CHAT_MESSAGES_SINCE_SQL,
+         (1, 2, 0, CHAT_FETCH_LIMIT, 2, 1, 0, CHAT_FETCH_LIMIT, CHAT_FETCH_LIMIT),
+         "idx_messages_pair_id", ("range",)),
+        ("get_unread_counts", UNREAD_COUNTS_SQL, (1,),
+         "idx_messages_pair_id", ("range", "ref")),
+        ("search_messages", SEARCH_MESSAGES_SQL, ("+сообщ*", "+сообщ*", 1, 1, 50),
+         "ft_messages_text", ("fulltext",)),
+        ("get_channel_messages_since", CHANNEL_MESSAGES_SINCE_SQL, (1, 0, CHAT_FETCH_LIMIT),
+         "idx_channel_message_id", ("range",)),
+        ("get_incoming_since", INCOMING_SINCE_SQL, (1, 0, CHAT_FETCH_LIMIT),
+         "idx_messages_recipient_id", ("range",))
+    ]
+
+
+def explain(cursor, sql, params):
+    """План запроса: строки EXPLAIN (cursor должен быть DictCursor)"""
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def plan_uses_index(plan, expected, access_types):
+    """Читается ли таблица по индексу expected одним из типов доступа access_types"""
+    return any(row["key"] == expected and row["type"] in access_types for row in plan)
+
+
+def describe_plan(plan):
+    """Краткая запись плана: таблица:тип доступа:индекс"""
+    return ", ".join(f"{row['table']}:{row['type']}:{row['key']}" for row in plan)
+
+
+def explain_hot_queries(connection):
+    """Вывести планы частых запросов; возвращает False, если индекс не используется"""
+    ok = True
+    with connection.cursor(DictCursor) as cursor:
+        for name, sql, params, expected, access_types in hot_queries():
+            plan = explain(cursor, sql, params)
+            uses_index = plan_uses_index(plan, expected, access_types)
+            ok = ok and uses_index
+            print(f"[{'ok' if uses_index else '!!'}] {name}: {describe_plan(plan)} "
+                  f"(ожидается {expected}, {'/'.join(access_types)})")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Создание и обновление схемы БД crm")
+    parser.add_argument("--status", action="store_true", help="показать применённые миграции")
+    parser.add_argument("--target", type=int, help="применить миграции до указанной версии")
+    parser.add_argument("--explain", action="store_true", help="проверить планы частых запросов")
+    parser.add_argument("--seed", type=int, metavar="N",
+                        help="заполнить БД демонстрационными данными (N сделок и N задач)")
+    args = parser.parse_args(argv)
+
+    connection = connect()
+    try:
+        if args.status:
+            print_status(connection)
+            return 0
+
+        applied = migrate(connection, args.target)
+        if not applied:
+            print("Схема в актуальном состоянии")
+
+        if args.seed:
+            seed_demo_data(connection, args.seed)
+
+        if args.explain:
+            return 0 if explain_hot_queries(connection) else 1
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
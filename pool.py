@@ -0,0 +1,177 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "root",
+    "database": "crm"
+}
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений MySQL, общий для всех окон приложения.
+
+    Соединение выдаётся методом acquire() и возвращается методом release().
+    Перед выдачей соединение, пролежавшее дольше max_idle секунд, пересоздаётся,
+    а пролежавшее дольше ping_after секунд проверяется командой ping.
+    """
+
+    def __init__(self, max_size=8, max_idle=300, ping_after=5, timeout=10, **config):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self.config = config or dict(DB_CONFIG)
+
+        self._idle = deque()  # (соединение, время возврата)
+        self._size = 0  # Сколько соединений открыто (свободных и выданных)
+        self._cond = threading.Condition()
+
+        self._metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "created": 0
+        }
+
+    def _connect(self):
+        """Открыть новое соединение"""
+        connection = pymysql.connect(**self.config)
+        connection.autocommit(True)
+        with self._cond:
+            self._metrics["created"] += 1
+        return connection
+
+    def _discard(self, connection):
+        """Закрыть соединение, не возвращая его в пул"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _revive(self, connection, idle_for):
+        """Проверить свободное соединение и при необходимости пересоздать его"""
+        if idle_for <= self.ping_after:
+            return connection
+
+        if idle_for <= self.max_idle:
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except Exception:
+                pass
+
+        # Соединение устарело или сервер его закрыл
+        self._discard(connection)
+        with self._cond:
+            self._metrics["reconnects"] += 1
+        return self._connect()
+
+    def acquire(self):
+        """Получить соединение из пула"""
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, returned_at = None, None
+                    break
+
+                # Все соединения заняты - ждём возврата
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeout(f"Нет свободных соединений с БД (лимит {self.max_size})")
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._metrics["waits"] += 1
+                self._cond.wait(remaining)
+
+            self._metrics["checkouts"] += 1
+            if waited_since is not None:
+                self._metrics["wait_time"] += time.monotonic() - waited_since
+
+        try:
+            if connection is None:
+                return self._connect()
+            return self._revive(connection, time.monotonic() - returned_at)
+        except Exception:
+            # Слот освобождается, если соединение так и не удалось открыть
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection):
+        """Вернуть соединение в пул"""
+        usable = connection.open
+        if usable:
+            try:
+                # Незавершённая транзакция не должна достаться следующему окну
+                if connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    connection.rollback()
+                if not connection.get_autocommit():
+                    connection.autocommit(True)
+            except Exception:
+                usable = False
+
+        if not usable:
+            self._discard(connection)
+
+        with self._cond:
+            if usable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    def stats(self):
+        """Метрики пула: выдачи, ожидания, переподключения и текущая загрузка"""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+        return stats
+
+    def close_all(self):
+        """Закрыть все свободные соединения"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Общий пул соединений процесса"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**DB_CONFIG)
+            atexit.register(_pool.close_all)
+        return _pool
@@ -0,0 +1,159 @@
+"""Ретранслятор уведомлений о новых сообщениях чата.
+
+Запуск: python relay.py [--host 0.0.0.0] [--port 8765]
+Адрес, к которому подключаются окна чата, задают переменные окружения
+CRM_RELAY_HOST и CRM_RELAY_PORT (по умолчанию 127.0.0.1:8765).
+
+Протокол - строки JSON через TCP:
+    клиент чата:   {"subscribe": <ID пользователя>, "channels": [<ID канала>, ...]}
+                   {"join": [<ID канала>, ...]}
+    отправитель (то же соединение клиента чата):
+                   {"notify": {"sender": <ID>, "recipient": <ID>, "message_id": <ID>}}
+                   {"notify": {"sender": <ID>, "channel": <ID>, "message_id": <ID>,
+                               "members": [<ID пользователя>, ...]}}
+    ретранслятор:  {"event": "message", "sender": <ID>, "recipient": <ID>, "message_id": <ID>}
+                   {"event": "channel_message", "sender": <ID>, "channel": <ID>, "message_id": <ID>}
+Поле members необязательно: подключения перечисленных пользователей
+подписываются на канал (так участники узнают о новом канале).
+Сам текст сообщения через ретранслятор не передаётся - клиент дочитывает
+его из БД по ID, поэтому ретранслятор не хранит состояния и его можно
+перезапускать в любой момент.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+
+RELAY_HOST = os.environ.get("CRM_RELAY_HOST", "127.0.0.1")
+RELAY_PORT = int(os.environ.get("CRM_RELAY_PORT", "8765"))
+
+# Клиент, не забирающий данные, отключается при таком объёме очереди, байт
+MAX_WRITE_BUFFER = 64 * 1024
+
+
+def encode(event):
+    """Строка протокола"""
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+
+class Relay:
+    """Подписки клиентов чата и рассылка уведомлений"""
+
+    def __init__(self):
+        self.subscribers = {}  # ID пользователя -> множество потоков записи
+        self.channels = {}  # ID канала -> множество потоков записи
+        self.memberships = {}  # поток записи -> ID каналов, на которые он подписан
+
+    async def handle(self, reader, writer):
+        """Обслуживание одного соединения"""
+        user_id = None
+        self.memberships[writer] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+
+                if "subscribe" in event and user_id is None:
+                    user_id = int(event["subscribe"])
+                    self.subscribers.setdefault(user_id, set()).add(writer)
+                    self.join(writer, event.get("channels", ()))
+                elif "join" in event:
+                    self.join(writer, event["join"])
+                elif "notify" in event:
+                    self.publish(event["notify"])
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if user_id is not None:
+                writers = self.subscribers.get(user_id, set())
+                writers.discard(writer)
+                if not writers:
+                    self.subscribers.pop(user_id, None)
+            for channel_id in self.memberships.pop(writer, ()):
+                writers = self.channels.get(channel_id, set())
+                writers.discard(writer)
+                if not writers:
+                    self.channels.pop(channel_id, None)
+            writer.close()
+
+    def join(self, writer, channel_ids):
+        """Подписать соединение на каналы"""
+        for channel_id in channel_ids:
+            channel_id = int(channel_id)
+            self.channels.setdefault(channel_id, set()).add(writer)
+            self.memberships[writer].add(channel_id)
+
+    def send_to(self, writers, data):
+        """Записать событие в соединения"""
+        for writer in list(writers):
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                # Зависший клиент переподключится и дочитает сообщения опросом
+                writer.close()
+                continue
+            writer.write(data)
+
+    def publish(self, note):
+        """Разослать уведомление окнам чата получателя или участников канала"""
+        try:
+            if "channel" in note:
+                self.publish_channel(note)
+                return
+            recipient_id = int(note["recipient"])
+            data = encode({
+                "event": "message",
+                "sender": int(note["sender"]),
+                "recipient": recipient_id,
+                "message_id": int(note["message_id"])
+            })
+        except (KeyError, TypeError, ValueError):
+            return
+
+        self.send_to(self.subscribers.get(recipient_id, ()), data)
+
+    def publish_channel(self, note):
+        """Разослать уведомление участникам канала"""
+        channel_id = int(note["channel"])
+        # Новые участники: их соединения подписываются на канал
+        for user_id in note.get("members", ()):
+            for writer in list(self.subscribers.get(int(user_id), ())):
+                self.join(writer, [channel_id])
+
+        data = encode({
+            "event": "channel_message",
+            "sender": int(note["sender"]),
+            "channel": channel_id,
+            "message_id": int(note["message_id"])
+        })
+        self.send_to(self.channels.get(channel_id, ()), data)
+
+
+async def serve(host, port):
+    relay = Relay()
+    server = await asyncio.start_server(relay.handle, host, port)
+    print(f"Ретранслятор чата слушает {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ретранслятор уведомлений чата crm")
+    parser.add_argument("--host", default=RELAY_HOST)
+    parser.add_argument("--port", type=int, default=RELAY_PORT)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import json
+
+from PyQt6 import QtCore, QtNetwork
+
+from relay import RELAY_HOST, RELAY_PORT, encode
+
+
+class RelayClient(QtCore.QObject):
+    """Постоянное соединение окна чата с ретранслятором.
+
+    Уведомления о новых сообщениях пользователю приходят сигналом
+    message_notified, о сообщениях в его каналах - channel_notified. О своих
+    сообщениях окно сообщает через то же соединение методами notify_message()
+    и notify_channel(), не открывая новых. Пока ретранслятор недоступен, клиент переподключается
+    с растущей паузой и периодически выдаёт poll_due - окно должно
+    проверить новые сообщения запросом к БД и сообщить результат в
+    poll_finished(), чтобы пауза между опросами росла, пока ничего не приходит.
+    """
+
+    message_notified = QtCore.pyqtSignal(int, int)  # отправитель, ID сообщения
+    channel_notified = QtCore.pyqtSignal(int, int)  # канал, ID сообщения
+    poll_due = QtCore.pyqtSignal()
+
+    RECONNECT_MIN = 1000
+    RECONNECT_MAX = 60000
+    POLL_MIN = 3000
+    POLL_MAX = 60000
+
+    def __init__(self, user_id, parent=None, host=RELAY_HOST, port=RELAY_PORT):
+        super().__init__(parent)
+        self.user_id = user_id
+        self.host = host
+        self.port = port
+        self._buffer = b""
+        self._closed = False
+        self._channels = set()
+
+        self._reconnect_delay = self.RECONNECT_MIN
+        self._reconnect_timer = QtCore.QTimer(self)
+        self._reconnect_timer.setSingleShot(True)
+        self._reconnect_timer.timeout.connect(self.connect_to_relay)
+
+        self._poll_delay = self.POLL_MIN
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.setSingleShot(True)
+        self._poll_timer.timeout.connect(self.poll_due.emit)
+
+        self.socket = QtNetwork.QTcpSocket(self)
+        self.socket.connected.connect(self._on_connected)
+        self.socket.disconnected.connect(self._on_disconnected)
+        self.socket.errorOccurred.connect(self._on_error)
+        self.socket.readyRead.connect(self._on_ready_read)
+
+    def is_connected(self):
+        return self.socket.state() == QtNetwork.QAbstractSocket.SocketState.ConnectedState
+
+    def connect_to_relay(self):
+        """Подключиться к ретранслятору"""
+        if self._closed or self.socket.state() != QtNetwork.QAbstractSocket.SocketState.UnconnectedState:
+            return
+        self.socket.connectToHost(self.host, self.port)
+
+    def join_channels(self, channel_ids):
+        """Подписаться на уведомления каналов"""
+        new = set(channel_ids) - self._channels
+        if not new:
+            return
+        self._channels |= new
+        if self.is_connected():
+            self.socket.write(encode({"join": sorted(new)}))
+
+    def notify_message(self, recipient_id, message_id):
+        """Сообщить получателю о новом личном сообщении"""
+        self._notify({"sender": self.user_id, "recipient": recipient_id, "message_id": message_id})
+
+    def notify_channel(self, channel_id, message_id, member_ids=None):
+        """Сообщить участникам канала о новом сообщении (или о том, что их добавили в канал)"""
+        note = {"sender": self.user_id, "channel": channel_id, "message_id": message_id}
+        if member_ids:
+            note["members"] = list(member_ids)
+        self._notify(note)
+
+    def _notify(self, note):
+        # Без ретранслятора получатели узнают о сообщении опросом БД
+        if self.is_connected():
+            self.socket.write(encode({"notify": note}))
+
+    def close(self):
+        """Отключиться и остановить переподключение и опрос"""
+        self._closed = True
+        self._reconnect_timer.stop()
+        self._poll_timer.stop()
+        self.socket.abort()
+
+    def poll_finished(self, found):
+        """Результат опроса БД: found - были ли новые сообщения"""
+        if self._closed or self.is_connected():
+            return
+        if found:
+            self._poll_delay = self.POLL_MIN
+        else:
+            self._poll_delay = min(self._poll_delay * 2, self.POLL_MAX)
+        self._poll_timer.start(self._poll_delay)
+
+    def _on_connected(self):
+        self._reconnect_delay = self.RECONNECT_MIN
+        self._poll_timer.stop()
+        self._poll_delay = self.POLL_MIN
+        self._buffer = b""
+        self.socket.write(encode({"subscribe": self.user_id, "channels": sorted(self._channels)}))
+        # Сообщения, пришедшие пока соединения не было, дочитываются из БД
+        self.poll_due.emit()
+
+    def _on_disconnected(self):
+        self._schedule_reconnect()
+
+    def _on_error(self, error):
+        if self.socket.state() == QtNetwork.QAbstractSocket.SocketState.UnconnectedState:
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closed or self._reconnect_timer.isActive():
+            return
+        self._reconnect_timer.start(self._reconnect_delay)
+        self._reconnect_delay = min(self._reconnect_delay * 2, self.RECONNECT_MAX)
+        # Без ретранслятора новые сообщения проверяются опросом
+        if not self._poll_timer.isActive():
+            self._poll_timer.start(self._poll_delay)
+
+    def _on_ready_read(self):
+        self._buffer += bytes(self.socket.readAll())
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("event") == "message" and event.get("recipient") == self.user_id:
+                self.message_notified.emit(int(event["sender"]), int(event["message_id"]))
+            elif event.get("event") == "channel_message":
+                self._channels.add(int(event["channel"]))
+                self.channel_notified.emit(int(event["channel"]), int(event["message_id"]))
@@ -0,0 +1,49 @@
+class Session:
+    """Данные вошедшего пользователя, общие для всех окон.
+
+    Создаётся один раз при авторизации и передаётся окнам вместо email,
+    чтобы окна не запрашивали пользователя из БД при каждой загрузке.
+    """
+
+    def __init__(self, email, user_id, firstname, name, lastname, role, post):
+        self.email = email
+        self.id = user_id
+        self.firstname = firstname
+        self.name = name
+        self.lastname = lastname
+        self.role = role
+        self.post = post
+
+    @classmethod
+    def from_row(cls, email, user_data):
+        """Создание сессии из строки Database.get_user_by_email"""
+        return cls(email, user_data[0], user_data[1], user_data[2], user_data[3],
+                   user_data[5], user_data[6])
+
+    @classmethod
+    def load(cls, db, email):
+        """Загрузка сессии пользователя по email"""
+        user_data = db.get_user_by_email(email)
+        if not user_data:
+            return None
+        return cls.from_row(email, user_data)
+
+    def refresh(self, db):
+        """Перечитать данные пользователя после изменения профиля"""
+        user_data = db.get_user_by_email(self.email)
+        if user_data:
+            self.id = user_data[0]
+            self.firstname = user_data[1]
+            self.name = user_data[2]
+            self.lastname = user_data[3]
+            self.role = user_data[5]
+            self.post = user_data[6]
+
+    @property
+    def full_name(self):
+        """Фамилия, имя и отчество"""
+        return f"{self.firstname} {self.name} {self.lastname}"
+
+    def profile_text(self):
+        """Текст для блока профиля в шапке окон"""
+        return f"{self.firstname} {self.name}\n{self.post} ({self.role})"
@@ -0,0 +1,246 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from PyQt6 import QtCore, QtWidgets
+
+
+# Роли данных моделей таблиц
+RowRole = QtCore.Qt.ItemDataRole.UserRole + 1  # Строка целиком, как её вернул курсор
+SortRole = QtCore.Qt.ItemDataRole.UserRole + 2  # Значение поля для сортировки
+
+
+def sort_value(value):
+    """Значение поля в виде, который Qt умеет сравнивать при сортировке"""
+    if isinstance(value, datetime):
+        return QtCore.QDateTime(value)
+    if isinstance(value, date):
+        return QtCore.QDate(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class Column:
+    """Столбец таблицы.
+
+    field - индекс поля в строке (None для столбца без данных, например
+    с действием), formatter - текст ячейки по значению поля,
+    background и foreground - цвет ячейки по строке (или None),
+    tooltip - показывать ли текст ячейки во всплывающей подсказке.
+    """
+
+    def __init__(self, title, field, formatter=None, background=None, foreground=None, tooltip=False):
+        self.title = title
+        self.field = field
+        self.formatter = formatter
+        self.background = background
+        self.foreground = foreground
+        self.tooltip = tooltip
+
+    def value(self, row):
+        return row[self.field] if self.field is not None else None
+
+    def text(self, row):
+        value = self.value(row)
+        if self.formatter is not None:
+            return self.formatter(value)
+        return "" if value is None else str(value)
+
+
+class RowTableModel(QtCore.QAbstractTableModel):
+    """Таблица поверх строк, полученных из курсора без преобразования.
+
+    Текст и цвет ячеек вычисляются в data() только для видимых ячеек,
+    поэтому заполнение таблицы - это присваивание списка строк.
+    row_background(строка) задаёт цвет всей строки (например, по статусу).
+    set_rows() сравнивает новые строки с текущими по ключевому полю key
+    и сообщает представлению только об удалённых, добавленных и
+    изменённых строках - выделение и прокрутка при обновлении сохраняются.
+    """
+
+    def __init__(self, columns, key=0, row_background=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.key = key
+        self.row_background = row_background
+        self._rows = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if role == QtCore.Qt.ItemDataRole.DisplayRole and orientation == QtCore.Qt.Orientation.Horizontal:
+            return self.columns[section].title
+        return None
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = self.columns[index.column()]
+
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return column.text(row)
+        if role == QtCore.Qt.ItemDataRole.BackgroundRole:
+            if column.background is not None:
+                color = column.background(row)
+                if color is not None:
+                    return color
+            return self.row_background(row) if self.row_background is not None else None
+        if role == QtCore.Qt.ItemDataRole.ForegroundRole:
+            return column.foreground(row) if column.foreground is not None else None
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return column.text(row) if column.tooltip else None
+        if role == SortRole:
+            return sort_value(column.value(row))
+        if role == RowRole:
+            return row
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemFlag.NoItemFlags
+        return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+
+    def rows(self):
+        """Все строки модели"""
+        return self._rows
+
+    def row(self, row):
+        """Строка с номером row"""
+        return self._rows[row]
+
+    def append_rows(self, rows):
+        """Добавить строки в конец таблицы (догрузка страницы)"""
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def clear(self):
+        self.reset_rows([])
+
+    def reset_rows(self, rows):
+        """Заменить все строки без сравнения с текущими"""
+        self.beginResetModel()
+        self._rows = list(rows)
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """Обновить таблицу новыми строками, изменяя только отличающиеся строки"""
+        rows = list(rows)
+        new_keys = [row[self.key] for row in rows]
+        new_key_set = set(new_keys)
+        if not self._rows or len(new_key_set) != len(new_keys):
+            self.reset_rows(rows)
+            return
+
+        # Удалённые строки - сериями подряд идущих, с конца
+        gone = [position for position, row in enumerate(self._rows) if row[self.key] not in new_key_set]
+        for first, last in reversed(list(_runs(gone))):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+
+        # Оставшиеся строки поменяли порядок (например, изменилась сортировка в запросе)
+        old_keys = [row[self.key] for row in self._rows]
+        old_key_set = set(old_keys)
+        if old_keys != [key for key in new_keys if key in old_key_set]:
+            self.reset_rows(rows)
+            return
+
+        changed_first = changed_last = None
+        position = 0
+        i = 0
+        while i < len(rows):
+            if position < len(self._rows) and self._rows[position][self.key] == new_keys[i]:
+                if self._rows[position] != rows[i]:
+                    self._rows[position] = rows[i]
+                    if changed_first is None:
+                        changed_first = position
+                    changed_last = position
+                position += 1
+                i += 1
+                continue
+
+            # Новые строки до следующей уже показанной
+            end = i
+            while end < len(rows) and new_keys[end] not in old_key_set:
+                end += 1
+            self.beginInsertRows(QtCore.QModelIndex(), position, position + end - i - 1)
+            self._rows[position:position] = rows[i:end]
+            self.endInsertRows()
+            position += end - i
+            i = end
+
+        if changed_first is not None:
+            self.dataChanged.emit(self.index(changed_first, 0),
+                                  self.index(changed_last, len(self.columns) - 1))
+
+
+def _runs(positions):
+    """Серии подряд идущих номеров: [1, 2, 3, 7] -> (1, 3), (7, 7)"""
+    start = previous = None
+    for position in positions:
+        if start is None:
+            start = previous = position
+        elif position == previous + 1:
+            previous = position
+        else:
+            yield start, previous
+            start = previous = position
+    if start is not None:
+        yield start, previous
+
+
+class RowFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """Сортировка по значениям полей (числа и даты - не как текст) и фильтр по всем столбцам"""
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.setSourceModel(source)
+        self.setSortRole(SortRole)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        self.setFilterKeyColumn(-1)
+
+    def row(self, row):
+        """Строка источника, показанная в строке row"""
+        return self.index(row, 0).data(RowRole)
+
+
+def setup_table_view(view, proxy):
+    """Подключить таблицу к модели: сортировка по щелчку на заголовке, выделение строками"""
+    view.setModel(proxy)
+    view.setSortingEnabled(True)
+    # Пока пользователь не выбрал столбец, строки идут в порядке запроса
+    view.horizontalHeader().setSortIndicator(-1, QtCore.Qt.SortOrder.AscendingOrder)
+    view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+    view.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+
+
+def add_filter_edit(view, proxy, width=300):
+    """Поле фильтра над правым краем таблицы"""
+    edit = QtWidgets.QLineEdit(view.parentWidget())
+    edit.setPlaceholderText("Фильтр...")
+    edit.setClearButtonEnabled(True)
+    edit.setGeometry(QtCore.QRect(view.geometry().right() - width, view.geometry().top() - 45, width, 35))
+    edit.setStyleSheet("""
+        QLineEdit {
+            border: 1px solid #94a5ff;
+            border-radius: 10px;
+            padding: 5px;
+            font: 11pt "Segoe UI";
+            background: white;
+        }
+    """)
+    edit.textChanged.connect(proxy.setFilterFixedString)
+    return edit
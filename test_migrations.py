@@ -0,0 +1,74 @@
+"""Планы частых запросов на сервере MySQL.
+
+Запуск: python -m unittest test_migrations
+
+Тест создаёт на сервере из pool.DB_CONFIG отдельную базу (CRM_TEST_DATABASE,
+по умолчанию crm_test), применяет миграции, заполняет её демонстрационными
+данными (CRM_TEST_SEED строк, по умолчанию 20000) и по EXPLAIN проверяет,
+что каждый запрос из migrations.hot_queries() читает таблицу по ожидаемому
+индексу с ожидаемым типом доступа. Без pymysql или без сервера тест
+пропускается. После проверки база удаляется.
+"""
+import os
+import unittest
+
+try:
+    import pymysql
+    from pymysql.cursors import DictCursor
+except ImportError:
+    pymysql = None
+
+
+TEST_DATABASE = os.environ.get("CRM_TEST_DATABASE", "crm_test")
+SEED_ROWS = int(os.environ.get("CRM_TEST_SEED", "20000"))
+
+
+class HotQueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if pymysql is None:
+            raise unittest.SkipTest("pymysql не установлен")
+
+        import migrations
+        from pool import DB_CONFIG
+        if TEST_DATABASE == DB_CONFIG["database"]:
+            # База пересоздаётся - рабочую использовать нельзя
+            raise unittest.SkipTest(f"CRM_TEST_DATABASE совпадает с рабочей базой {TEST_DATABASE}")
+
+        try:
+            connection = migrations.connect(create_database=False, database="information_schema")
+        except pymysql.err.OperationalError as e:
+            raise unittest.SkipTest(f"Сервер MySQL недоступен: {e}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {TEST_DATABASE}")
+            cursor.execute(f"CREATE DATABASE {TEST_DATABASE} DEFAULT CHARACTER SET utf8mb4")
+        connection.select_db(TEST_DATABASE)
+        cls.connection = connection
+        cls.migrations = migrations
+
+        migrations.migrate(connection)
+        migrations.seed_demo_data(connection, SEED_ROWS)
+
+    @classmethod
+    def tearDownClass(cls):
+        connection = getattr(cls, "connection", None)
+        if connection is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {TEST_DATABASE}")
+        connection.close()
+
+    def test_hot_queries_use_indexes(self):
+        with self.connection.cursor(DictCursor) as cursor:
+            for name, sql, params, expected, access_types in self.migrations.hot_queries():
+                with self.subTest(query=name):
+                    plan = self.migrations.explain(cursor, sql, params)
+                    self.assertTrue(self.migrations.plan_uses_index(plan, expected, access_types),
+                                    f"{name}: {self.migrations.describe_plan(plan)}, "
+                                    f"ожидается {expected} ({'/'.join(access_types)})")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -230,16 +230,14 @@ class Ui_MainWindow(object):
 "}")
         self.pushButton_2.setObjectName("pushButton_2")
         self.verticalLayout_2.addWidget(self.pushButton_2, 0, QtCore.Qt.AlignmentFlag.AlignHCenter)
-        self.tableWidget = QtWidgets.QTableWidget(parent=self.centralwidget)
-        self.tableWidget.setGeometry(QtCore.QRect(50, 200, 881, 241))
-        self.tableWidget.setStyleSheet("border-radius: 20px;                     /* <----  20px  */ \n"
+        self.tableView = QtWidgets.QTableView(parent=self.centralwidget)
+        self.tableView.setGeometry(QtCore.QRect(50, 200, 881, 241))
+        self.tableView.setStyleSheet("border-radius: 20px;                     /* <----  20px  */ \n"
 "border: 2px solid #94a5ff;\n"
 "background: rgb(255, 255, 255);\n"
 "font: 500 14pt \"Segoe UI\";\n"
 "")
-        self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(0)
-        self.tableWidget.setRowCount(0)
+        self.tableView.setObjectName("tableView")
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QtWidgets.QStatusBar(parent=MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -168,16 +168,14 @@ class Ui_MainWindow(object):
 "font: 500 18pt \"Segoe UI\";\n"
 "")
         self.label_3.setObjectName("label_3")
-        self.tableWidget = QtWidgets.QTableWidget(parent=self.centralwidget)
-        self.tableWidget.setGeometry(QtCore.QRect(40, 210, 831, 231))
-        self.tableWidget.setStyleSheet("border-radius: 20px;                     /* <----  20px  */ \n"
+        self.tableView = QtWidgets.QTableView(parent=self.centralwidget)
+        self.tableView.setGeometry(QtCore.QRect(40, 210, 831, 231))
+        self.tableView.setStyleSheet("border-radius: 20px;                     /* <----  20px  */ \n"
 "border: 2px solid #94a5ff;\n"
 "background: rgb(255, 255, 255);\n"
 "font: 500 14pt \"Segoe UI\";\n"
 "")
-        self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(0)
-        self.tableWidget.setRowCount(0)
+        self.tableView.setObjectName("tableView")
         self.pushButton = QtWidgets.QPushButton(parent=self.centralwidget)
         self.pushButton.setGeometry(QtCore.QRect(40, 470, 221, 51))
         self.pushButton.setStyleSheet("QPushButton{\n"
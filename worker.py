@@ -0,0 +1,164 @@
+import threading
+
+from PyQt6 import QtCore
+
+from database import Database
+
+
+# Потоков не больше, чем соединений в пуле: окна держат свои соединения,
+# и фоновые запросы не должны забирать весь пул
+MAX_WORKERS = 4
+
+_thread_pool = None
+
+
+def get_thread_pool():
+    """Пул потоков для запросов к БД, общий для всех окон"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = QtCore.QThreadPool()
+        _thread_pool.setMaxThreadCount(MAX_WORKERS)
+    return _thread_pool
+
+
+class QueryCancelled(Exception):
+    """Долгий запрос прерван из-за отмены задания"""
+
+
+class QuerySignals(QtCore.QObject):
+    """Сигналы фонового запроса (QRunnable не может иметь своих сигналов)"""
+    finished = QtCore.pyqtSignal(object, object)  # ключ, результат
+    failed = QtCore.pyqtSignal(object, object)  # ключ, исключение
+    progress = QtCore.pyqtSignal(object, object, object)  # ключ, сделано, всего
+
+
+class QueryJob(QtCore.QRunnable):
+    """Вызов метода Database в потоке из пула.
+
+    Каждое задание берёт своё соединение из пула соединений, поэтому
+    курсор окна из фонового потока не используется.
+    """
+
+    def __init__(self, key, method, args, kwargs, with_progress=False):
+        super().__init__()
+        self.key = key
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        if with_progress:
+            self.kwargs = dict(kwargs, progress=self.report_progress)
+        self.signals = QuerySignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Не выполнять запрос, если он ещё не начат, и не отдавать результат"""
+        self._cancelled.set()
+
+    def report_progress(self, done, total):
+        """Передаётся методу как progress; прерывает его, если задание отменено"""
+        if self._cancelled.is_set():
+            raise QueryCancelled()
+        self.signals.progress.emit(self.key, done, total)
+
+    def run(self):
+        if self._cancelled.is_set():
+            self.signals.failed.emit(self.key, None)
+            return
+
+        db = None
+        try:
+            db = Database()
+            result = self.method(db, *self.args, **self.kwargs)
+        except QueryCancelled:
+            self.signals.failed.emit(self.key, None)
+            return
+        except Exception as e:
+            self.signals.failed.emit(self.key, e)
+            return
+        finally:
+            if db is not None:
+                db.close()
+        self.signals.finished.emit(self.key, result)
+
+
+class QueryRunner(QtCore.QObject):
+    """Запуск запросов к БД вне потока интерфейса для одного окна.
+
+    run() принимает метод Database (например, Database.get_deals_page) и его
+    аргументы; результат передаётся в on_result уже в потоке интерфейса.
+    Повторный запрос с ключом, который ещё выполняется, не отправляется
+    в БД - его обработчики получат результат уже идущего запроса. Поэтому
+    ключ должен включать всё, от чего зависит результат.
+    cancel_all() вызывается при закрытии окна: незапущенные запросы
+    снимаются с очереди, результаты запущенных отбрасываются.
+    Если задан on_progress, метод получает аргумент progress(сделано, всего);
+    вызовы передаются в on_progress в потоке интерфейса, а после отмены
+    progress прерывает метод.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs = {}  # ключ -> QueryJob
+        self._handlers = {}  # ключ -> [(on_result, on_error)]
+        self._progress = {}  # ключ -> [on_progress]
+
+    def run(self, key, method, *args, on_result=None, on_error=None, on_progress=None, **kwargs):
+        """Выполнить запрос в фоне; возвращает False, если он присоединён к уже идущему"""
+        handlers = self._handlers.setdefault(key, [])
+        handlers.append((on_result, on_error))
+        if on_progress is not None:
+            self._progress.setdefault(key, []).append(on_progress)
+        if key in self._jobs:
+            return False
+
+        job = QueryJob(key, method, args, kwargs, with_progress=on_progress is not None)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.progress.connect(self._on_progress)
+        self._jobs[key] = job
+        get_thread_pool().start(job)
+        return True
+
+    def is_running(self, key):
+        """Выполняется ли запрос с ключом key"""
+        return key in self._jobs
+
+    def cancel(self, key):
+        """Отменить запрос с ключом key: его обработчики больше не вызываются"""
+        job = self._jobs.get(key)
+        if job is not None:
+            job.cancel()
+            if get_thread_pool().tryTake(job):
+                del self._jobs[key]
+        self._handlers.pop(key, None)
+        self._progress.pop(key, None)
+
+    def cancel_all(self):
+        """Отменить все запросы окна"""
+        for key in list(self._jobs):
+            self.cancel(key)
+        self._handlers.clear()
+        self._progress.clear()
+
+    def _on_progress(self, key, done, total):
+        for on_progress in self._progress.get(key, []):
+            on_progress(done, total)
+
+    def _on_finished(self, key, result):
+        self._jobs.pop(key, None)
+        self._progress.pop(key, None)
+        for on_result, _ in self._handlers.pop(key, []):
+            if on_result is not None:
+                on_result(result)
+
+    def _on_failed(self, key, error):
+        self._jobs.pop(key, None)
+        self._progress.pop(key, None)
+        handlers = self._handlers.pop(key, [])
+        if error is None:
+            return  # Запрос отменён
+        for _, on_error in handlers:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"Ошибка фонового запроса {key}: {error}")